@@ -2,26 +2,36 @@
 import asyncio
 import base64
 import builtins
+import hashlib
+import heapq
 import json
 import logging
 import math
+import mmap
+import multiprocessing
 import os
 import random
 import re
 import shutil
 import signal
+import sqlite3
 import string
 import subprocess
 import sys
 import threading
 import time
+import uuid
+import zlib
 import ctypes
 import tkinter as tk
 import webbrowser
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from difflib import SequenceMatcher
 from email.mime.text import MIMEText
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from tkinter import ttk, messagebox
 from tkinter import PhotoImage
@@ -30,8 +40,12 @@ from tkinter import PhotoImage
 
 # Third-party imports
 import chromadb
+try:
+    import numpy as np
+except ImportError:  # BM25 memory scoring falls back to pure Python
+    np = None
 import pytz
-import requests
+import httpx
 import webview
 from chromadb.utils import embedding_functions
 from dateutil import parser
@@ -527,6 +541,7 @@ def Config_get_data():
     user_information = config_data.get("Extra details (optional)", "")
     MODEL = config_data["Selected Model"]
     name = config_data["User name"]
+    llm_scheduler.configure(mistral_rate_limits(config_data))
 
     if "chat_id" in config_data:
         current_chat_id = config_data["chat_id"]
@@ -680,19 +695,543 @@ Also he use Astro as a second name.
 """
 
 start_menu = r"C:\ProgramData\Microsoft\Windows\Start Menu\Programs"
-MISTRAL_ENDPOINT = "https://api.mistral.ai/v1/chat/completions"
+# EVA_MISTRAL_ENDPOINT points Eva at another compatible server, e.g. benchmarks/mock_mistral.py
+MISTRAL_ENDPOINT = os.environ.get("EVA_MISTRAL_ENDPOINT", "https://api.mistral.ai/v1/chat/completions")
 session_history = []
 needs_followup = False
 first_time  = ""
 
 # ==================================================================== JSON MEMORY SYSTEM =========================================================
+def memory_similarity(query, memory_content, memory_keywords, query_keywords):
+    """Score a memory against a query (module level so shard worker processes can use it)"""
+    query_lower = query.lower()
+    content_lower = memory_content.lower()
+    
+    # 1. Direct substring matching (highest weight)
+    direct_match = 0
+    if query_lower in content_lower or content_lower in query_lower:
+        direct_match = 0.8
+    
+    # 2. Sequence similarity
+    sequence_sim = SequenceMatcher(None, query_lower, content_lower).ratio() * 0.6
+    
+    # 3. Keyword matching
+    keyword_matches = len(set(query_keywords) & set(memory_keywords))
+    keyword_sim = (keyword_matches / max(len(query_keywords), 1)) * 0.7
+    
+    # 4. Word overlap
+    query_words = set(query_lower.split())
+    content_words = set(content_lower.split())
+    word_overlap = len(query_words & content_words) / max(len(query_words | content_words), 1) * 0.5
+    
+    # Combined similarity score
+    total_similarity = direct_match + sequence_sim + keyword_sim + word_overlap
+    return min(total_similarity, 1.0)  # Cap at 1.0
+
+
+def top_similar_memories(query, query_keywords, candidates, n, min_similarity):
+    """Return the n best (score, memory) pairs, best first, using the memory_similarity score.
+
+    Gives exactly the ranking of scoring every candidate and stable-sorting by score, but keeps
+    only a bounded heap and skips the full SequenceMatcher.ratio() whenever a cheaper upper
+    bound (real_quick_ratio, then quick_ratio) already shows the candidate cannot make the cut.
+    """
+    if n <= 0:
+        return []
+    
+    query_lower = query.lower()
+    query_words = set(query_lower.split())
+    query_keyword_set = set(query_keywords)
+    keyword_divisor = max(len(query_keywords), 1)
+    heap = []  # Min-heap of (score, -position, memory); earlier candidates win ties
+    
+    for position, memory in enumerate(candidates):
+        content_lower = memory['content'].lower()
+        
+        # The cheap parts of memory_similarity, computed exactly
+        direct_match = 0
+        if query_lower in content_lower or content_lower in query_lower:
+            direct_match = 0.8
+        keyword_sim = (len(query_keyword_set & set(memory.get('keywords', []))) / keyword_divisor) * 0.7
+        content_words = set(content_lower.split())
+        word_overlap = len(query_words & content_words) / max(len(query_words | content_words), 1) * 0.5
+        
+        # Score to beat: the current k-th best once the heap is full
+        kth_score = heap[0][0] if len(heap) >= n else None
+        
+        # real_quick_ratio() >= quick_ratio() >= ratio(), and the sum below is computed in the
+        # same order as memory_similarity, so each bound is >= the final score
+        matcher = SequenceMatcher(None, query_lower, content_lower)
+        for ratio in (matcher.real_quick_ratio, matcher.quick_ratio, matcher.ratio):
+            score = min(direct_match + ratio() * 0.6 + keyword_sim + word_overlap, 1.0)
+            if score < min_similarity or (kth_score is not None and score <= kth_score):
+                break
+        else:
+            if kth_score is None:
+                heapq.heappush(heap, (score, -position, memory))
+            else:
+                heapq.heapreplace(heap, (score, -position, memory))
+    
+    return [(score, memory) for score, _, memory in sorted(heap, key=lambda x: (x[0], x[1]), reverse=True)]
+
+
+def memory_shard_worker(connection):
+    """Worker process that keeps one shard of the memories resident and scores it on request"""
+    memories = []
+    keyword_index = {}  # keyword -> positions in memories
+
+    def index(position, memory):
+        for keyword in memory.get("keywords", []):
+            keyword_index.setdefault(keyword, []).append(position)
+
+    while True:
+        try:
+            command, *args = connection.recv()
+        except (EOFError, OSError):
+            break
+
+        if command == "load":
+            memories = args[0]
+            keyword_index = {}
+            for position, memory in enumerate(memories):
+                index(position, memory)
+        elif command == "add":
+            memories.append(args[0])
+            index(len(memories) - 1, args[0])
+        elif command == "score":
+            query, query_keywords, n, min_similarity = args
+            if query_keywords:
+                positions = set()
+                for keyword in query_keywords:
+                    positions.update(keyword_index.get(keyword, ()))
+                candidates = [memories[p] for p in sorted(positions)]
+            else:
+                candidates = memories
+            connection.send(top_similar_memories(query, query_keywords, candidates, n, min_similarity))
+        elif command == "stop":
+            break
+    connection.close()
+
+
+class MemoryShardPool:
+    """Memories partitioned across worker processes, scored in parallel and merged with a heap"""
+    def __init__(self, memories, worker_count=None):
+        self.worker_count = worker_count or max(2, (os.cpu_count() or 2) - 1)
+        self.lock = threading.Lock()
+        self.connections = []
+        self.processes = []
+        for _ in range(self.worker_count):
+            parent_connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=memory_shard_worker, args=(child_connection,), daemon=True)
+            process.start()
+            child_connection.close()
+            self.connections.append(parent_connection)
+            self.processes.append(process)
+        self.load(memories)
+        print(f"🧩 Memory scoring sharded across {self.worker_count} processes")
+
+    def load(self, memories):
+        """Replace every shard's contents (sent once, then kept resident in the workers)"""
+        shards = [[] for _ in range(self.worker_count)]
+        for memory in memories:
+            shards[memory["id"] % self.worker_count].append(memory)
+        with self.lock:
+            for connection, shard in zip(self.connections, shards):
+                connection.send(("load", shard))
+
+    def add(self, memory):
+        with self.lock:
+            self.connections[memory["id"] % self.worker_count].send(("add", memory))
+
+    def score(self, query, query_keywords, n, min_similarity):
+        """Score all shards in parallel and return the merged top n (score, memory) pairs"""
+        with self.lock:
+            for connection in self.connections:
+                connection.send(("score", query, query_keywords, n, min_similarity))
+            results = []
+            for connection in self.connections:
+                results.extend(connection.recv())
+        return heapq.nlargest(n, results, key=lambda x: (x[0], -x[1]["id"]))
+
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                try:
+                    connection.send(("stop",))
+                    connection.close()
+                except OSError:
+                    pass
+        for process in self.processes:
+            process.join(timeout=2)
+
+
+class BM25MemoryScorer:
+    """Sparse BM25 term-document index over memory contents.
+
+    Postings are kept per term (row numbers + term frequencies) and updated as memories are
+    added. A query is scored against the whole corpus at once with NumPy; without NumPy the
+    same math runs in plain Python.
+    """
+    def __init__(self, tokenize, k1=1.5, b=0.75):
+        self.tokenize = tokenize
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    def clear(self):
+        """Drop every document from the index"""
+        self.doc_ids = []        # row -> memory id
+        self.doc_lengths = []    # row -> number of terms
+        self.postings = {}       # term -> ([rows], [term frequencies])
+        self.total_length = 0
+        self.term_arrays = {}    # term -> (rows, tfs) as NumPy arrays, built lazily
+        self.lengths_array = None
+
+    def rebuild(self, memories):
+        """Rebuild the index for the given memories"""
+        self.clear()
+        for memory in memories:
+            self.add(memory)
+
+    def add(self, memory):
+        """Add one memory as a new row"""
+        row = len(self.doc_ids)
+        term_counts = Counter(self.tokenize(memory['content']))
+        length = sum(term_counts.values())
+
+        self.doc_ids.append(memory['id'])
+        self.doc_lengths.append(length)
+        self.total_length += length
+        for term, tf in term_counts.items():
+            rows, tfs = self.postings.setdefault(term, ([], []))
+            rows.append(row)
+            tfs.append(tf)
+            self.term_arrays.pop(term, None)
+        self.lengths_array = None
+
+    def get_term_arrays(self, term):
+        """Return the cached NumPy posting arrays for a term"""
+        arrays = self.term_arrays.get(term)
+        if arrays is None:
+            rows, tfs = self.postings[term]
+            arrays = (np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float64))
+            self.term_arrays[term] = arrays
+        return arrays
+
+    def score(self, query_terms):
+        """Score every document against the query; returns (rows, scores) for non-zero rows"""
+        doc_count = len(self.doc_ids)
+        terms = [term for term in set(query_terms) if term in self.postings]
+        if not doc_count or not terms:
+            return [], []
+
+        avg_length = (self.total_length / doc_count) or 1.0
+        k1, b = self.k1, self.b
+
+        if np is None:
+            scores = {}
+            for term in terms:
+                rows, tfs = self.postings[term]
+                idf = math.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for row, tf in zip(rows, tfs):
+                    norm = k1 * (1 - b + b * self.doc_lengths[row] / avg_length)
+                    scores[row] = scores.get(row, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+            return list(scores.keys()), list(scores.values())
+
+        if self.lengths_array is None:
+            self.lengths_array = np.asarray(self.doc_lengths, dtype=np.float64)
+
+        # Gather the postings of all query terms, then accumulate them in one pass
+        all_rows, all_weights = [], []
+        for term in terms:
+            rows, tfs = self.get_term_arrays(term)
+            idf = math.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = k1 * (1 - b + b * self.lengths_array[rows] / avg_length)
+            all_rows.append(rows)
+            all_weights.append(idf * tfs * (k1 + 1) / (tfs + norm))
+        scores = np.bincount(np.concatenate(all_rows), weights=np.concatenate(all_weights), minlength=doc_count)
+        rows = np.flatnonzero(scores)
+        return rows, scores[rows]
+
+    def top(self, query_terms, k):
+        """Return up to k (row, score) pairs with the highest BM25 scores"""
+        rows, scores = self.score(query_terms)
+        if not len(rows) or k <= 0:
+            return []
+        if np is None or k >= len(rows):
+            ranked = sorted(zip(rows, scores), key=lambda x: x[1], reverse=True)
+            return [(int(row), float(score)) for row, score in ranked[:k]]
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+
+class MinHashDeduplicator:
+    """Near-duplicate detection for memories using MinHash signatures and LSH banding.
+
+    Each memory is reduced to character shingles of its lowercased words, short words and
+    stop words included. Memories whose signatures agree on a full band land in the same
+    bucket; only those candidates are checked with an exact Jaccard similarity. Texts
+    that differ in a number or a negation are never duplicates, however similar
+    ("User is 25 years old" / "User is 26 years old", "has a dog" / "has no dog").
+    """
+    PRIME = (1 << 31) - 1
+    NUMBER_PATTERN = re.compile(r"\d+(?:[.,:/]\d+)*")
+    NEGATIONS = {"no", "not", "never", "none", "nobody", "nothing", "neither", "nor", "without",
+                 "isn", "aren", "wasn", "weren", "don", "doesn", "didn", "won", "can", "cannot",
+                 "couldn", "shouldn", "wouldn", "hasn", "haven", "hadn"}
+
+    def __init__(self, threshold=0.7, num_perm=64, bands=16, shingle_size=4):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = random.Random(8191)  # Fixed seed keeps signatures stable between runs
+        self.hash_a = [rng.randrange(1, self.PRIME) for _ in range(num_perm)]
+        self.hash_b = [rng.randrange(0, self.PRIME) for _ in range(num_perm)]
+        if np is not None:
+            self.hash_a_array = np.asarray(self.hash_a, dtype=np.int64)[:, None]
+            self.hash_b_array = np.asarray(self.hash_b, dtype=np.int64)[:, None]
+        self.clear()
+
+    def clear(self):
+        self.buckets = {}     # (band, band values) -> set of memory ids
+        self.signatures = {}  # memory id -> signature
+
+    def normalize(self, text):
+        return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+    def shingles(self, text):
+        normalized = self.normalize(text)
+        k = self.shingle_size
+        return {normalized[i:i + k] for i in range(max(len(normalized) - k + 1, 1))}
+
+    def signature(self, shingles):
+        hashes = [zlib.crc32(shingle.encode('utf-8')) & self.PRIME for shingle in shingles]
+        if np is not None:
+            values = (self.hash_a_array * np.asarray(hashes, dtype=np.int64)[None, :] + self.hash_b_array) % self.PRIME
+            return tuple(values.min(axis=1).tolist())
+        return tuple(min((a * h + b) % self.PRIME for h in hashes) for a, b in zip(self.hash_a, self.hash_b))
+
+    def band_keys(self, signature):
+        for band in range(self.bands):
+            yield (band, signature[band * self.rows:(band + 1) * self.rows])
+
+    def add(self, memory_id, text):
+        signature = self.signature(self.shingles(text))
+        self.signatures[memory_id] = signature
+        for key in self.band_keys(signature):
+            self.buckets.setdefault(key, set()).add(memory_id)
+
+    def remove(self, memory_id):
+        signature = self.signatures.pop(memory_id, None)
+        if signature is None:
+            return
+        for key in self.band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(memory_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def candidates(self, text):
+        """IDs of memories sharing at least one LSH band with the text"""
+        found = set()
+        for key in self.band_keys(self.signature(self.shingles(text))):
+            found |= self.buckets.get(key, set())
+        return found
+
+    def similarity(self, text_a, text_b):
+        """Exact Jaccard similarity of two texts' shingle sets"""
+        a, b = self.shingles(text_a), self.shingles(text_b)
+        return len(a & b) / max(len(a | b), 1)
+
+    def conflicts(self, text_a, text_b):
+        """True when the texts state different numbers or only one of them is negated"""
+        words_a, words_b = self.normalize(text_a), self.normalize(text_b)
+        if set(self.NUMBER_PATTERN.findall(words_a)) != set(self.NUMBER_PATTERN.findall(words_b)):
+            return True
+        negations_a = self.NEGATIONS.intersection(words_a.split()) | ({"not"} if "n't" in text_a.lower() else set())
+        negations_b = self.NEGATIONS.intersection(words_b.split()) | ({"not"} if "n't" in text_b.lower() else set())
+        return negations_a != negations_b
+
+    def is_duplicate(self, text_a, text_b):
+        return self.similarity(text_a, text_b) >= self.threshold and not self.conflicts(text_a, text_b)
+
+    def find_duplicate(self, text, memories_by_id):
+        """Return the most similar stored memory at or above the threshold, or None"""
+        best, best_similarity = None, self.threshold
+        for memory_id in self.candidates(text):
+            memory = memories_by_id.get(memory_id)
+            if memory is None or self.conflicts(text, memory["content"]):
+                continue
+            similarity = self.similarity(text, memory["content"])
+            if similarity >= best_similarity:
+                best, best_similarity = memory, similarity
+        return best
+
+
+class ColdMemoryArchive:
+    """Append-only, zlib-compressed archive of memories evicted from the hot set.
+
+    Memories are written in compressed blocks; a small JSON index keeps each block's offset
+    and keyword set so a search only memory-maps and decompresses blocks that can match.
+    """
+    def __init__(self, archive_file):
+        self.archive_file = archive_file
+        self.index_file = f"{archive_file}.index"
+        self.blocks = []  # {"offset", "length", "count", "max_id", "keywords"}
+        self.lock = threading.Lock()
+        self.mapping = None
+        self.mapped_size = 0
+        self.load_index()
+
+    @property
+    def count(self):
+        return sum(block["count"] for block in self.blocks)
+
+    @property
+    def max_id(self):
+        return max((block["max_id"] for block in self.blocks), default=-1)
+
+    def load_index(self):
+        """Load the block index, dropping blocks the archive file does not fully contain"""
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                blocks = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading cold memory index: {e}")
+            return
+        size = os.path.getsize(self.archive_file) if os.path.exists(self.archive_file) else 0
+        for block in blocks:
+            if block["offset"] + block["length"] <= size:
+                block["keywords"] = set(block["keywords"])
+                self.blocks.append(block)
+
+    def save_index(self):
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump([dict(block, keywords=sorted(block["keywords"])) for block in self.blocks], f)
+        os.replace(temp_file, self.index_file)
+
+    def append(self, memories):
+        """Compress memories into a new block at the end of the archive"""
+        if not memories:
+            return
+        data = zlib.compress(json.dumps(memories, ensure_ascii=False).encode('utf-8'), 6)
+        with self.lock:
+            with open(self.archive_file, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            keywords = set()
+            for memory in memories:
+                keywords.update(memory.get("keywords", []))
+            self.blocks.append({
+                "offset": offset,
+                "length": len(data),
+                "count": len(memories),
+                "max_id": max(memory["id"] for memory in memories),
+                "keywords": keywords
+            })
+            self.save_index()
+
+    def read_block(self, block):
+        """Decompress one block through a read-only memory map of the archive"""
+        with self.lock:
+            end = block["offset"] + block["length"]
+            if self.mapping is None or end > self.mapped_size:
+                if self.mapping is not None:
+                    self.mapping.close()
+                with open(self.archive_file, 'rb') as f:
+                    self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.mapped_size = len(self.mapping)
+            data = self.mapping[block["offset"]:end]
+        return json.loads(zlib.decompress(data).decode('utf-8'))
+
+    def search(self, query, query_keywords, n, min_similarity):
+        """Score archived memories that share a keyword with the query"""
+        query_keyword_set = set(query_keywords)
+        candidates = []
+        for block in self.blocks:
+            if query_keyword_set and not (block["keywords"] & query_keyword_set):
+                continue
+            for memory in self.read_block(block):
+                if not query_keyword_set or query_keyword_set.intersection(memory.get("keywords", [])):
+                    candidates.append(memory)
+        return top_similar_memories(query, query_keywords, candidates, n, min_similarity)
+
+
 class JSONMemorySystem:
-    def __init__(self, memory_file="memory.json"):
+    STOP_WORDS = {
+        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
+        'of', 'with', 'by', 'from', 'up', 'about', 'into', 'through', 'during',
+        'before', 'after', 'above', 'below', 'between', 'among', 'this', 'that',
+        'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me',
+        'him', 'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our',
+        'their', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have',
+        'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should'
+    }
+
+    def __init__(self, memory_file="memory.json", compact_threshold=500, scorer="heuristic", bm25_weight=0.5,
+                 shard_threshold=0, shard_workers=None, hot_capacity=10000, dedup_threshold=0.7):
         self.memory_file = memory_file
+        self.index_file = f"{memory_file}.index"
+        self.journal_file = f"{memory_file}.journal"
+        self.usage_file = f"{memory_file}.usage"
+        # At most hot_capacity memories stay in RAM; the least important go to the cold archive (None = unbounded)
+        self.hot_capacity = hot_capacity
+        self.cold_archive = ColdMemoryArchive(f"{memory_file}.cold")
+        self.usage = self.load_usage()  # memory id -> [retrieval hits, last retrieval time]
+        # Usage is flushed on its own schedule (every usage_flush_hits hits or usage_flush_interval
+        # seconds), not only at compaction, so eviction keeps its stats across restarts
+        self.usage_flush_hits = 20
+        self.usage_flush_interval = 300
+        self.usage_dirty = 0
+        self.usage_saved_at = time.monotonic()
+        # A new memory that restates a stored one replaces it at save time (None disables).
+        # The LSH index is built on the first save so startup stays fast.
+        self.dedup = MinHashDeduplicator(dedup_threshold) if dedup_threshold else None
+        self.dedup_ready = False
+        self.duplicates_superseded = 0
+        # Called with the ids of memories that leave the hot set (evicted, superseded or compacted)
+        self.removal_listeners = []
+        self.compact_threshold = compact_threshold  # Journal entries before folding into the snapshot
+        self.lock = threading.RLock()
+        self.pending_entries = []  # Entries waiting for a group commit
+        self.batch_depth = 0
+        self.journal_entries = 0
+        # "heuristic" scores keyword-index candidates with calculate_similarity only;
+        # "bm25" ranks the whole corpus with BM25 and blends in calculate_similarity
+        self.scorer = scorer
+        self.bm25_weight = bm25_weight
+        self.bm25_rerank_factor = 10  # BM25 candidates re-scored per requested result
+        self.bm25 = BM25MemoryScorer(self.tokenize) if scorer == "bm25" else None
+        # Stores with at least shard_threshold memories are scored on a process pool (0 disables).
+        # Opt-in: the hot set never grows past hot_capacity, so the threshold must be below it
+        if shard_threshold and hot_capacity and shard_threshold > hot_capacity:
+            print(f"Memory shard threshold {shard_threshold} is above the hot capacity {hot_capacity}, "
+                  f"sharding will never start")
+        self.shard_threshold = shard_threshold
+        self.shard_workers = shard_workers
+        self.shard_pool = None
+        # Query-result cache; every write bumps the generation so stale results are never served
+        self.generation = 0
+        self.result_cache = OrderedDict()  # (query, n, min_similarity) -> (generation, time, results)
+        self.result_cache_size = 256
+        self.result_cache_ttl = 600  # seconds
+        self.cache_hits = 0
+        self.cache_misses = 0
         self.memories = self.load_memories()
+        self.load_keyword_index()
+        self.replay_journal()
+        self.enforce_capacity()
     
     def load_memories(self):
-        """Load memories from JSON file"""
+        """Load the memory snapshot from JSON file"""
         if os.path.exists(self.memory_file):
             try:
                 with open(self.memory_file, 'r', encoding='utf-8') as f:
@@ -702,110 +1241,504 @@ class JSONMemorySystem:
                 return []
         return []
     
-    def save_memories(self):
-        """Save memories to JSON file"""
+    def replay_journal(self):
+        """Apply memories appended to the journal since the last snapshot"""
+        if not os.path.exists(self.journal_file):
+            return
+        
+        replayed = 0
         try:
-            # Create backup before saving
-            if os.path.exists(self.memory_file):
-                backup_file = f"{self.memory_file}.backup"
-                with open(self.memory_file, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-            
-            # Save current memories
-            with open(self.memory_file, 'w', encoding='utf-8') as f:
-                json.dump(self.memories, f, indent=2, ensure_ascii=False)
+            with open(self.journal_file, 'rb+') as f:
+                good_offset = 0
+                for line in f:
+                    try:
+                        memory = json.loads(line.decode('utf-8')) if line.strip() else None
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        memory = None
+                    if memory is None or not line.endswith(b"\n"):
+                        if line.strip():
+                            # A torn write from a crash can only be the last line - cut it off
+                            print("⚠️ Dropping incomplete memory journal entry")
+                            f.truncate(good_offset)
+                            break
+                        good_offset += len(line)
+                        continue
+                    good_offset += len(line)
+                    self.journal_entries += 1
+                    # Entries already in the snapshot (crash during compaction) are skipped
+                    if memory.get("id") in self.memories_by_id:
+                        continue
+                    if memory.get("supersedes") in self.memories_by_id:
+                        self.remove_hot_memory(memory["supersedes"], inherit_to=memory["id"])
+                    self.memories.append(memory)
+                    self.index_memory(memory)
+                    replayed += 1
         except IOError as e:
-            print(f"Error saving memories: {e}")
+            print(f"Error reading memory journal: {e}")
+            return
+        
+        if replayed:
+            print(f"💾 Replayed {replayed} memories from journal")
+        if self.journal_entries >= self.compact_threshold:
+            self.save_memories()
+    
+    def save_memories(self):
+        """Compact all memories into the JSON snapshot and clear the journal"""
+        with self.lock:
+            try:
+                # Write to a temp file and swap it in so a crash never leaves a half-written snapshot
+                temp_file = f"{self.memory_file}.tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.memories, f, indent=2, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.memory_file)
+                
+                # Everything in the journal is now in the snapshot
+                with open(self.journal_file, 'w', encoding='utf-8'):
+                    pass
+                self.journal_entries = 0
+                self.save_keyword_index()
+                self.save_usage()
+            except IOError as e:
+                print(f"Error saving memories: {e}")
+    
+    def append_to_journal(self, entries):
+        """Append memory entries to the journal with a single write and fsync"""
+        if not entries:
+            return
+        
+        with self.lock:
+            # The snapshot file doubles as the "have we met before" marker, so create it first
+            if not os.path.exists(self.memory_file):
+                self.save_memories()
+                return
+            
+            try:
+                lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.journal_entries += len(entries)
+            except IOError as e:
+                print(f"Error writing memory journal: {e}")
+                return
+            
+            if self.journal_entries >= self.compact_threshold:
+                self.save_memories()
+    
+    @contextmanager
+    def batch(self):
+        """Group commit: memories saved inside this block are written to disk together"""
+        with self.lock:
+            self.batch_depth += 1
+            try:
+                yield
+            finally:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    entries, self.pending_entries = self.pending_entries, []
+                    self.append_to_journal(entries)
+                    self.enforce_capacity()
     
     def save_memory(self, role, content):
         """Save a new memory entry"""
         timestamp = datetime.now().isoformat()
-        memory_entry = {
-            "id": len(self.memories),
-            "role": role,
-            "content": content.strip(),
-            "timestamp": timestamp,
-            "keywords": self.extract_keywords(content)
-        }
-        
-        self.memories.append(memory_entry)
-        self.save_memories()
+        with self.lock:
+            duplicate = self.find_duplicate(content)
+            
+            memory_entry = {
+                "id": self.next_id,
+                "role": role,
+                "content": content.strip(),
+                "timestamp": timestamp,
+                "keywords": self.extract_keywords(content)
+            }
+            if duplicate is not None:
+                # Same fact in newer words - the new entry replaces the stored one (newest wins,
+                # as in compact_duplicates) and inherits its retrieval hits
+                memory_entry["supersedes"] = duplicate["id"]
+                self.remove_hot_memory(duplicate["id"], inherit_to=memory_entry["id"])
+                self.duplicates_superseded += 1
+                print(f"💾 Memory replaces an older version: {duplicate['content'][:50]}...")
+            
+            self.memories.append(memory_entry)
+            self.index_memory(memory_entry)
+            self.generation += 1
+            if self.shard_pool:
+                self.shard_pool.add(memory_entry)
+            if self.batch_depth:
+                self.pending_entries.append(memory_entry)
+            else:
+                self.append_to_journal([memory_entry])
+                self.enforce_capacity()
         print(f"💾 Memory saved: {content[:50]}...")
+        return memory_entry
+
+    # ---------- Keyword index ----------
+    def load_keyword_index(self):
+        """Load the keyword -> memory IDs index, rebuilding it if it is missing or stale"""
+        self.ensure_unique_ids()
+        self.memories_by_id = {memory["id"]: memory for memory in self.memories}
+        # IDs of archived memories are never reused
+        self.next_id = max(max(self.memories_by_id, default=-1), self.cold_archive.max_id) + 1
+
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # Only trust the stored index if it describes the memories we just loaded
+                if data.get("count") == len(self.memories) and data.get("next_id") == self.next_id:
+                    self.keyword_index = {kw: set(ids) for kw, ids in data.get("index", {}).items()}
+                    if self.bm25:
+                        self.bm25.rebuild(self.memories)
+                    return
+            except (json.JSONDecodeError, IOError, AttributeError) as e:
+                print(f"Error loading memory index: {e}")
+
+        self.rebuild_keyword_index()
+        if self.memories:
+            self.save_keyword_index()
+
+    def ensure_unique_ids(self):
+        """Give every memory a unique ID (older files could repeat IDs after cleanup)"""
+        seen = set()
+        next_id = max((m.get("id", -1) for m in self.memories), default=-1) + 1
+        for memory in self.memories:
+            if memory.get("id") in seen or not isinstance(memory.get("id"), int):
+                memory["id"] = next_id
+                next_id += 1
+            seen.add(memory["id"])
+
+    def rebuild_keyword_index(self):
+        """Rebuild the keyword index from scratch"""
+        self.keyword_index = {}
+        self.memories_by_id = {}
+        if self.bm25:
+            self.bm25.clear()
+        if self.dedup:
+            self.dedup.clear()
+            self.dedup_ready = False
+        for memory in self.memories:
+            self.index_memory(memory)
+        if self.shard_pool:
+            self.shard_pool.load(self.memories)
+
+    def index_memory(self, memory):
+        """Add a single memory to the keyword index"""
+        self.memories_by_id[memory["id"]] = memory
+        self.next_id = max(self.next_id, memory["id"] + 1)
+        for keyword in memory.get("keywords", []):
+            self.keyword_index.setdefault(keyword, set()).add(memory["id"])
+        if self.bm25:
+            self.bm25.add(memory)
+        if self.dedup_ready:
+            self.dedup.add(memory["id"], memory["content"])
+
+    def save_keyword_index(self):
+        """Persist the keyword index next to the memory file"""
+        try:
+            with open(self.index_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "count": len(self.memories),
+                    "next_id": self.next_id,
+                    "index": {kw: sorted(ids) for kw, ids in self.keyword_index.items()}
+                }, f, ensure_ascii=False)
+        except IOError as e:
+            print(f"Error saving memory index: {e}")
+
+    def get_candidate_memories(self, query_keywords):
+        """Return memories sharing at least one keyword with the query, in storage order"""
+        candidate_ids = set()
+        for keyword in query_keywords:
+            candidate_ids |= self.keyword_index.get(keyword, set())
+        candidates = [self.memories_by_id[mid] for mid in candidate_ids if mid in self.memories_by_id]
+        # Keep storage order so ties are ranked the same way as a full scan
+        candidates.sort(key=lambda m: m["id"])
+        return candidates
     
-    def extract_keywords(self, text):
-        """Extract keywords from text for better matching"""
+    def tokenize(self, text):
+        """Split text into lowercase words, dropping stop words and very short words"""
         # Clean text and extract words
         clean_text = re.sub(r'[^\w\s]', ' ', text.lower())
         words = clean_text.split()
         
         # Filter out common words (basic stop words)
-        stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
-            'of', 'with', 'by', 'from', 'up', 'about', 'into', 'through', 'during',
-            'before', 'after', 'above', 'below', 'between', 'among', 'this', 'that',
-            'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me',
-            'him', 'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our',
-            'their', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have',
-            'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should'
-        }
-        
-        meaningful_words = [word for word in words if len(word) > 2 and word not in stop_words]
+        return [word for word in words if len(word) > 2 and word not in self.STOP_WORDS]
+    
+    def extract_keywords(self, text):
+        """Extract keywords from text for better matching"""
+        meaningful_words = self.tokenize(text)
         
         # Return most frequent words (up to 10)
         word_freq = Counter(meaningful_words)
         return [word for word, count in word_freq.most_common(10)]
     
-    def calculate_similarity(self, query, memory_content, memory_keywords):
+    def calculate_similarity(self, query, memory_content, memory_keywords, query_keywords=None):
         """Calculate similarity between query and memory using multiple methods"""
-        query_lower = query.lower()
-        content_lower = memory_content.lower()
-        
-        # 1. Direct substring matching (highest weight)
-        direct_match = 0
-        if query_lower in content_lower or content_lower in query_lower:
-            direct_match = 0.8
-        
-        # 2. Sequence similarity
-        sequence_sim = SequenceMatcher(None, query_lower, content_lower).ratio() * 0.6
-        
-        # 3. Keyword matching
-        query_keywords = self.extract_keywords(query)
-        keyword_matches = len(set(query_keywords) & set(memory_keywords))
-        keyword_sim = (keyword_matches / max(len(query_keywords), 1)) * 0.7
-        
-        # 4. Word overlap
-        query_words = set(query_lower.split())
-        content_words = set(content_lower.split())
-        word_overlap = len(query_words & content_words) / max(len(query_words | content_words), 1) * 0.5
-        
-        # Combined similarity score
-        total_similarity = direct_match + sequence_sim + keyword_sim + word_overlap
-        return min(total_similarity, 1.0)  # Cap at 1.0
+        if query_keywords is None:
+            query_keywords = self.extract_keywords(query)
+        return memory_similarity(query, memory_content, memory_keywords, query_keywords)
     
     def get_relevant_memory(self, query, n=5, min_similarity=0.1):
         """Get most relevant memories for a query"""
-        if not self.memories:
+        if not self.memories and not self.cold_archive.count:
             return []
         
-        # Calculate similarity scores for all memories
-        scored_memories = []
-        for memory in self.memories:
-            similarity = self.calculate_similarity(
-                query, 
-                memory['content'], 
-                memory.get('keywords', [])
-            )
+        cache_key = (" ".join(query.lower().split()), n, min_similarity)
+        generation = self.generation
+        cached = self.get_cached_result(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Extract query keywords once and only score memories that share one of them
+        query_keywords = self.extract_keywords(query)
+        if self.bm25 and query_keywords:
+            scored_memories = self.score_memories_bm25(query, query_keywords, n, min_similarity)
+        elif self.should_shard():
+            scored_memories = self.shard_pool.score(query, query_keywords, n, min_similarity)
+        else:
+            if query_keywords:
+                candidates = self.get_candidate_memories(query_keywords)
+            else:
+                # Nothing to look up (e.g. only stop words) - fall back to scanning everything
+                candidates = self.memories
             
-            if similarity >= min_similarity:
-                scored_memories.append((similarity, memory))
+            # Score candidate memories, keeping only the top n
+            scored_memories = top_similar_memories(query, query_keywords, candidates, n, min_similarity)
+        
+        # Too few hot matches - look through the cold archive as well
+        if len(scored_memories) < n and self.cold_archive.count:
+            cold_memories = self.cold_archive.search(query, query_keywords, n, min_similarity)
+            scored_memories = scored_memories + [(score, memory) for score, memory in cold_memories
+                                                 if memory["id"] not in self.memories_by_id]
         
         # Sort by similarity (descending) and return top n
         scored_memories.sort(key=lambda x: x[0], reverse=True)
+        scored_memories = scored_memories[:n]
+        memory_ids = [memory["id"] for _, memory in scored_memories]
+        self.record_hits(memory_ids)
+        relevant_memories = self.format_memories(scored_memories)
+        self.cache_result(cache_key, generation, relevant_memories, memory_ids)
+        return relevant_memories
+    
+    # ---------- Result cache ----------
+    def get_cached_result(self, key):
+        """Return a cached result if it is still fresh and no memory changed since"""
+        with self.lock:
+            entry = self.result_cache.get(key)
+            if entry is not None:
+                generation, created_at, results, memory_ids = entry
+                if generation == self.generation and time.time() - created_at < self.result_cache_ttl:
+                    self.result_cache.move_to_end(key)
+                    self.cache_hits += 1
+                    self.record_hits(memory_ids)
+                    return list(results)
+                del self.result_cache[key]
+            self.cache_misses += 1
+            return None
+    
+    def cache_result(self, key, generation, results, memory_ids):
+        """Store a result computed at the given generation"""
+        with self.lock:
+            if generation != self.generation:
+                return  # A memory was written while we were scoring
+            self.result_cache[key] = (generation, time.time(), list(results), memory_ids)
+            self.result_cache.move_to_end(key)
+            while len(self.result_cache) > self.result_cache_size:
+                self.result_cache.popitem(last=False)
+    
+    def cache_stats(self):
+        """Hit/miss counters for the result cache"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "size": len(self.result_cache),
+            "generation": self.generation
+        }
+    
+    # ---------- Near-duplicate detection ----------
+    def ensure_dedup_index(self):
+        """Build the MinHash LSH index over the hot memories if it is not built yet"""
+        if self.dedup and not self.dedup_ready:
+            for memory in self.memories:
+                self.dedup.add(memory["id"], memory["content"])
+            self.dedup_ready = True
+    
+    def remove_hot_memory(self, memory_id, inherit_to=None):
+        """Drop one hot memory from the store and its indexes (used when a newer version replaces it)"""
+        memory = self.memories_by_id.pop(memory_id, None)
+        if memory is None:
+            return
+        self.memories = [m for m in self.memories if m["id"] != memory_id]
+        for keyword in memory.get("keywords", []):
+            ids = self.keyword_index.get(keyword)
+            if ids is not None:
+                ids.discard(memory_id)
+                if not ids:
+                    del self.keyword_index[keyword]
+        if self.dedup_ready:
+            self.dedup.remove(memory_id)
+        if self.bm25 or self.shard_pool:
+            # Neither supports removal; replacements are rare enough to rebuild
+            self.rebuild_keyword_index()
+        stats = self.usage.pop(memory_id, None)
+        if stats and inherit_to is not None:
+            self.usage[inherit_to] = list(stats)
+        self.generation += 1
+        self.notify_removed([memory_id])
+    
+    def notify_removed(self, memory_ids):
+        """Tell the removal listeners (e.g. the ChromaDB index) which memories are gone"""
+        for listener in self.removal_listeners:
+            try:
+                listener(memory_ids)
+            except Exception as e:
+                print(f"Error removing memories from index: {e}")
+    
+    def find_duplicate(self, content):
+        """Return a stored memory that is a near-duplicate of content, if any"""
+        if not self.dedup:
+            return None
+        with self.lock:
+            self.ensure_dedup_index()
+            return self.dedup.find_duplicate(content.strip(), self.memories_by_id)
+    
+    def compact_duplicates(self):
+        """Offline pass: fold near-duplicate memories into the newest copy and report the savings"""
+        if not self.dedup:
+            return {"before": len(self.memories), "after": len(self.memories), "removed": 0}
+        
+        with self.lock:
+            self.ensure_dedup_index()
+            files = [self.memory_file, self.journal_file]
+            bytes_before = sum(os.path.getsize(f) for f in files if os.path.exists(f))
+            
+            # Union-find over LSH candidate pairs that pass the exact similarity check
+            parent = {memory["id"]: memory["id"] for memory in self.memories}
+            
+            def find(memory_id):
+                while parent[memory_id] != memory_id:
+                    parent[memory_id] = parent[parent[memory_id]]
+                    memory_id = parent[memory_id]
+                return memory_id
+            
+            for memory in self.memories:
+                for other_id in self.dedup.candidates(memory["content"]):
+                    if other_id <= memory["id"] or other_id not in parent:
+                        continue
+                    other = self.memories_by_id[other_id]
+                    if self.dedup.is_duplicate(memory["content"], other["content"]):
+                        parent[find(other_id)] = find(memory["id"])
+            
+            clusters = {}
+            for memory in self.memories:
+                clusters.setdefault(find(memory["id"]), []).append(memory)
+            
+            # Keep the newest phrasing of each fact; it inherits the cluster's retrieval hits
+            removed_ids = set()
+            for cluster in clusters.values():
+                if len(cluster) < 2:
+                    continue
+                keep = max(cluster, key=lambda m: m["id"])
+                hits = sum(self.usage.get(m["id"], (0, 0))[0] for m in cluster)
+                last_used = max((self.usage.get(m["id"], (0, 0))[1] for m in cluster), default=0)
+                if hits:
+                    self.usage[keep["id"]] = [hits, last_used]
+                for memory in cluster:
+                    if memory is not keep:
+                        removed_ids.add(memory["id"])
+                        self.usage.pop(memory["id"], None)
+            
+            before = len(self.memories)
+            if removed_ids:
+                self.memories = [m for m in self.memories if m["id"] not in removed_ids]
+                self.rebuild_keyword_index()
+                self.generation += 1
+                self.save_memories()
+                self.notify_removed(sorted(removed_ids))
+            bytes_after = sum(os.path.getsize(f) for f in files if os.path.exists(f))
         
+        report = {
+            "before": before,
+            "after": len(self.memories),
+            "removed": len(removed_ids),
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "shrink_percent": round(100 * (1 - bytes_after / bytes_before), 1) if bytes_before else 0.0
+        }
+        print(f"🧹 Memory compaction: {before} -> {report['after']} memories, "
+              f"{bytes_before} -> {bytes_after} bytes ({report['shrink_percent']}% smaller)")
+        return report
+    
+    # ---------- Capacity management ----------
+    def load_usage(self):
+        """Load per-memory retrieval statistics"""
+        if os.path.exists(self.usage_file):
+            try:
+                with open(self.usage_file, 'r', encoding='utf-8') as f:
+                    return {int(memory_id): stats for memory_id, stats in json.load(f).items()}
+            except (json.JSONDecodeError, IOError, ValueError) as e:
+                print(f"Error loading memory usage: {e}")
+        return {}
+    
+    def save_usage(self):
+        with self.lock:
+            try:
+                temp_file = f"{self.usage_file}.tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.usage, f)
+                os.replace(temp_file, self.usage_file)
+                self.usage_dirty = 0
+                self.usage_saved_at = time.monotonic()
+            except IOError as e:
+                print(f"Error saving memory usage: {e}")
+    
+    def flush_usage(self):
+        """Write retrieval stats that changed since the last save (e.g. at shutdown)"""
+        with self.lock:
+            if self.usage_dirty:
+                self.save_usage()
+    
+    def record_hits(self, memory_ids):
+        """Count a retrieval for each hot memory returned to the prompt"""
+        now = time.time()
+        with self.lock:
+            for memory_id in memory_ids:
+                if memory_id in self.memories_by_id:
+                    stats = self.usage.setdefault(memory_id, [0, now])
+                    stats[0] += 1
+                    stats[1] = now
+                    self.usage_dirty += 1
+            if self.usage_dirty and (self.usage_dirty >= self.usage_flush_hits
+                                     or time.monotonic() - self.usage_saved_at >= self.usage_flush_interval):
+                self.save_usage()
+    
+    def retention_score(self, memory, now):
+        """How much a memory deserves to stay hot: retrieval hits plus recency of use or creation"""
+        hits, last_used = self.usage.get(memory["id"], (0, None))
+        if last_used is None:
+            try:
+                last_used = datetime.fromisoformat(memory["timestamp"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                last_used = 0
+        age_days = max(now - last_used, 0) / 86400
+        return math.log1p(hits) + math.exp(-age_days / 30)
+    
+    def enforce_capacity(self):
+        """Evict a batch of memories once the hot set outgrows hot_capacity"""
+        if self.hot_capacity and len(self.memories) > self.hot_capacity:
+            # Evict 10% below capacity so the snapshot is not rewritten on every save
+            self.cleanup_old_memories(self.hot_capacity - self.hot_capacity // 10)
+    
+    def format_memories(self, scored_memories):
+        """Turn ranked (score, memory) pairs into the strings added to the prompt"""
         # Return just the content of top memories
         relevant_memories = []
-        for score, memory in scored_memories[:n]:
+        for score, memory in scored_memories:
             # Include timestamp context for very relevant memories
             if score > 0.5:
                 time_context = f"[{memory['role']}] {memory['content']}"
@@ -815,23 +1748,218 @@ class JSONMemorySystem:
         
         return relevant_memories
     
+    def should_shard(self):
+        """Start the shard pool once the store is big enough; small stores stay single-process"""
+        if self.shard_pool:
+            return True
+        if not self.shard_threshold or len(self.memories) < self.shard_threshold:
+            return False
+        with self.lock:
+            if self.shard_pool is None:
+                try:
+                    self.shard_pool = MemoryShardPool(self.memories, self.shard_workers)
+                except Exception as e:
+                    print(f"Could not start memory shard pool, scoring in-process: {e}")
+                    self.shard_threshold = 0
+        return self.shard_pool is not None
+    
+    def score_memories_bm25(self, query, query_keywords, n, min_similarity):
+        """Rank the corpus with BM25, then blend the best candidates with calculate_similarity"""
+        top = self.bm25.top(self.tokenize(query), max(n * self.bm25_rerank_factor, n))
+        if not top:
+            return []
+        
+        best_score = top[0][1] or 1.0
+        scored_memories = []
+        for row, bm25_score in top:
+            memory = self.memories_by_id.get(self.bm25.doc_ids[row])
+            if memory is None:
+                continue
+            similarity = self.bm25_weight * (bm25_score / best_score)
+            if self.bm25_weight < 1:
+                similarity += (1 - self.bm25_weight) * self.calculate_similarity(
+                    query,
+                    memory['content'],
+                    memory.get('keywords', []),
+                    query_keywords
+                )
+            if similarity >= min_similarity:
+                scored_memories.append((similarity, memory))
+        return scored_memories
+    
     def cleanup_old_memories(self, max_memories=1000):
-        """Keep only the most recent memories to prevent file from growing too large"""
-        if len(self.memories) > max_memories:
-            # Keep the most recent memories
-            self.memories = self.memories[-max_memories:]
+        """Move the least important memories to the cold archive, keeping max_memories hot"""
+        with self.lock:
+            if len(self.memories) <= max_memories:
+                return
+            now = time.time()
+            ranked = sorted(self.memories, key=lambda m: self.retention_score(m, now))
+            evicted = ranked[:len(self.memories) - max_memories]
+            evicted_ids = {memory["id"] for memory in evicted}
+            
+            # Archive first: a crash before the snapshot rewrite leaves a duplicate, never a loss
+            self.cold_archive.append(evicted)
+            self.memories = [m for m in self.memories if m["id"] not in evicted_ids]
+            for memory_id in evicted_ids:
+                self.usage.pop(memory_id, None)
+            self.rebuild_keyword_index()
+            self.generation += 1
             self.save_memories()
-            print(f"🧹 Cleaned up memories, kept {max_memories} most recent entries")
+            self.notify_removed(sorted(evicted_ids))
+            print(f"🧹 Archived {len(evicted)} memories, kept {max_memories} most important entries")
+
+class HashedNgramEmbedding:
+    """Deterministic, offline text embedding built from hashed word and character n-grams"""
+    def __init__(self, dimensions=384, cache_size=10000):
+        self.dimensions = dimensions
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # content hash -> embedding
+        self.lock = threading.Lock()
+
+    def features(self, text):
+        """Yield the word unigrams, word bigrams and character trigrams of a text"""
+        words = re.sub(r'[^\w\s]', ' ', text.lower()).split()
+        for i, word in enumerate(words):
+            yield "w:" + word
+            if i:
+                yield "b:" + words[i - 1] + " " + word
+            padded = f"#{word}#"
+            for j in range(len(padded) - 2):
+                yield "c:" + padded[j:j + 3]
+
+    def embed(self, text):
+        """Embed one text, reusing the cached vector for identical content"""
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.move_to_end(key)
+                return cached
+
+        vector = [0.0] * self.dimensions
+        for feature in self.features(text):
+            # crc32 is stable across runs, unlike hash()
+            h = zlib.crc32(feature.encode('utf-8'))
+            vector[h % self.dimensions] += 1.0 if h & 0x80000000 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        vector = [v / norm for v in vector]
+
+        with self.lock:
+            self.cache[key] = vector
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return vector
+
+    def __call__(self, texts):
+        return [self.embed(text) for text in texts]
+
+
+class ChromaMemoryBackend:
+    """Vector search over the JSON memories using a local persistent ChromaDB collection.
+
+    eva_memory.json stays the source of truth; the collection is only a search index.
+    At startup it is reconciled with the JSON memories by id, and afterwards every save,
+    eviction, supersede and compaction in the JSON store is mirrored into it.
+    """
+    def __init__(self, json_memory, path="eva_memory_chroma", collection_name="eva_memories", batch_size=1000):
+        self.json_memory = json_memory
+        self.embedding = HashedNgramEmbedding()
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=None,  # Embeddings are always supplied by HashedNgramEmbedding
+            metadata={"hnsw:space": "cosine"}
+        )
+        self.batch_size = batch_size
+        self.migrate()
+        json_memory.removal_listeners.append(self.remove_memories)
+
+    def migrate(self):
+        """Bring the collection in line with the JSON memories, comparing ids rather than counts"""
+        memories = self.json_memory.memories
+        existing = set(self.collection.get(include=[])["ids"])
+        wanted = {str(m["id"]) for m in memories}
+        stale = list(existing - wanted)  # Archived, superseded or compacted in the JSON store
+        self.remove_memories(stale)
+        if stale:
+            print(f"💾 Removed {len(stale)} stale memories from ChromaDB")
+
+        missing = [m for m in memories if str(m["id"]) not in existing]
+        for start in range(0, len(missing), self.batch_size):
+            self.add_memories(missing[start:start + self.batch_size])
+        if missing:
+            print(f"💾 Migrated {len(missing)} memories to ChromaDB")
+
+    def add_memories(self, memories):
+        """Add memories to the collection in one call"""
+        if not memories:
+            return
+        self.collection.upsert(
+            ids=[str(m["id"]) for m in memories],
+            documents=[m["content"] for m in memories],
+            embeddings=self.embedding([m["content"] for m in memories]),
+            metadatas=[{"role": m["role"], "timestamp": m["timestamp"]} for m in memories]
+        )
+
+    def remove_memories(self, memory_ids):
+        """Delete memories from the collection, in batches"""
+        memory_ids = [str(memory_id) for memory_id in memory_ids]
+        for start in range(0, len(memory_ids), self.batch_size):
+            self.collection.delete(ids=memory_ids[start:start + self.batch_size])
+
+    def save_memory(self, role, content):
+        # Supersedes and evictions reach the collection through remove_memories
+        memory_entry = self.json_memory.save_memory(role, content)
+        if memory_entry["id"] not in self.json_memory.memories_by_id:
+            return memory_entry  # Evicted straight away by the capacity limit
+        try:
+            self.add_memories([memory_entry])
+        except Exception as e:
+            print(f"Error adding memory to ChromaDB: {e}")
+        return memory_entry
+
+    def get_relevant_memory(self, query, n=5, min_similarity=0.1):
+        count = self.collection.count()
+        if not count:
+            return []
+
+        results = self.collection.query(
+            query_embeddings=[self.embedding.embed(query)],
+            n_results=min(n, count),
+            include=["distances"]
+        )
+        scored_memories = []
+        for memory_id, distance in zip(results["ids"][0], results["distances"][0]):
+            memory = self.json_memory.memories_by_id.get(int(memory_id))
+            similarity = 1.0 - distance  # Cosine distance -> similarity
+            if memory is not None and similarity >= min_similarity:
+                scored_memories.append((similarity, memory))
+        return self.json_memory.format_memories(scored_memories)
+
+
 # Initialize the JSON memory system
-json_memory = JSONMemorySystem("eva_memory.json")
+# Shard worker processes re-import this module; they must not load their own copy of the memories
+IS_WORKER_PROCESS = multiprocessing.parent_process() is not None
+# Set EVA_MEMORY_SHARD_THRESHOLD (below the 10k hot capacity) to score large stores on a process pool
+MEMORY_SHARD_THRESHOLD = int(os.environ.get("EVA_MEMORY_SHARD_THRESHOLD", "0"))
+json_memory = JSONMemorySystem("eva_memory.json", shard_threshold=MEMORY_SHARD_THRESHOLD) if not IS_WORKER_PROCESS else None
+
+# "json" (default) or "chroma" for the offline vector search backend
+MEMORY_BACKEND = os.environ.get("EVA_MEMORY_BACKEND", "json").lower()
+memory_backend = json_memory
+if MEMORY_BACKEND == "chroma" and not IS_WORKER_PROCESS:
+    try:
+        memory_backend = ChromaMemoryBackend(json_memory)
+    except Exception as e:
+        print(f"ChromaDB memory backend unavailable, using JSON memory: {e}")
 
 def save_memory(role, content):
     """Replacement for ChromaDB save_memory function"""
-    json_memory.save_memory(role, content)
+    memory_backend.save_memory(role, content)
 
 def get_relevant_memory(query, n=3):
     """Replacement for ChromaDB get_relevant_memory function"""
-    return json_memory.get_relevant_memory(query, n)
+    return memory_backend.get_relevant_memory(query, n)
 
 # ==================================================================== JSON MEMORY SYSTEM =========================================================
 
@@ -1195,12 +2323,8 @@ class AlarmSystem:
             
             print(f"🚨 Calling Eva API with alarm: {alarm_name}")
             
-            # Process the alarm notification through Eva's system
-            threading.Thread(
-                target=self.chatbot_instance.process_alarm_notification, 
-                args=(alarm_message,), 
-                daemon=True
-            ).start()
+            # Process the alarm notification through Eva's system, on the shared event loop
+            async_runtime.submit(self.chatbot_instance.process_alarm_notification_async(alarm_message))
             
         except Exception as e:
             print(f"Error triggering alarm: {e}")
@@ -1242,39 +2366,107 @@ SCOPES = [
     'https://www.googleapis.com/auth/gmail.modify'
 ]
 
-# ============================= GMAIL =============================
-def gmail_authenticate():
-    """Authenticate with Gmail API"""
-    creds = None
-    
-    if os.path.exists('token.json'):
-        try:
-            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-        except Exception as e:
-            print(f"Error loading token: {e}")
-            os.remove('token.json')
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-            except Exception as e:
-                print(f"Error refreshing token: {e}")
-                os.remove('token.json')
-                return gmail_authenticate()
+class GoogleServiceManager:
+    """Process-wide Google credentials and API clients.
+
+    token.json is read once and the credentials are refreshed shortly before they
+    expire, so no call waits on a refresh. Services are built from the discovery
+    documents bundled with google-api-python-client and cached per thread, because the
+    httplib2 connection inside each one is not thread-safe; a thread keeps reusing its
+    open connection instead of handshaking on every call.
+    """
+    TOKEN_FILE = 'token.json'
+    REFRESH_MARGIN = timedelta(minutes=5)
+
+    def __init__(self, scopes):
+        self.scopes = scopes
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.creds = None
+        self.generation = 0  # Bumped when the credentials object is replaced; thread caches rebuild
+        self.counters = {"loads": 0, "authorizations": 0, "refreshes": 0, "builds": 0, "hits": 0}
+
+    def client_secrets_file(self):
+        if os.path.exists('credentials.json'):
+            return 'credentials.json'
+        return '_internal\\credentials.json'
+
+    def save(self):
+        with open(self.TOKEN_FILE, 'w') as token:
+            token.write(self.creds.to_json())
+
+    def authorize(self):
+        """Run the browser OAuth flow and store the new token"""
+        flow = InstalledAppFlow.from_client_secrets_file(self.client_secrets_file(), self.scopes)
+        self.creds = flow.run_local_server(port=0)
+        self.counters["authorizations"] += 1
+        self.generation += 1
+        self.save()
+
+    def needs_refresh(self):
+        if not self.creds.valid:
+            return True
+        expiry = self.creds.expiry  # Naive UTC, as google-auth stores it
+        return expiry is not None and expiry - self.REFRESH_MARGIN <= datetime.utcnow()
+
+    def credentials(self):
+        """Shared credentials, loaded on first use and refreshed ahead of expiry"""
+        with self.lock:
+            if self.creds is None and os.path.exists(self.TOKEN_FILE):
+                try:
+                    self.creds = Credentials.from_authorized_user_file(self.TOKEN_FILE, self.scopes)
+                    self.counters["loads"] += 1
+                    self.generation += 1
+                except Exception as e:
+                    print(f"Error loading token: {e}")
+                    os.remove(self.TOKEN_FILE)
+            if self.creds is None:
+                self.authorize()
+            elif self.needs_refresh():
+                if self.creds.refresh_token:
+                    try:
+                        # Refreshed in place, so services already built keep working
+                        self.creds.refresh(Request())
+                        self.counters["refreshes"] += 1
+                        self.save()
+                    except Exception as e:
+                        print(f"Error refreshing token: {e}")
+                        if os.path.exists(self.TOKEN_FILE):
+                            os.remove(self.TOKEN_FILE)
+                        self.authorize()
+                else:
+                    self.authorize()
+            return self.creds, self.generation
+
+    def service(self, name, version):
+        """This thread's client for a Google API, built once per credentials"""
+        creds, generation = self.credentials()
+        services = getattr(self.local, "services", None)
+        if services is None or self.local.generation != generation:
+            services = self.local.services = {}
+            self.local.generation = generation
+        service = services.get((name, version))
+        if service is None:
+            service = build(name, version, credentials=creds, static_discovery=True, cache_discovery=False)
+            services[(name, version)] = service
+            with self.lock:
+                self.counters["builds"] += 1
         else:
+            with self.lock:
+                self.counters["hits"] += 1
+        return service
 
-            if os.path.exists('credentials.json'):
-                flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file('_internal\credentials.json', SCOPES)
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
 
-            creds = flow.run_local_server(port=0)
-        
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    
-    return build('gmail', 'v1', credentials=creds)
+
+google_services = GoogleServiceManager(SCOPES)
+
+# ============================= GMAIL =============================
+def gmail_authenticate():
+    """Authenticate with Gmail API"""
+    return google_services.service('gmail', 'v1')
 
 def clean_email_body(body, max_length=300):
     """Clean and truncate email body"""
@@ -1403,20 +2595,217 @@ def mark_email_as_read(identifier):
 
 # ============================= CALENDAR =============================
 def get_calendar_service():
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    else:
-        
-        if os.path.exists('credentials.json'):
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('_internal\credentials.json', SCOPES)
+    return google_services.service('calendar', 'v3')
+
+CALENDAR_SYNC_INTERVAL = int(os.environ.get("EVA_CALENDAR_SYNC_INTERVAL", "60"))
+CALENDAR_TIMEZONE = 'Africa/Cairo'  # Used for all-day events until Google reports the calendar's zone
+# Full syncs only fetch events that end after this many days ago
+CALENDAR_HISTORY_DAYS = int(os.environ.get("EVA_CALENDAR_HISTORY_DAYS", "90"))
 
-        creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    return build('calendar', 'v3', credentials=creds)
+def calendar_fetch_events(sync_token=None, time_min=None):
+    """Every event of the primary calendar ending after time_min, or only what changed since sync_token.
+
+    Returns (events, next_sync_token, calendar time zone). Recurring events come expanded
+    into single instances; deleted ones come back with status 'cancelled'. An expired
+    sync token raises HttpError 410. Google rejects timeMin together with a sync token,
+    so time_min only applies to full syncs.
+    """
+    service = get_calendar_service()
+    events, page_token = [], None
+    while True:
+        params = {'calendarId': 'primary', 'singleEvents': True, 'maxResults': 2500, 'pageToken': page_token}
+        if sync_token:
+            params['syncToken'] = sync_token
+        elif time_min:
+            params['timeMin'] = time_min
+        result = service.events().list(**params).execute()
+        events.extend(result.get('items', []))
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return events, result.get('nextSyncToken'), result.get('timeZone')
+
+
+class CalendarMirror:
+    """Local SQLite store of the primary calendar, kept current with syncToken.
+
+    The first use downloads every event that ends within the last history_days or later;
+    after that a background thread asks Google only for what changed since the last sync
+    token. When Google expires the token (410 Gone) the store is rebuilt from a full sync
+    over the same window. Upcoming events are a range query on the
+    start-time index instead of up to three events().list calls per <calendar_update>.
+    """
+    # While the store holds nothing yet, a failed first sync is retried at most this often
+    SYNC_RETRY = 30
+
+    def __init__(self, path="eva_calendar.db", sync_interval=CALENDAR_SYNC_INTERVAL, history_days=CALENDAR_HISTORY_DAYS):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.history_days = history_days
+        self.lock = threading.RLock()
+        self.sync_lock = threading.Lock()
+        self.db = None
+        self.sync_thread = None
+        self.last_sync = 0.0
+        self.longest_event = 0.0  # Seconds; bounds how far before now an ongoing event can start
+        self.zone = None
+        self.version = 0  # Bumped on every change to the stored events (response cache key)
+        self.last_error = None
+        self.counters = {"syncs": 0, "full_syncs": 0, "resyncs": 0, "changes": 0, "errors": 0, "last_sync_ms": None}
+
+    def connect(self):
+        """Open the database on first use (not at import, worker processes never need it)"""
+        with self.lock:
+            if self.db is not None:
+                return self.db
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id TEXT PRIMARY KEY, recurring_id TEXT, start_ts REAL NOT NULL, end_ts REAL NOT NULL,
+                    data TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS events_by_start ON events (start_ts);
+                CREATE INDEX IF NOT EXISTS events_by_series ON events (recurring_id);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+            self.longest_event = db.execute("SELECT COALESCE(MAX(end_ts - start_ts), 0) FROM events").fetchone()[0]
+            row = db.execute("SELECT value FROM meta WHERE key = 'timezone'").fetchone()
+            self.zone = row[0] if row else None
+            self.db = db
+            return db
+
+    def meta(self, key):
+        with self.lock:
+            row = self.connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock, self.connect() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def timestamp(self, moment):
+        """Epoch seconds of an event start/end; all-day dates start at midnight in the calendar's zone"""
+        if moment.get('dateTime'):
+            return parser.isoparse(moment['dateTime']).timestamp()
+        zone = pytz.timezone(self.zone or CALENDAR_TIMEZONE)
+        return zone.localize(datetime.strptime(moment['date'], '%Y-%m-%d')).timestamp()
+
+    # ----- sync -----
+    def history_start(self):
+        """timeMin for a full sync: history_days back from now, in RFC 3339"""
+        return (datetime.now(timezone.utc) - timedelta(days=self.history_days)).isoformat()
+
+    def ready(self):
+        """Make sure the store holds data and a background sync keeps it fresh.
+
+        Raises while no sync has ever succeeded, so an empty store is never mistaken for
+        'no events'; reads retry the sync at most every SYNC_RETRY seconds meanwhile.
+        """
+        if self.meta('sync_token') is None:
+            if self.last_error is None or time.monotonic() - self.last_sync >= self.SYNC_RETRY:
+                self.sync()
+            if self.meta('sync_token') is None:
+                raise RuntimeError(f"Google Calendar could not be synced: {self.last_error or 'no sync token'}")
+        self.start_background_sync()
+
+    def start_background_sync(self):
+        with self.lock:
+            if self.sync_thread is not None or not self.sync_interval:
+                return
+            self.sync_thread = threading.Thread(target=self.sync_loop, name="eva-calendar-sync", daemon=True)
+            self.sync_thread.start()
+
+    def sync_loop(self):
+        while True:
+            time.sleep(max(self.last_sync + self.sync_interval - time.monotonic(), 1))
+            if time.monotonic() - self.last_sync >= self.sync_interval:
+                self.sync()
+
+    def sync(self):
+        """Apply the changes since the last sync token, or load everything when there is none"""
+        with self.sync_lock:
+            started = time.perf_counter()
+            try:
+                sync_token = self.meta('sync_token')
+                try:
+                    events, next_token, zone = calendar_fetch_events(sync_token, self.history_start())
+                except HttpError as e:
+                    if not sync_token or e.resp.status != 410:
+                        raise
+                    print("🔄 Calendar sync token expired, resyncing everything")
+                    self.counters["resyncs"] += 1
+                    sync_token = None
+                    events, next_token, zone = calendar_fetch_events(time_min=self.history_start())
+
+                if zone:
+                    self.set_meta('timezone', zone)
+                    self.zone = zone
+                # One transaction for the whole batch
+                with self.lock, self.connect() as db:
+                    if sync_token is None:
+                        db.execute("DELETE FROM events")
+                        self.longest_event = 0.0
+                        self.version += 1
+                        self.counters["full_syncs"] += 1
+                    for event in events:
+                        self.write_event(db, event)
+                if next_token:
+                    self.set_meta('sync_token', next_token)
+                with self.lock:
+                    self.last_error = None
+                    self.counters["syncs"] += 1
+                    self.counters["changes"] += len(events)
+                    self.counters["last_sync_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                if events and sync_token:
+                    print(f"🔄 Calendar synced: {len(events)} changes")
+            except Exception as e:
+                with self.lock:
+                    self.last_error = e
+                    self.counters["errors"] += 1
+                print(f"Calendar sync error: {e}")
+            finally:
+                self.last_sync = time.monotonic()
+
+    # ----- writes -----
+    def write_event(self, db, event):
+        """Store an event as Google returned it; a cancelled event or series is removed"""
+        self.version += 1
+        if event.get('status') == 'cancelled':
+            db.execute("DELETE FROM events WHERE id = ? OR recurring_id = ?", (event['id'], event['id']))
+            return
+        start_ts = self.timestamp(event['start'])
+        end_ts = self.timestamp(event['end']) if event.get('end') else start_ts
+        db.execute("INSERT OR REPLACE INTO events (id, recurring_id, start_ts, end_ts, data) VALUES (?, ?, ?, ?, ?)",
+                   (event['id'], event.get('recurringEventId'), start_ts, end_ts, json.dumps(event)))
+        self.longest_event = max(self.longest_event, end_ts - start_ts)
+
+    def apply_event(self, event):
+        """Put an event Eva just created or changed in the store before the next sync"""
+        with self.lock, self.connect() as db:
+            self.write_event(db, event)
+
+    def remove_event(self, event_id):
+        """Remove an event, or every instance when it is a recurring series"""
+        with self.lock, self.connect() as db:
+            self.write_event(db, {'id': event_id, 'status': 'cancelled'})
+
+    # ----- reads -----
+    def upcoming(self, limit=10, now=None):
+        """Events not over yet, by start time: ongoing ones first, then the next ones"""
+        self.ready()
+        now = time.time() if now is None else now
+        with self.lock:
+            rows = self.connect().execute(
+                "SELECT data FROM events WHERE start_ts >= ? AND end_ts > ? ORDER BY start_ts LIMIT ?",
+                (now - self.longest_event, now, limit)
+            ).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def stats(self):
+        with self.lock:
+            events = self.connect().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+            return {"events": events, **self.counters}
+
+
+calendar_mirror = CalendarMirror()
 
 def calendar_set_event(event_details):
     """Create a Google Calendar event"""
@@ -1458,6 +2847,7 @@ def calendar_set_event(event_details):
             calendarId='primary',
             body=event
         ).execute()
+        calendar_mirror.apply_event(created_event)
 
         print(f"✅ Event created successfully!")
         print(f"   Link: {created_event.get('htmlLink')}")
@@ -1469,94 +2859,61 @@ def calendar_set_event(event_details):
         print(f"   Event details that failed: {event_details}")
         return None
 
+def calendar_fetch_upcoming(limit=10):
+    """Events not over yet, straight from Google; raises on failure"""
+    events_result = get_calendar_service().events().list(
+        calendarId='primary',
+        timeMin=datetime.now(timezone.utc).isoformat(),
+        maxResults=limit,
+        singleEvents=True,
+        orderBy='startTime'
+    ).execute()
+    return events_result.get('items', [])
+
 def calendar_get_upcoming_events(limit=10):
-    """Get upcoming Google Calendar events"""
+    """Get upcoming Google Calendar events from the local event store, or from Google while it is unavailable.
+
+    Raises when neither works, so a failed sync is never reported as 'no upcoming events'.
+    """
+    try:
+        events = calendar_mirror.upcoming(limit)
+    except Exception as e:
+        print(f"Calendar store unavailable, fetching from Google: {e}")
+        events = calendar_fetch_upcoming(limit)
+    
+    # Debug: Print first few events if any found
+    if events:
+        for i, event in enumerate(events[:3]):
+            start = event.get('start', {})
+            start_time = start.get('dateTime', start.get('date', 'No time'))
+            print(f"  Event {i+1}: {event.get('summary', 'No title')} - {start_time}")
+    
+    return events
+
+def test_calendar_connection():
+    """Test calendar connection and list all calendars"""
     try:
         service = get_calendar_service()
         
-        # Get current time in local timezone (Egypt time)
-        local_tz = pytz.timezone('Africa/Cairo')
-        now = local_tz.localize(datetime.now())
-        
-        # Also try with UTC time as fallback
-        utc_now = datetime.now(pytz.UTC)
+        # List all calendars
+        calendar_list = service.calendarList().list().execute()
+        calendars = calendar_list.get('items', [])
         
-        print(f"🔍 Calendar search - Local time: {now.isoformat()}")
-        print(f"🔍 Calendar search - UTC time: {utc_now.isoformat()}")
+        #print(f"📅 Found {len(calendars)} calendars:")
+        for calendar in calendars:
+            print(f"  - {calendar['summary']} (ID: {calendar['id']})")
         
-        # Try with local time first
+        # Test getting events from primary calendar
+        #print("\n🔍 Testing primary calendar events...")
         events_result = service.events().list(
             calendarId='primary',
-            timeMin=now.isoformat(),
-            maxResults=limit,
+            maxResults=5,
             singleEvents=True,
             orderBy='startTime'
         ).execute()
         
         events = events_result.get('items', [])
-        
-        # If no events found with local time, try with UTC time
-        if not events:
-            print("⚠️ No events found with local time, trying UTC time...")
-            events_result = service.events().list(
-                calendarId='primary',
-                timeMin=utc_now.isoformat(),
-                maxResults=limit,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            events = events_result.get('items', [])
-        
-        # If still no events, try without timeMin to get all events
-        if not events:
-            print("⚠️ No events found with time filter, getting all events...")
-            events_result = service.events().list(
-                calendarId='primary',
-                maxResults=limit,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            events = events_result.get('items', [])
-        
-        #print(f"📅 Found {len(events)} calendar events")
-        
-        # Debug: Print first few events if any found
-        if events:
-            for i, event in enumerate(events[:3]):
-                start = event.get('start', {})
-                start_time = start.get('dateTime', start.get('date', 'No time'))
-                print(f"  Event {i+1}: {event.get('summary', 'No title')} - {start_time}")
-        
-        return events
-        
-    except Exception as e:
-        print(f"Calendar error: {e}")
-        return []
-
-def test_calendar_connection():
-    """Test calendar connection and list all calendars"""
-    try:
-        service = get_calendar_service()
-        
-        # List all calendars
-        calendar_list = service.calendarList().list().execute()
-        calendars = calendar_list.get('items', [])
-        
-        #print(f"📅 Found {len(calendars)} calendars:")
-        for calendar in calendars:
-            print(f"  - {calendar['summary']} (ID: {calendar['id']})")
-        
-        # Test getting events from primary calendar
-        #print("\n🔍 Testing primary calendar events...")
-        events_result = service.events().list(
-            calendarId='primary',
-            maxResults=5,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
-        #print(f"📅 Primary calendar has {len(events)} events")
+        #print(f"📅 Primary calendar has {len(events)} events")
         
         if events:
             for i, event in enumerate(events[:3]):
@@ -1572,32 +2929,348 @@ def test_calendar_connection():
         return False
 # ============================= TASKS =============================
 def get_tasks_service():
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    else:
-        
-        if os.path.exists('credentials.json'):
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('_internal\credentials.json', SCOPES)
+    return google_services.service('tasks', 'v1')
+
+# Largest page the Tasks API serves, and the most calls sent in one batch request
+TASKS_PAGE_SIZE = 100
+TASKS_BATCH_SIZE = 50
+
+
+class TaskIndex:
+    """Which task list each task lives in, so task tools can go straight to it.
+
+    Filled whenever tasks are listed, synced or created and kept current on delete. A
+    task ID that is not known yet (created in another client, say) costs one sync of
+    tasks_mirror, after which the lookup is answered locally again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.list_of_task = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def record(self, tasklist_id, tasks):
+        with self.lock:
+            for task in tasks:
+                if task.get('id'):
+                    self.list_of_task[task['id']] = tasklist_id
+
+    def forget(self, task_id):
+        with self.lock:
+            self.list_of_task.pop(task_id, None)
+
+    def forget_list(self, tasklist_id):
+        with self.lock:
+            self.list_of_task = {task_id: list_id for task_id, list_id in self.list_of_task.items()
+                                 if list_id != tasklist_id}
+
+    def lookup(self, task_id):
+        with self.lock:
+            return self.list_of_task.get(task_id)
+
+    def refresh(self):
+        """Pull the latest changes into tasks_mirror, which records every task it sees"""
+        with self.lock:
+            self.refreshes += 1
+        tasks_mirror.sync()
+
+    def resolve(self, task_id):
+        """List ID of a task, refreshing once on a miss; None if it does not exist"""
+        tasklist_id = self.lookup(task_id)
+        if tasklist_id is None:
+            tasks_mirror.connect()  # Opening the mirror loads the tasks an earlier run saw
+            tasklist_id = self.lookup(task_id)
+        with self.lock:
+            if tasklist_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if tasklist_id is None:
+            self.refresh()
+            tasklist_id = self.lookup(task_id)
+        return tasklist_id
+
+    def stats(self):
+        with self.lock:
+            return {"tasks": len(self.list_of_task), "hits": self.hits, "misses": self.misses,
+                    "refreshes": self.refreshes}
+
+
+task_index = TaskIndex()
+
+TASKS_SYNC_INTERVAL = int(os.environ.get("EVA_TASKS_SYNC_INTERVAL", "60"))
+
+
+class TasksMirror:
+    """Local SQLite copy of every Google task list and task.
+
+    Task questions are answered from here in milliseconds instead of listing every list
+    over the network. The first use does a full sync; after that a background thread
+    asks only for tasks updated since the last sync (updatedMin with showDeleted), all
+    lists in one batch. Writes still go to Google first and the returned task is put in
+    the mirror straight away, so Eva sees her own changes before the next sync.
+    """
+    # updatedMin is set this far before the last sync started to absorb clock skew
+    SYNC_OVERLAP = timedelta(minutes=2)
+    # While the mirror holds nothing yet, a failed first sync is retried at most this often
+    SYNC_RETRY = 30
+
+    def __init__(self, path="eva_tasks.db", sync_interval=TASKS_SYNC_INTERVAL):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.lock = threading.RLock()
+        self.sync_lock = threading.Lock()
+        self.db = None
+        self.sync_thread = None
+        self.last_sync = 0.0
+        self.version = 0  # Bumped on every change to the stored lists or tasks (response cache key)
+        self.last_error = None
+        self.counters = {"syncs": 0, "full_syncs": 0, "changes": 0, "errors": 0, "last_sync_ms": None}
+
+    def connect(self):
+        """Open the database on first use (not at import, worker processes never need it)"""
+        with self.lock:
+            if self.db is not None:
+                return self.db
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS tasklists (
+                    id TEXT PRIMARY KEY, title TEXT, ordinal INTEGER, data TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY, tasklist_id TEXT NOT NULL, title_lower TEXT, status TEXT,
+                    due TEXT, position TEXT, hidden INTEGER NOT NULL DEFAULT 0, data TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS tasks_by_title ON tasks (title_lower);
+                CREATE INDEX IF NOT EXISTS tasks_by_due ON tasks (due);
+                CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status);
+                CREATE INDEX IF NOT EXISTS tasks_by_list ON tasks (tasklist_id, position);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+            self.db = db
+            # Tasks mirrored by an earlier run are known to task_index without a listing
+            for task_id, tasklist_id in db.execute("SELECT id, tasklist_id FROM tasks"):
+                task_index.record(tasklist_id, [{'id': task_id}])
+            return db
+
+    def meta(self, key):
+        with self.lock:
+            row = self.connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock, self.connect() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def list_id(self, tasklist_id):
+        """Real ID for the '@default' alias the Tasks API accepts"""
+        if tasklist_id != '@default':
+            return tasklist_id
+        default_id = self.meta('default_list')
+        if default_id is None:
+            default_id = tasklist_get_default()['id']
+            self.set_meta('default_list', default_id)
+        return default_id
+
+    # ----- sync -----
+    def ready(self):
+        """Make sure the mirror holds data and a background sync keeps it fresh.
+
+        Raises while no sync has ever succeeded, so an empty mirror is never mistaken for
+        'no tasks'; reads retry the sync at most every SYNC_RETRY seconds meanwhile.
+        """
+        if self.meta('synced_at') is None:
+            if self.last_error is None or time.monotonic() - self.last_sync >= self.SYNC_RETRY:
+                self.sync()
+            if self.meta('synced_at') is None:
+                raise RuntimeError(f"Google Tasks could not be synced: {self.last_error}")
+        self.start_background_sync()
+
+    def start_background_sync(self):
+        with self.lock:
+            if self.sync_thread is not None or not self.sync_interval:
+                return
+            self.sync_thread = threading.Thread(target=self.sync_loop, name="eva-tasks-sync", daemon=True)
+            self.sync_thread.start()
+
+    def sync_loop(self):
+        while True:
+            time.sleep(max(self.last_sync + self.sync_interval - time.monotonic(), 1))
+            if time.monotonic() - self.last_sync >= self.sync_interval:
+                self.sync()
+
+    def sync(self):
+        """Pull changes from Google: the task lists, then the tasks updated since the last sync"""
+        with self.sync_lock:
+            started = time.perf_counter()
+            sync_started = datetime.now(timezone.utc)
+            try:
+                self.list_id('@default')
+                remote_lists = tasklists_fetch()
+                synced_at = self.meta('synced_at')
+                with self.lock, self.connect() as db:
+                    known_titles = dict(db.execute("SELECT id, title FROM tasklists"))
+                    known = set(known_titles)
+                    remote_ids = {tasklist['id'] for tasklist in remote_lists}
+                    for tasklist_id in known - remote_ids:
+                        self.remove_tasklist(tasklist_id)
+                    if any(known_titles.get(t['id']) != t.get('title') for t in remote_lists):
+                        self.version += 1
+                    for ordinal, tasklist in enumerate(remote_lists):
+                        db.execute("INSERT OR REPLACE INTO tasklists (id, title, ordinal, data) VALUES (?, ?, ?, ?)",
+                                   (tasklist['id'], tasklist.get('title'), ordinal, json.dumps(tasklist)))
+
+                # Lists seen for the first time are fetched whole, the rest only as changes
+                new_lists = [t['id'] for t in remote_lists if synced_at is None or t['id'] not in known]
+                changed_lists = [t['id'] for t in remote_lists if synced_at is not None and t['id'] in known]
+                changes = 0
+                if new_lists:
+                    for tasklist_id, tasks in tasks_get_many(new_lists, showHidden=True).items():
+                        changes += self.apply_tasks(tasklist_id, tasks, replace=True)
+                    self.counters["full_syncs"] += 1
+                if changed_lists:
+                    delta = tasks_get_many(changed_lists, updatedMin=synced_at, showDeleted=True, showHidden=True)
+                    for tasklist_id, tasks in delta.items():
+                        changes += self.apply_tasks(tasklist_id, tasks)
+
+                self.set_meta('synced_at', (sync_started - self.SYNC_OVERLAP).strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+                with self.lock:
+                    self.last_error = None
+                    self.counters["syncs"] += 1
+                    self.counters["changes"] += changes
+                    self.counters["last_sync_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                if changes:
+                    print(f"🔄 Tasks mirror synced: {changes} changes")
+            except Exception as e:
+                with self.lock:
+                    self.last_error = e
+                    self.counters["errors"] += 1
+                print(f"Tasks mirror sync error: {e}")
+            finally:
+                self.last_sync = time.monotonic()
+
+    # ----- writes -----
+    def apply_tasks(self, tasklist_id, tasks, replace=False):
+        """Store tasks of one list as Google returned them; deleted ones are dropped"""
+        tasklist_id = self.list_id(tasklist_id)
+        with self.lock, self.connect() as db:
+            if tasks or replace:
+                self.version += 1
+            if replace:
+                db.execute("DELETE FROM tasks WHERE tasklist_id = ?", (tasklist_id,))
+            for task in tasks:
+                if task.get('deleted'):
+                    db.execute("DELETE FROM tasks WHERE id = ?", (task['id'],))
+                    task_index.forget(task['id'])
+                    continue
+                db.execute(
+                    "INSERT OR REPLACE INTO tasks (id, tasklist_id, title_lower, status, due, position, hidden, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (task['id'], tasklist_id, (task.get('title') or '').lower(), task.get('status'),
+                     task.get('due'), task.get('position'), int(bool(task.get('hidden'))), json.dumps(task)))
+                task_index.record(tasklist_id, [task])
+        return len(tasks)
+
+    def remove_task(self, task_id):
+        with self.lock, self.connect() as db:
+            self.version += 1
+            db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def apply_tasklist(self, tasklist):
+        with self.lock, self.connect() as db:
+            self.version += 1
+            ordinal = db.execute("SELECT COALESCE(MAX(ordinal) + 1, 0) FROM tasklists").fetchone()[0]
+            db.execute("INSERT OR REPLACE INTO tasklists (id, title, ordinal, data) VALUES (?, ?, ?, ?)",
+                       (tasklist['id'], tasklist.get('title'), ordinal, json.dumps(tasklist)))
+
+    def remove_tasklist(self, tasklist_id):
+        with self.lock, self.connect() as db:
+            self.version += 1
+            db.execute("DELETE FROM tasks WHERE tasklist_id = ?", (tasklist_id,))
+            db.execute("DELETE FROM tasklists WHERE id = ?", (tasklist_id,))
+        task_index.forget_list(tasklist_id)
+
+    # ----- reads -----
+    def tasklists(self):
+        self.ready()
+        with self.lock:
+            rows = self.connect().execute("SELECT data FROM tasklists ORDER BY ordinal").fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def tasks(self, tasklist_id='@default'):
+        """Tasks of one list in Google's order; hidden (cleared) tasks are left out like the API does"""
+        self.ready()
+        tasklist_id = self.list_id(tasklist_id)
+        with self.lock:
+            rows = self.connect().execute(
+                "SELECT data FROM tasks WHERE tasklist_id = ? AND hidden = 0 ORDER BY position", (tasklist_id,)
+            ).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def tasks_by_list(self):
+        """{tasklist_id: [tasks]} for every list, in one query"""
+        self.ready()
+        tasks_by_list = {}
+        with self.lock:
+            rows = self.connect().execute(
+                "SELECT t.tasklist_id, t.data FROM tasks t JOIN tasklists l ON l.id = t.tasklist_id "
+                "WHERE t.hidden = 0 ORDER BY l.ordinal, t.position"
+            ).fetchall()
+        for tasklist_id, data in rows:
+            tasks_by_list.setdefault(tasklist_id, []).append(json.loads(data))
+        return tasks_by_list
+
+    def find_by_title(self, title, tasklist_id=None):
+        """First task with this title (case-insensitive) with its list title and ID"""
+        self.ready()
+        query = ("SELECT t.data, l.title, t.tasklist_id FROM tasks t JOIN tasklists l ON l.id = t.tasklist_id "
+                 "WHERE t.title_lower = ? AND t.hidden = 0")
+        params = [title.lower()]
+        if tasklist_id:
+            query += " AND t.tasklist_id = ?"
+            params.append(self.list_id(tasklist_id))
+        with self.lock:
+            row = self.connect().execute(query + " ORDER BY l.ordinal, t.position LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def stats(self):
+        with self.lock:
+            counts = self.connect().execute(
+                "SELECT (SELECT COUNT(*) FROM tasklists), (SELECT COUNT(*) FROM tasks)").fetchone()
+            return {"tasklists": counts[0], "tasks": counts[1], **self.counters}
+
 
-        creds = flow.run_local_server(port=0)
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    return build('tasks', 'v1', credentials=creds)
+tasks_mirror = TasksMirror()
 
 # ========== TASK LIST OPERATIONS ==========
 
 def tasklists_get_all():
-    """Get all task lists"""
+    """Get all task lists from the local mirror, or from Google while the mirror is unavailable.
+
+    Raises when neither works, so callers never report 'no lists' for a failed sync.
+    """
     try:
-        service = get_tasks_service()
-        results = service.tasklists().list().execute()
-        return results.get('items', [])
+        return tasks_mirror.tasklists()
     except Exception as e:
-        print(f"Task lists error: {e}")
-        return []
+        print(f"Task lists mirror unavailable, fetching from Google: {e}")
+        return tasklists_fetch()
+
+def tasklists_fetch():
+    """Get all task lists from Google; raises on failure so a sync never mistakes it for 'no lists'"""
+    service = get_tasks_service()
+    tasklists, page_token = [], None
+    while True:
+        results = service.tasklists().list(maxResults=TASKS_PAGE_SIZE, pageToken=page_token).execute()
+        tasklists.extend(results.get('items', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return tasklists
+
+def tasklist_get_default():
+    """The task list Google means by '@default'"""
+    return get_tasks_service().tasklists().get(tasklist='@default').execute()
 
 def tasklist_create(title):
     """Create a new task list"""
@@ -1605,6 +3278,7 @@ def tasklist_create(title):
         service = get_tasks_service()
         tasklist = {'title': title}
         result = service.tasklists().insert(body=tasklist).execute()
+        tasks_mirror.apply_tasklist(result)
         print(f"✅ Task list created: {title}")
         return result
     except Exception as e:
@@ -1616,6 +3290,7 @@ def tasklist_delete(tasklist_id):
     try:
         service = get_tasks_service()
         service.tasklists().delete(tasklist=tasklist_id).execute()
+        tasks_mirror.remove_tasklist(tasklist_id)
         print(f"✅ Task list deleted: {tasklist_id}")
         return True
     except Exception as e:
@@ -1633,14 +3308,75 @@ def tasklist_get_by_name(name):
 # ========== TASK OPERATIONS ==========
 
 def tasks_get_all(tasklist_id='@default'):
-    """Get all Google Tasks from a specific list"""
+    """Get all Google Tasks from a specific list, from the mirror or from Google while it is unavailable"""
+    try:
+        return tasks_mirror.tasks(tasklist_id)
+    except Exception as e:
+        print(f"Tasks mirror unavailable, fetching from Google: {e}")
+        return tasks_fetch(tasklist_id)
+
+def tasks_fetch(tasklist_id='@default', **params):
+    """Get every page of a list's tasks from Google; params go to tasks().list, raises on failure"""
+    service = get_tasks_service()
+    tasks, page_token = [], None
+    while True:
+        results = service.tasks().list(tasklist=tasklist_id, maxResults=TASKS_PAGE_SIZE,
+                                       pageToken=page_token, **params).execute()
+        tasks.extend(results.get('items', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            task_index.record(tasklist_id, tasks)
+            return tasks
+
+def tasks_get_many(tasklist_ids, **params):
+    """Get the tasks of several lists from Google at once, as {tasklist_id: [tasks]}.
+
+    Every round sends one batch request holding a tasks().list call per list that still
+    has pages, so all lists cost one round trip (plus one per extra page). Lists whose
+    call failed inside the batch are fetched again on their own; if batching itself
+    fails, every list is fetched concurrently instead. params (updatedMin, showDeleted,
+    ...) are passed to every tasks().list call.
+    """
+    tasks_by_list = {tasklist_id: [] for tasklist_id in tasklist_ids}
+    if not tasks_by_list:
+        return tasks_by_list
     try:
         service = get_tasks_service()
-        results = service.tasks().list(tasklist=tasklist_id).execute()
-        return results.get('items', [])
+        pending = {tasklist_id: None for tasklist_id in tasks_by_list}  # list -> next page token
+        failed = []
+        while pending:
+            order = list(pending)
+            next_pending = {}
+
+            def on_response(request_id, response, exception):
+                tasklist_id = order[int(request_id)]
+                if exception is not None:
+                    failed.append(tasklist_id)
+                    return
+                tasks_by_list[tasklist_id].extend(response.get('items', []))
+                task_index.record(tasklist_id, response.get('items', []))
+                if response.get('nextPageToken'):
+                    next_pending[tasklist_id] = response['nextPageToken']
+
+            for start in range(0, len(order), TASKS_BATCH_SIZE):
+                batch = service.new_batch_http_request(callback=on_response)
+                for index in range(start, min(start + TASKS_BATCH_SIZE, len(order))):
+                    tasklist_id = order[index]
+                    batch.add(service.tasks().list(tasklist=tasklist_id, maxResults=TASKS_PAGE_SIZE,
+                                                   pageToken=pending[tasklist_id], **params),
+                              request_id=str(index))
+                batch.execute()
+            pending = next_pending
     except Exception as e:
-        print(f"Tasks error: {e}")
-        return []
+        print(f"Batched tasks fetch failed, fetching lists concurrently: {e}")
+        failed = list(tasks_by_list)
+
+    if failed:
+        with ThreadPoolExecutor(max_workers=min(8, len(failed))) as pool:
+            fetched = pool.map(lambda tasklist_id: tasks_fetch(tasklist_id, **params), failed)
+            for tasklist_id, tasks in zip(failed, fetched):
+                tasks_by_list[tasklist_id] = tasks
+    return tasks_by_list
 
 def tasks_add(title, tasklist_id='@default', due=None, notes=None):
     """Add a Google Task to a specific list (optional due date and notes)"""
@@ -1661,59 +3397,50 @@ def tasks_add(title, tasklist_id='@default', due=None, notes=None):
             task['notes'] = notes
 
         result = service.tasks().insert(tasklist=tasklist_id, body=task).execute()
+        tasks_mirror.apply_tasks(tasklist_id, [result])
         print(f"✅ Task created: {title}")
         return result
     except Exception as e:
         print(f"Tasks error: {e}")
         return None
 
+def task_call_in_list(task_id, tasklist_id, operation):
+    """Run operation(service, list_id) on the list holding task_id.
+
+    The list is tasklist_id when given, otherwise it comes from task_index. If Google
+    rejects the call because the task is not in that list (a stale entry), the index
+    is refreshed and the call retried once. Returns (result, list_id); list_id is None
+    when the task could not be found.
+    """
+    service = get_tasks_service()
+    tasklist_id = tasklist_id or task_index.resolve(task_id)
+    for attempt in range(2):
+        if tasklist_id is None:
+            return None, None
+        try:
+            return operation(service, tasklist_id), tasklist_id
+        except HttpError as e:
+            if attempt or e.resp.status not in (400, 404):
+                raise
+            task_index.forget(task_id)
+            task_index.refresh()
+            tasklist_id = task_index.lookup(task_id)
+    return None, None
+
 def task_mark_done(task_id, tasklist_id=None):
     """
-    Mark a task as completed - enhanced version that searches across all lists if needed
+    Mark a task as completed - one patch call, the list is looked up in task_index if not given
     """
     try:
-        service = get_tasks_service()
-        existing_task = None  # Initialize to None
-        found_tasklist_id = None # Initialize to None
-        
-        # If specific tasklist_id is provided, use it
-        if tasklist_id:
-            try:
-                # Get the existing task first to preserve all data
-                existing_task = service.tasks().get(tasklist=tasklist_id, task=task_id).execute()
-                # Only update the status field
-                existing_task['status'] = 'completed'
-                found_tasklist_id = tasklist_id
-            except Exception:
-                # Task not found in the provided list, proceed to search all lists
-                pass
-        
-        # If existing_task is still None (either no tasklist_id was provided, or task not found in specific list)
-        if existing_task is None:
-            # Otherwise, search across all task lists to find the task
-            all_task_lists = tasklists_get_all()
-            
-            for task_list in all_task_lists:
-                list_id = task_list['id']
-                try:
-                    # Try to get the task from this list
-                    existing_task = service.tasks().get(tasklist=list_id, task=task_id).execute()
-                    if existing_task:
-                        # Found the task, now mark it as done while preserving all other data
-                        existing_task['status'] = 'completed'
-                        found_tasklist_id = list_id
-                        break  # Exit loop once task is found
-                except Exception:
-                    # Task not in this list, continue searching
-                    continue
-        
-        if existing_task and found_tasklist_id:
-            result = service.tasks().update(
-                tasklist=found_tasklist_id, 
-                task=task_id, 
-                body=existing_task
+        result, found_tasklist_id = task_call_in_list(
+            task_id, tasklist_id,
+            lambda service, list_id: service.tasks().patch(
+                tasklist=list_id, task=task_id, body={'status': 'completed'}
             ).execute()
-            print(f"✅ Task marked as done: {task_id} in list '{existing_task.get('title', 'Unknown List')}'")
+        )
+        if found_tasklist_id:
+            tasks_mirror.apply_tasks(found_tasklist_id, [result])
+            print(f"✅ Task marked as done: {task_id} in list '{found_tasklist_id}'")
             return result
         else:
             print(f"❌ Task not found or tasklist not identified for: {task_id}")
@@ -1725,51 +3452,18 @@ def task_mark_done(task_id, tasklist_id=None):
 
 def task_mark_undone(task_id, tasklist_id=None):
     """
-    Mark a task as not completed - enhanced version that searches across all lists if needed
+    Mark a task as not completed - one patch call, the list is looked up in task_index if not given
     """
     try:
-        service = get_tasks_service()
-        existing_task = None  # Initialize to None
-        found_tasklist_id = None # Initialize to None
-        
-        # If specific tasklist_id is provided, use it
-        if tasklist_id:
-            try:
-                # Get the existing task first to preserve all data
-                existing_task = service.tasks().get(tasklist=tasklist_id, task=task_id).execute()
-                # Only update the status field
-                existing_task['status'] = 'needsAction'
-                found_tasklist_id = tasklist_id
-            except Exception:
-                # Task not found in the provided list, proceed to search all lists
-                pass
-        
-        # If existing_task is still None (either no tasklist_id was provided, or task not found in specific list)
-        if existing_task is None:
-            # Otherwise, search across all task lists to find the task
-            all_task_lists = tasklists_get_all()
-            
-            for task_list in all_task_lists:
-                list_id = task_list['id']
-                try:
-                    # Try to get the task from this list
-                    existing_task = service.tasks().get(tasklist=list_id, task=task_id).execute()
-                    if existing_task:
-                        # Found the task, now mark it as undone while preserving all other data
-                        existing_task['status'] = 'needsAction'
-                        found_tasklist_id = list_id
-                        break  # Exit loop once task is found
-                except Exception:
-                    # Task not in this list, continue searching
-                    continue
-        
-        if existing_task and found_tasklist_id:
-            result = service.tasks().update(
-                tasklist=found_tasklist_id, 
-                task=task_id, 
-                body=existing_task
+        result, found_tasklist_id = task_call_in_list(
+            task_id, tasklist_id,
+            lambda service, list_id: service.tasks().patch(
+                tasklist=list_id, task=task_id, body={'status': 'needsAction', 'completed': None}
             ).execute()
-            print(f"↩️ Task marked as undone: {task_id} in list '{existing_task.get('title', 'Unknown List')}'")
+        )
+        if found_tasklist_id:
+            tasks_mirror.apply_tasks(found_tasklist_id, [result])
+            print(f"↩️ Task marked as undone: {task_id} in list '{found_tasklist_id}'")
             return result
         else:
             print(f"❌ Task not found or tasklist not identified for: {task_id}")
@@ -1781,34 +3475,19 @@ def task_mark_undone(task_id, tasklist_id=None):
 
 def task_delete(task_id, tasklist_id=None):
     """
-    Delete a task - enhanced version that searches across all lists if needed
+    Delete a task - one delete call, the list is looked up in task_index if not given
     """
     try:
-        service = get_tasks_service()
-        
-        # If specific tasklist_id is provided, use it
-        if tasklist_id:
-            service.tasks().delete(tasklist=tasklist_id, task=task_id).execute()
-            print(f"✅ Task deleted: {task_id} from list {tasklist_id}")
+        _, found_tasklist_id = task_call_in_list(
+            task_id, tasklist_id,
+            lambda service, list_id: service.tasks().delete(tasklist=list_id, task=task_id).execute()
+        )
+        if found_tasklist_id:
+            tasks_mirror.remove_task(task_id)
+            task_index.forget(task_id)
+            print(f"✅ Task deleted: {task_id} from list {found_tasklist_id}")
             return True
         
-        # Otherwise, search across all task lists to find the task
-        all_task_lists = tasklists_get_all()
-        
-        for task_list in all_task_lists:
-            list_id = task_list['id']
-            try:
-                # Try to get the task from this list
-                task = service.tasks().get(tasklist=list_id, task=task_id).execute()
-                if task:
-                    # Found the task, now delete it
-                    service.tasks().delete(tasklist=list_id, task=task_id).execute()
-                    print(f"✅ Task deleted: {task_id} from list '{task_list['title']}'")
-                    return True
-            except Exception:
-                # Task not in this list, continue searching
-                continue
-        
         print(f"❌ Task not found: {task_id}")
         return False
         
@@ -1818,30 +3497,17 @@ def task_delete(task_id, tasklist_id=None):
 
 def task_get_by_title(title, tasklist_id=None):
     """
-    Find a task by title - enhanced version that searches across all lists if needed
+    Find a task by title - an indexed lookup in the local mirror, across all lists if none is given
     """
-    if tasklist_id:
-        # Search in specific list
-        tasks = tasks_get_all(tasklist_id)
-        for task in tasks:
-            if task['title'].lower() == title.lower():
-                return task
+    found = tasks_mirror.find_by_title(title, tasklist_id)
+    if found is None:
         return None
-    
-    # Search across all task lists
-    all_task_lists = tasklists_get_all()
-    
-    for task_list in all_task_lists:
-        list_id = task_list['id']
-        tasks = tasks_get_all(list_id)
-        for task in tasks:
-            if task['title'].lower() == title.lower():
-                # Add list information to the task
-                task['list_name'] = task_list['title']
-                task['list_id'] = list_id
-                return task
-    
-    return None
+    task, list_name, list_id = found
+    if not tasklist_id:
+        # Add list information to the task
+        task['list_name'] = list_name
+        task['list_id'] = list_id
+    return task
 
 def task_update(task_id, tasklist_id='@default', title=None, due=None, notes=None, status=None):
     """Update a task's properties"""
@@ -1870,6 +3536,7 @@ def task_update(task_id, tasklist_id='@default', title=None, due=None, notes=Non
             task=task_id, 
             body=current_task
         ).execute()
+        tasks_mirror.apply_tasks(tasklist_id, [result])
         print(f"✅ Task updated: {task_id}")
         return result
     except Exception as e:
@@ -1919,8 +3586,8 @@ def display_tasklists():
 # ==================================================================== GOOGLE SERVICES ============================================================
 
 # ==================================================================== SEARCH FUNCTIONALITY ============================================================
-def search_web(query, limit=3):
-    """Search using Brave API"""
+async def search_web_async(query, limit=3):
+    """Search using Brave API without blocking the event loop"""
     try:
         headers = {
             "Accept": "application/json",
@@ -1931,7 +3598,7 @@ def search_web(query, limit=3):
             "size": limit,
         }
         
-        response = requests.get(
+        response = await http_client.get(
             "https://api.search.brave.com/res/v1/web/search",
             headers=headers,
             params=params
@@ -1956,6 +3623,10 @@ def search_web(query, limit=3):
         return "\n\n".join(result_lines)
     except Exception as e:
         return f"Search error: {e}"
+
+def search_web(query, limit=3):
+    """Search using Brave API (blocking wrapper around search_web_async)"""
+    return async_runtime.run(search_web_async(query, limit))
 # ==================================================================== SEARCH FUNCTIONALITY ============================================================
 
 # ==================================================================== Open Application =========================================================
@@ -2007,55 +3678,34 @@ def telegram():
     application.add_handler(CommandHandler("start", start))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
-    # Create and run event loop for this thread
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
+    # The bot runs on the shared event loop, next to the chat pipeline it feeds
     try:
         # Initialize and start the application properly
-        loop.run_until_complete(application.initialize())
-        loop.run_until_complete(application.start())
-        loop.run_until_complete(application.updater.start_polling(drop_pending_updates=True))
+        async_runtime.run(application.initialize())
+        async_runtime.run(application.start())
+        async_runtime.run(application.updater.start_polling(drop_pending_updates=True))
         
         print(f"Bot started! Allowed chat ID: {ALLOWED_CHAT_ID}")
         print("Waiting for messages...")
-        
-        # Keep the loop running
-        loop.run_forever()
     except KeyboardInterrupt:
         pass
-    finally:
-        loop.close()
 
-def Send_telegram_message(response):
+async def send_telegram_message_async(response):
     """Send response back to Telegram with Markdown and typing action"""
-    global application
-    
     print(f"Debug - ALLOWED_CHAT_ID: {ALLOWED_CHAT_ID}")
     print(f"Debug - Response: {response}")
     
     if ALLOWED_CHAT_ID and response:
         try:
-            # Create a new event loop for this thread if needed
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
             # Show typing indicator
-            loop.run_until_complete(
-                application.bot.send_chat_action(chat_id=ALLOWED_CHAT_ID, action="typing")
-            )
-            time.sleep(0.5)  # short pause for realism
+            await application.bot.send_chat_action(chat_id=ALLOWED_CHAT_ID, action="typing")
+            await asyncio.sleep(0.5)  # short pause for realism
             
             # Send message with Markdown parsing
-            loop.run_until_complete(
-                application.bot.send_message(
-                    chat_id=ALLOWED_CHAT_ID,
-                    text=response,
-                    parse_mode="Markdown"
-                )
+            await application.bot.send_message(
+                chat_id=ALLOWED_CHAT_ID,
+                text=response,
+                parse_mode="Markdown"
             )
             print(f"✓ Successfully sent to {ALLOWED_CHAT_ID}: {response}")
         except Exception as e:
@@ -2066,6 +3716,14 @@ def Send_telegram_message(response):
         if not response:
             print("❌ Cannot send: Response is empty")
 
+def Send_telegram_message(response):
+    """Blocking wrapper around send_telegram_message_async for synchronous callers"""
+    if async_runtime.in_loop_thread():
+        # Already on the loop: send in the background rather than deadlock waiting for it
+        async_runtime.submit(send_telegram_message_async(response))
+        return
+    async_runtime.run(send_telegram_message_async(response))
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
     chat_id = update.effective_chat.id
@@ -2101,17 +3759,1184 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "content": telegram_message
         })
         
-        threading.Thread(
-            target=chatbot_instance.process_telegram_message, 
-            args=(telegram_message,), 
-            daemon=True
-        ).start()
-        print("✓ Started processing thread")
+        async_runtime.submit(chatbot_instance.process_telegram_message_async(telegram_message))
+        print("✓ Started processing task")
 
 # ==================================================================== Telegram ============================================================
 
-class ChatApp:
+# ==================================================================== LLM HTTP CLIENT ============================================================
+class AsyncRuntime:
+    """One asyncio event loop on a background thread, shared by the whole app.
+
+    The chat pipeline, the Telegram bot, Mistral and Brave requests all run as
+    coroutines on this loop, so a request waiting on the network costs a task instead of
+    a blocked OS thread. Blocking work (memory lookup, Google APIs) goes to a small fixed
+    executor. The loop starts on first use, so importing app.py starts no threads.
+    """
+    def __init__(self, blocking_workers=4):
+        self.blocking_workers = blocking_workers
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.pending = set()
+
+    def get_loop(self):
+        with self.lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(ThreadPoolExecutor(max_workers=self.blocking_workers, thread_name_prefix="eva-blocking"))
+                thread = threading.Thread(target=self.run_loop, args=(loop,), name="eva-event-loop", daemon=True)
+                thread.start()
+                self.loop, self.thread = loop, thread
+            return self.loop
+
+    def run_loop(self, loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def in_loop_thread(self):
+        return self.thread is not None and threading.current_thread() is self.thread
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop from any thread; returns a concurrent future"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+        # Keep a reference until it finishes so a fire-and-forget task is never collected
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self.discard)
+        return future
+
+    def discard(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+    def run(self, coro, timeout=None):
+        """Synchronous wrapper: run a coroutine on the loop and wait for its result"""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("AsyncRuntime.run() called on the event loop thread; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+async_runtime = AsyncRuntime()
+
+
+def parse_sse_delta(line):
+    """Content delta from one chat-completions SSE line; None to skip, False at [DONE]"""
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return False
+    try:
+        event = json.loads(data)
+    except json.JSONDecodeError:
+        return None
+    choices = event.get("choices") or []
+    if not choices:
+        return None
+    return choices[0].get("delta", {}).get("content") or None
+
+
+class AsyncHTTPClient:
+    """Shared keep-alive async HTTP client for Mistral and Brave.
+
+    One httpx.AsyncClient with a connection pool lives on the shared event loop, so
+    follow-up turns reuse the open TLS connection instead of handshaking again. Every
+    request gets separate connect and read timeouts so a stalled connection cannot hang
+    a conversation.
+    """
+    def __init__(self, connect_timeout=5, read_timeout=120, pool_size=20):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.client = None
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.hosts = {}
+
+    def get_client(self):
+        # Created lazily so it binds to the running event loop
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self.client
+
+    def tracer(self, url):
+        """Count requests and new connections per host through httpcore's trace hook"""
+        host = httpx.URL(url).host
+        with self.lock:
+            self.request_count += 1
+            counters = self.hosts.setdefault(host, {"requests": 0, "connections_opened": 0})
+            counters["requests"] += 1
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                with self.lock:
+                    counters["connections_opened"] += 1
+        return trace
+
+    async def request(self, method, url, **kwargs):
+        """Send a request through the shared pool"""
+        kwargs.setdefault("extensions", {})["trace"] = self.tracer(url)
+        try:
+            return await self.get_client().request(method, url, **kwargs)
+        except httpx.HTTPError:
+            with self.lock:
+                self.error_count += 1
+            raise
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def stream_chat(self, url, **kwargs):
+        """POST a chat completion with stream=True and yield each content delta from the SSE body"""
+        kwargs.setdefault("extensions", {})["trace"] = self.tracer(url)
+        try:
+            async with self.get_client().stream("POST", url, **kwargs) as response:
+                if response.is_error:
+                    await response.aread()
+                    response.raise_for_status()
+                async for line in response.aiter_lines():
+                    delta = parse_sse_delta(line)
+                    if delta is False:
+                        break
+                    if delta:
+                        yield delta
+        except httpx.HTTPError:
+            with self.lock:
+                self.error_count += 1
+            raise
+
+    def stats(self):
+        """Connection reuse statistics per host"""
+        with self.lock:
+            hosts = {host: dict(counters) for host, counters in self.hosts.items()}
+            requests_sent, errors = self.request_count, self.error_count
+        for counters in hosts.values():
+            counters["reused"] = max(counters["requests"] - counters["connections_opened"], 0)
+            counters["reuse_rate"] = round(counters["reused"] / counters["requests"], 3) if counters["requests"] else 0.0
+        return {"requests": requests_sent, "errors": errors, "hosts": hosts}
+
+
+class TalkTagStream:
+    """Incrementally pull the text inside <t>...</t> out of a streamed reply.
+
+    Tags can be split across chunks, so a tail that could still become a tag is held
+    back until the next chunk decides it. Separate <t> blocks are joined with a blank
+    line, matching how the final message is assembled from talk_lines.
+    """
+    OPEN = "<t>"
+    CLOSE = "</t>"
+
+    def __init__(self):
+        self.buffer = ""
+        self.inside = False
+        self.blocks = 0
+        self.block_started = False
+
+    def feed(self, chunk):
+        """Add a chunk of model output and return the newly visible talk text"""
+        self.buffer += chunk
+        visible = []
+        while True:
+            lowered = self.buffer.lower()
+            if not self.inside:
+                start = lowered.find(self.OPEN)
+                if start == -1:
+                    # Keep only a possible partial "<t" so the tag can complete next time
+                    self.buffer = self.buffer[-(len(self.OPEN) - 1):]
+                    break
+                self.buffer = self.buffer[start + len(self.OPEN):]
+                self.inside = True
+                self.block_started = False
+                continue
+            end = lowered.find(self.CLOSE)
+            if end == -1:
+                keep = self._partial_close_length(lowered)
+                text = self.buffer[:len(self.buffer) - keep]
+                self.buffer = self.buffer[len(self.buffer) - keep:]
+                self._emit(text, visible)
+                break
+            self._emit(self.buffer[:end], visible)
+            self.buffer = self.buffer[end + len(self.CLOSE):]
+            self.inside = False
+            if self.block_started:
+                self.blocks += 1
+        return "".join(visible)
+
+    def _partial_close_length(self, lowered):
+        """Length of the buffer suffix that is a prefix of the closing tag"""
+        for size in range(min(len(self.CLOSE) - 1, len(lowered)), 0, -1):
+            if self.CLOSE.startswith(lowered[-size:]):
+                return size
+        return 0
+
+    def _emit(self, text, visible):
+        if not self.block_started:
+            # Leading whitespace is stripped from each block, like talk_lines
+            text = text.lstrip()
+            if not text:
+                return
+            if self.blocks:
+                visible.append("\n\n")
+            self.block_started = True
+        visible.append(text)
+
+# Shared by every Mistral and Brave request
+http_client = AsyncHTTPClient()
+
+# Priority classes for outbound LLM calls; lower is served first
+LLM_PRIORITY_INTERACTIVE = 0  # GUI and Telegram turns
+LLM_PRIORITY_BACKGROUND = 1   # Email and alarm processing
+LLM_PRIORITY_MAINTENANCE = 2  # Conversation summaries
+
+# Requests per second and burst size per Mistral workspace tier, for every model
+MISTRAL_TIER_LIMITS = {
+    "free": (1.0, 2),
+    "scale": (6.0, 12),
+}
+
+def mistral_rate_limits(config_data=None):
+    """Rate limits for llm_scheduler, keyed by model with "default" covering any other.
+
+    The "Mistral tier" config key picks a row of MISTRAL_TIER_LIMITS (free by default),
+    "Mistral rate limits" maps model names to [rps, burst] overrides, and the
+    EVA_MISTRAL_RPS environment variable overrides the default rate.
+    """
+    config_data = config_data or {}
+    tier = str(config_data.get("Mistral tier") or "free").strip().lower()
+    rate, burst = MISTRAL_TIER_LIMITS.get(tier, MISTRAL_TIER_LIMITS["free"])
+    if os.environ.get("EVA_MISTRAL_RPS"):
+        rate = float(os.environ["EVA_MISTRAL_RPS"])
+        burst = max(burst, math.ceil(rate * 2))
+    limits = {"default": (rate, burst)}
+    for model, limit in (config_data.get("Mistral rate limits") or {}).items():
+        limits[model] = (float(limit[0]), int(limit[1]))
+    return limits
+
+MISTRAL_RATE_LIMITS = mistral_rate_limits()
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Exponential backoff with jitter so throttled callers do not retry in lockstep"""
+    ceiling = min(cap, base * 2 ** attempt)
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class TokenBucket:
+    """Request rate limit for one model, with a pause window for 429 responses"""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def delay(self):
+        """Seconds until a request may go out (0 when it may go now)"""
+        now = self.refill()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.refill()
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class LLMScheduler:
+    """Central gate for every outbound LLM request.
+
+    Callers wait in one priority queue per model and the head of the queue is released
+    whenever that model's token bucket has room, so an interactive turn overtakes any
+    queued email or alarm processing. A 429 pauses the whole model for the Retry-After
+    time (or a jittered backoff) instead of each thread sleeping on its own. A caller
+    that retries after a 429 passes the ticket of its first attempt back in, so it keeps
+    its place in line instead of queueing behind everyone who arrived since.
+    """
+    def __init__(self, limits=None, sample_size=500):
+        self.limits = limits or MISTRAL_RATE_LIMITS
+        self.cond = threading.Condition()
+        self.buckets = {}
+        self.queues = {}
+        self.next_ticket = 0
+        self.queue_depth = Counter()
+        self.max_queue_depth = Counter()
+        self.granted = Counter()
+        self.throttled = Counter()
+        self.wait_times = {}
+        self.sample_size = sample_size
+
+    def configure(self, limits):
+        """Replace the rate limits, e.g. once the config is loaded; buckets start fresh"""
+        with self.cond:
+            self.limits = limits
+            for model, bucket in list(self.buckets.items()):
+                rate, burst = limits.get(model, limits["default"])
+                self.buckets[model] = TokenBucket(rate, burst)
+                self.buckets[model].paused_until = bucket.paused_until
+            self.cond.notify_all()
+
+    def ticket(self, priority=LLM_PRIORITY_INTERACTIVE):
+        """Reserve a place in line; pass it to every attempt of the same request"""
+        with self.cond:
+            ticket = (priority, self.next_ticket)
+            self.next_ticket += 1
+            return ticket
+
+    def bucket(self, model):
+        if model not in self.buckets:
+            rate, burst = self.limits.get(model, self.limits["default"])
+            self.buckets[model] = TokenBucket(rate, burst)
+        return self.buckets[model]
+
+    def enqueue(self, model, priority, ticket=None):
+        """Join the model's queue, with a new ticket or a reserved one; call with the condition held"""
+        if ticket is None:
+            ticket = (priority, self.next_ticket)
+            self.next_ticket += 1
+        priority = ticket[0]
+        heapq.heappush(self.queues.setdefault(model, []), ticket)
+        self.queue_depth[priority] += 1
+        self.max_queue_depth[priority] = max(self.max_queue_depth[priority], self.queue_depth[priority])
+        return ticket
+
+    def try_grant(self, model, ticket):
+        """Grant the ticket if it is first in line and the bucket has room.
+
+        Returns 0 when granted, otherwise the seconds until the head of the queue can go,
+        or None when other callers are ahead. Call with the condition held.
+        """
+        queue = self.queues[model]
+        if queue[0] != ticket:
+            return None
+        delay = self.bucket(model).delay()
+        if delay > 0:
+            return delay
+        self.bucket(model).take()
+        heapq.heappop(queue)
+        return 0
+
+    def leave(self, model, ticket, started, granted):
+        """Update metrics once a ticket is granted or abandoned; call with the condition held"""
+        priority = ticket[0]
+        self.queue_depth[priority] -= 1
+        if granted:
+            self.granted[priority] += 1
+            self.wait_times.setdefault(priority, deque(maxlen=self.sample_size)).append(time.monotonic() - started)
+        else:
+            queue = self.queues[model]
+            queue.remove(ticket)
+            heapq.heapify(queue)
+        self.cond.notify_all()  # Let the next in line check the bucket
+        return time.monotonic() - started
+
+    def acquire(self, model, priority=LLM_PRIORITY_INTERACTIVE, ticket=None):
+        """Block until this caller may send a request to model; returns the seconds waited"""
+        started = time.monotonic()
+        with self.cond:
+            ticket = self.enqueue(model, priority, ticket)
+            granted = False
+            try:
+                while True:
+                    delay = self.try_grant(model, ticket)
+                    if delay == 0:
+                        granted = True
+                        break
+                    self.cond.wait(delay)
+            finally:
+                waited = self.leave(model, ticket, started, granted)
+        return waited
+
+    async def acquire_async(self, model, priority=LLM_PRIORITY_INTERACTIVE, ticket=None):
+        """acquire() for coroutines: waits on the event loop instead of blocking a thread"""
+        started = time.monotonic()
+        with self.cond:
+            ticket = self.enqueue(model, priority, ticket)
+        granted = False
+        try:
+            while True:
+                with self.cond:
+                    delay = self.try_grant(model, ticket)
+                if delay == 0:
+                    granted = True
+                    break
+                # Threads cannot wake a coroutine, so poll while others are ahead
+                await asyncio.sleep(min(delay, 0.05) if delay is not None else 0.05)
+        finally:
+            with self.cond:
+                waited = self.leave(model, ticket, started, granted)
+        return waited
+
+    def penalize(self, model, seconds):
+        """Hold every request to model for the given time after a 429"""
+        with self.cond:
+            self.bucket(model).pause(seconds)
+            self.throttled[model] += 1
+            self.cond.notify_all()
+
+    def stats(self):
+        """Queue depth and wait times per priority class, 429 count per model"""
+        with self.cond:
+            priorities = {}
+            for priority in sorted(set(self.granted) | set(self.queue_depth)):
+                waits = sorted(self.wait_times.get(priority, ()))
+                priorities[priority] = {
+                    "queued": self.queue_depth[priority],
+                    "max_queued": self.max_queue_depth[priority],
+                    "granted": self.granted[priority],
+                    "wait_avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "wait_p95": round(waits[min(int(len(waits) * 0.95), len(waits) - 1)], 3) if waits else 0.0,
+                    "wait_max": round(waits[-1], 3) if waits else 0.0,
+                }
+            return {"priorities": priorities, "throttled": dict(self.throttled)}
+
+llm_scheduler = LLMScheduler()
+# ==================================================================== LLM HTTP CLIENT ============================================================
+
+# ==================================================================== TOOL TAG PARSER ============================================================
+class ToolTagParser:
+    """Single-pass tokenizer for the tool tags in Eva's replies.
+
+    Text is fed in chunks as it streams in. A paired tag like <s>...</s> is reported once
+    its closing tag arrives and a standalone tag like <task_update> as soon as it is
+    complete, so tools can start before the reply has finished. Tags are matched
+    case-insensitively and do not nest, the same as the per-tag regexes this replaces.
+    """
+    def __init__(self, paired_tags, standalone_tags, on_tag):
+        self.paired_tags = set(paired_tags)
+        self.standalone_tags = set(standalone_tags)
+        self.on_tag = on_tag
+        # Longest "<name>" we could be waiting to complete
+        self.longest_tag = max(len(tag) for tag in self.paired_tags | self.standalone_tags) + 2
+        self.buffer = ""
+        self.current = None  # Paired tag whose closing tag has not arrived yet
+        self.scan_from = 0   # Where to resume looking for that closing tag
+
+    def feed(self, chunk):
+        """Consume a chunk of text, reporting every tag it completes"""
+        self.buffer += chunk
+        while self.buffer:
+            if self.current is None:
+                start = self.buffer.find("<")
+                if start == -1:
+                    self.buffer = ""
+                    break
+                end = self.buffer.find(">", start)
+                if end == -1:
+                    if len(self.buffer) - start < self.longest_tag:
+                        self.buffer = self.buffer[start:]  # May still become a tag
+                        break
+                    self.buffer = self.buffer[start + 1:]
+                    continue
+                name = self.buffer[start + 1:end].lower()
+                if name in self.paired_tags:
+                    self.current = name
+                    self.scan_from = 0
+                    self.buffer = self.buffer[end + 1:]
+                elif name in self.standalone_tags:
+                    self.buffer = self.buffer[end + 1:]
+                    self.on_tag(name, None)
+                else:
+                    self.buffer = self.buffer[start + 1:]
+            else:
+                closing = f"</{self.current}>"
+                end = self.buffer.lower().find(closing, self.scan_from)
+                if end == -1:
+                    self.scan_from = max(len(self.buffer) - len(closing) + 1, 0)
+                    break
+                content = self.buffer[:end]
+                self.buffer = self.buffer[end + len(closing):]
+                tag, self.current = self.current, None
+                self.on_tag(tag, content)
+
+    def close(self):
+        """End of reply: an unclosed tag is treated as plain text so later tags still count"""
+        if self.current is not None:
+            leftover = self.buffer
+            self.current = None
+            self.buffer = ""
+            self.feed(leftover)
+        self.buffer = ""
+
+    def reset(self):
+        """Forget any partial tag"""
+        self.buffer = ""
+        self.current = None
+
+
+class ToolExecutor:
+    """Bounded thread pool shared by every reply's tools.
+
+    Each tool belongs to a quota group (Brave, Google Tasks, ...) and a semaphore per
+    group caps how many calls of that group run at once, whatever replies they came from.
+    Handlers that are coroutines (network-bound ones like web search) run on the shared
+    event loop instead of a pool thread, capped by an asyncio semaphore of the same size.
+    """
+    def __init__(self, max_workers=8, limits=None):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="eva-tool")
+        self.limits = dict(limits or {})
+        self.semaphores = {group: threading.BoundedSemaphore(limit) for group, limit in self.limits.items()}
+        self.async_semaphores = {}  # Created on the event loop when first needed
+        self.lock = threading.Lock()
+        self.running = Counter()
+        self.peak = Counter()
+        self.calls = Counter()
+
+    def submit(self, group, depends_on, fn, *args):
+        """Run fn(*args) once every future in depends_on is done and the group has room"""
+        if asyncio.iscoroutinefunction(fn):
+            return async_runtime.submit(self.run_async(group, depends_on, fn, args))
+
+        def job():
+            if depends_on:
+                wait(depends_on)
+            semaphore = self.semaphores.get(group)
+            if semaphore is None:
+                return self._run(group, fn, args)
+            with semaphore:
+                return self._run(group, fn, args)
+        return self.pool.submit(job)
+
+    def _run(self, group, fn, args):
+        self.started(group)
+        try:
+            return fn(*args)
+        finally:
+            self.finished(group)
+
+    async def run_async(self, group, depends_on, fn, args):
+        if depends_on:
+            await asyncio.wait([asyncio.wrap_future(future) for future in depends_on])
+        semaphore = None
+        if group in self.limits:
+            semaphore = self.async_semaphores.setdefault(group, asyncio.Semaphore(self.limits[group]))
+        if semaphore is not None:
+            await semaphore.acquire()
+        self.started(group)
+        try:
+            return await fn(*args)
+        finally:
+            self.finished(group)
+            if semaphore is not None:
+                semaphore.release()
+
+    def started(self, group):
+        with self.lock:
+            self.calls[group] += 1
+            self.running[group] += 1
+            self.peak[group] = max(self.peak[group], self.running[group])
+
+    def finished(self, group):
+        with self.lock:
+            self.running[group] -= 1
+
+    def stats(self):
+        """Calls and peak concurrency per quota group"""
+        with self.lock:
+            return {
+                group or "ungrouped": {"calls": self.calls[group], "peak": self.peak[group], "limit": self.limits.get(group)}
+                for group in self.calls
+            }
+
+
+class ToolOutput:
+    """What a single tool call produced; merged into its reply in tag order"""
     def __init__(self):
+        self.talk_lines = []
+        self.memories = []
+        self.history = []
+        self.captured_outputs = []
+        self.needs_followup = False
+
+
+class ToolRun:
+    """The tools triggered by one model reply and what they produced.
+
+    Tags go to their registered handler as the parser completes them. Cheap inline
+    handlers (talk, memory) run immediately; the rest are submitted to the shared
+    ToolExecutor, so a web search can run while the model is still writing and
+    independent calls run side by side. A call that changes state waits for every
+    earlier call in its group, and reads wait for the last earlier write, so the
+    results are the same as running the tags in order.
+
+    Each call writes to its own ToolOutput instead of touching session_history. They
+    are merged in the order the tags appeared once the reply is finished, which keeps
+    the history deterministic however the calls interleave.
+
+    Calls that change state (write_tags), and any later call in the same group, are
+    held back while the reply is still streaming and only submitted by feed_reply once
+    the complete reply matches what was streamed. If the stream broke off, the held
+    writes are dropped, pending reads are cancelled and the complete reply is parsed
+    again from scratch, so a failed stream never creates, deletes or sends anything.
+    """
+    def __init__(self, handlers, inline_tags, standalone_tags, executor, groups=None, write_tags=()):
+        self.handlers = handlers
+        self.inline_tags = set(inline_tags)
+        self.standalone_tags = set(standalone_tags)
+        self.executor = executor
+        self.groups = groups or {}
+        self.write_tags = set(write_tags)
+        paired_tags = [tag for tag in handlers if tag not in self.standalone_tags]
+        self.parser = ToolTagParser(paired_tags, self.standalone_tags, self.dispatch)
+        self.parts = []
+        self.talk_lines = []
+        self.memories = []
+        self.history = []
+        self.captured_outputs = []
+        self.needs_followup = False
+        self.seen_standalone = set()
+        self.calls = []           # (tag, ToolOutput, future or None) in tag order
+        self.last_write = {}      # group -> future of the latest state-changing call
+        self.reads_since_write = {}  # group -> futures of reads issued after it
+        self.streaming = True     # Until feed_reply confirms the streamed reply
+        self.held = []            # (index in calls, tag, content) of calls waiting for it
+        self.held_groups = set()
+
+    def feed(self, chunk):
+        """Feed a streamed chunk of the reply"""
+        self.parts.append(chunk)
+        self.parser.feed(chunk)
+
+    def feed_reply(self, response_text):
+        """Feed whatever part of the complete reply has not been streamed yet"""
+        streamed = "".join(self.parts)
+        self.streaming = False
+        if response_text.startswith(streamed):
+            self.release_held()
+            self.feed(response_text[len(streamed):])
+        else:
+            # The stream broke off and query_mistral returned something else (an error reply)
+            self.discard_streamed()
+            self.feed(response_text)
+
+    def release_held(self):
+        """Submit the state-changing calls held back during streaming, in tag order"""
+        held, self.held = self.held, []
+        self.held_groups = set()
+        for index, tag, content in held:
+            output = self.calls[index][1]
+            self.calls[index] = (tag, output, self.submit(tag, content, output))
+
+    def discard_streamed(self):
+        """Forget every call parsed from a stream that did not complete"""
+        for tag, output, future in self.calls:
+            if future is not None:
+                future.cancel()
+        if self.held:
+            print(f"🛑 Dropped {len(self.held)} tool call(s) from a broken stream")
+        self.parser.reset()
+        self.parts = []
+        self.calls = []
+        self.held = []
+        self.held_groups = set()
+        self.last_write = {}
+        self.reads_since_write = {}
+        self.seen_standalone = set()
+
+    def dispatch(self, tag, content):
+        """Route one completed tag to its handler"""
+        if content is None:
+            # Standalone tags only need to run once per reply
+            if tag in self.seen_standalone:
+                return
+            self.seen_standalone.add(tag)
+        elif not content:
+            return
+        handler = self.handlers[tag]
+        output = ToolOutput()
+        if tag in self.inline_tags:
+            handler(content, output)
+            self.calls.append((tag, output, None))
+            return
+        group = self.groups.get(tag)
+        if self.streaming and (tag in self.write_tags or (group is not None and group in self.held_groups)):
+            # Keep the slot in tag order; the call is submitted once the stream completes
+            self.held.append((len(self.calls), tag, content))
+            if group is not None:
+                self.held_groups.add(group)
+            self.calls.append((tag, output, None))
+            return
+        self.calls.append((tag, output, self.submit(tag, content, output)))
+
+    def submit(self, tag, content, output):
+        """Hand one call to the executor behind the calls it must wait for"""
+        group = self.groups.get(tag)
+        depends_on = []
+        if group is not None:
+            if group in self.last_write:
+                depends_on.append(self.last_write[group])
+            if tag in self.write_tags:
+                depends_on.extend(self.reads_since_write.pop(group, []))
+        future = self.executor.submit(group, depends_on, self.handlers[tag], content, output)
+        if group is not None:
+            if tag in self.write_tags:
+                self.last_write[group] = future
+            else:
+                self.reads_since_write.setdefault(group, []).append(future)
+        return future
+
+    def finish(self):
+        """Wait for every dispatched tool and merge their outputs in tag order"""
+        self.parser.close()
+        for tag, output, future in self.calls:
+            if future is not None:
+                try:
+                    future.result()
+                except Exception as e:
+                    self.record_failure(tag, output, e)
+            self.merge(output)
+        self.calls = []
+        return self
+
+    async def finish_async(self):
+        """finish() for coroutines: awaits the tools instead of blocking the event loop"""
+        self.parser.close()
+        for tag, output, future in self.calls:
+            if future is not None:
+                try:
+                    await asyncio.wrap_future(future)
+                except Exception as e:
+                    self.record_failure(tag, output, e)
+            self.merge(output)
+        self.calls = []
+        return self
+
+    def record_failure(self, tag, output, error):
+        print(f"❌ Tool <{tag}> failed: {error}")
+        output.captured_outputs.append(f"❌ Tool <{tag}> failed: {error}")
+
+    def merge(self, output):
+        self.talk_lines.extend(output.talk_lines)
+        self.memories.extend(output.memories)
+        self.history.extend(output.history)
+        self.captured_outputs.extend(output.captured_outputs)
+        self.needs_followup = self.needs_followup or output.needs_followup
+# ==================================================================== TOOL TAG PARSER ============================================================
+# ==================================================================== CONTEXT WINDOW ============================================================
+# Approximate token budget for every request to Mistral, system prompt included
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("EVA_CONTEXT_BUDGET", "16000"))
+
+class ContextWindow:
+    """Keeps each request to Mistral inside a token budget.
+
+    Tokens are estimated locally with a regex: words are counted in 4-character pieces
+    and every punctuation mark as one token, close enough to Mistral's tokenizer for
+    budgeting. The leading system messages, the latest turns and any tool results the
+    model has not answered yet are pinned. Over budget, older tool dumps are collapsed to
+    a short excerpt first, then the oldest unpinned messages are dropped.
+    """
+    TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+    MESSAGE_OVERHEAD = 4  # Role and separators
+    TOOL_RESULT_PREFIXES = (
+        "search_result:", "System outputs:", "Current tasks from all lists:", "calendar events:",
+        "Found task:", "alarm_success:", "alarm_error:", "Current alarms:",
+    )
+
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, keep_recent=6, collapse_excerpt=200):
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.collapse_excerpt = collapse_excerpt
+        self.lock = threading.Lock()
+        self.last_report = None
+        self.request_count = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+
+    @classmethod
+    def count_tokens(cls, text):
+        """Approximate token count of a piece of text"""
+        return len(cls.TOKEN_PATTERN.findall(text or ""))
+
+    def message_tokens(self, message):
+        return self.count_tokens(message.get("content")) + self.MESSAGE_OVERHEAD
+
+    @classmethod
+    def is_tool_result(cls, message):
+        return message["role"] == "user" and (message.get("content") or "").startswith(cls.TOOL_RESULT_PREFIXES)
+
+    def pinned_indexes(self, messages):
+        """System header, latest turns and tool results after the last assistant reply"""
+        pinned = set()
+        for i, message in enumerate(messages):
+            if message["role"] != "system":
+                break
+            pinned.add(i)
+        pinned.update(range(max(len(messages) - self.keep_recent, 0), len(messages)))
+        last_assistant = max((i for i, m in enumerate(messages) if m["role"] == "assistant"), default=-1)
+        pinned.update(i for i in range(last_assistant + 1, len(messages)) if self.is_tool_result(messages[i]))
+        return pinned
+
+    def collapse(self, message, tokens):
+        """Shorten an old tool result to its opening lines"""
+        content = message["content"]
+        excerpt = content[:self.collapse_excerpt].rstrip()
+        return {"role": message["role"], "content": f"{excerpt}… [collapsed, {tokens} tokens of earlier tool output]"}
+
+    def fit(self, messages):
+        """Return the messages to send within the budget and a token report"""
+        tokens = [self.message_tokens(m) for m in messages]
+        original = sum(tokens)
+        total = original
+        fitted = list(messages)
+        collapsed = 0
+        dropped = []
+
+        if total > self.budget:
+            pinned = self.pinned_indexes(messages)
+
+            # Collapse old tool dumps first, they are the bulk of a long session
+            for i, message in enumerate(messages):
+                if total <= self.budget:
+                    break
+                if i in pinned or not self.is_tool_result(message):
+                    continue
+                short = self.collapse(message, tokens[i])
+                short_tokens = self.message_tokens(short)
+                if short_tokens < tokens[i]:
+                    fitted[i] = short
+                    total -= tokens[i] - short_tokens
+                    tokens[i] = short_tokens
+                    collapsed += 1
+
+            # Then drop the oldest unpinned turns
+            for i in range(len(messages)):
+                if total <= self.budget:
+                    break
+                if i not in pinned:
+                    dropped.append(i)
+                    total -= tokens[i]
+
+            if dropped:
+                # The note goes right after the system header, where the dropped turns began
+                dropped_set = set(dropped)
+                header_end = next((i for i, m in enumerate(messages) if m["role"] != "system"), len(messages))
+                kept = [i for i in range(len(fitted)) if i not in dropped_set]
+                note = {"role": "system", "content": f"[{len(dropped)} earlier messages were left out to fit the context window]"}
+                fitted = [fitted[i] for i in kept if i < header_end] + [note] + [fitted[i] for i in kept if i >= header_end]
+                total += self.message_tokens(note)
+
+        report = {
+            "budget": self.budget,
+            "tokens": total,
+            "original_tokens": original,
+            "messages": len(fitted),
+            "original_messages": len(messages),
+            "collapsed": collapsed,
+            "dropped": len(dropped),
+        }
+        with self.lock:
+            self.last_report = report
+            self.request_count += 1
+            self.tokens_sent += total
+            self.tokens_saved += original - total
+        return fitted, report
+
+    def stats(self):
+        """Token totals across all requests so far"""
+        with self.lock:
+            return {
+                "requests": self.request_count,
+                "tokens_sent": self.tokens_sent,
+                "tokens_saved": self.tokens_saved,
+                "last": self.last_report,
+            }
+# Cheapest entry in model_options, used for background summaries
+SUMMARY_MODEL = "mistral-small-latest"
+
+class ConversationSummarizer:
+    """Folds the older part of session_history into a rolling summary.
+
+    session_history only ever grows, so the summary covers a prefix of it:
+    history[1:covered]. Outgoing requests use view(), which puts the summary in place of
+    those turns. Summaries are made by SUMMARY_MODEL in a coroutine submitted to the
+    shared event loop (async_runtime, no thread of its own) once enough unsummarized
+    turns have piled up, so a user-facing turn never waits on them; until a summary is
+    ready the turns are simply sent as they are.
+    """
+    SUMMARY_PROMPT = (
+        "You maintain the running memory of a conversation between Eva, a personal assistant, "
+        "and her user. Merge the previous summary with the new messages into one concise summary. "
+        "Keep facts, decisions, open requests, task/alarm/calendar details and anything Eva promised "
+        "to do. Drop greetings, tool formatting and raw data that is no longer needed. "
+        "Write plain prose or short bullet points, no more than 300 words."
+    )
+
+    def __init__(self, history, keep_recent=12, min_batch_tokens=3000, model=SUMMARY_MODEL, max_message_chars=1500):
+        self.history = history  # The live session_history; index 0 is the system prompt
+        self.keep_recent = keep_recent
+        self.min_batch_tokens = min_batch_tokens
+        self.model = model
+        self.max_message_chars = max_message_chars
+        self.lock = threading.Lock()
+        self.summary = ""
+        self.covered = 1
+        self.running = False
+        self.summary_count = 0
+        self.failure_count = 0
+        self.last_duration = None
+
+    def view(self):
+        """history[1:] with the summarized turns replaced by the summary"""
+        with self.lock:
+            summary, covered = self.summary, self.covered
+        tail = self.history[covered:]
+        if not summary:
+            return tail
+        return [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}] + tail
+
+    def batch_end(self):
+        """End of the next batch: keep_recent back, moved to the start of a user turn"""
+        for end in range(len(self.history) - self.keep_recent, self.covered, -1):
+            message = self.history[end]
+            if message["role"] == "user" and not ContextWindow.is_tool_result(message):
+                return end
+        return None
+
+    def maybe_schedule(self):
+        """Submit a summary task to the shared event loop if enough old turns are waiting"""
+        with self.lock:
+            if self.running:
+                return False
+            end = self.batch_end()
+            if end is None:
+                return False
+            batch = self.history[self.covered:end]
+            if sum(ContextWindow.count_tokens(m["content"]) for m in batch) < self.min_batch_tokens:
+                return False
+            self.running = True
+            start, previous = self.covered, self.summary
+        async_runtime.submit(self.summarize(previous, start, end))
+        return True
+
+    async def summarize(self, previous, start, end):
+        started = time.time()
+        try:
+            summary = await self.request_summary(previous, self.history[start:end])
+            with self.lock:
+                if self.covered == start:
+                    self.summary = summary
+                    self.covered = end
+                    self.summary_count += 1
+                    self.last_duration = time.time() - started
+            print(f"🧾 Summarized {end - start} earlier messages in {time.time() - started:.1f}s")
+        except Exception as e:
+            with self.lock:
+                self.failure_count += 1
+            print(f"⚠️ Conversation summary failed, sending full turns for now: {e}")
+        finally:
+            with self.lock:
+                self.running = False
+
+    async def request_summary(self, previous, messages):
+        """Ask SUMMARY_MODEL to fold messages into the previous summary"""
+        lines = []
+        for message in messages:
+            content = message["content"]
+            if len(content) > self.max_message_chars:
+                content = content[:self.max_message_chars] + "…"
+            lines.append(f"{message['role']}: {content}")
+        user_content = (
+            f"Previous summary:\n{previous or '(none)'}\n\n"
+            f"New messages:\n" + "\n".join(lines)
+        )
+        await llm_scheduler.acquire_async(self.model, LLM_PRIORITY_MAINTENANCE)
+        response = await http_client.post(
+            MISTRAL_ENDPOINT,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {MISTRAL_API_KEY}"
+            },
+            json={
+                "model": self.model,
+                "temperature": 0.2,
+                "messages": [
+                    {"role": "system", "content": self.SUMMARY_PROMPT},
+                    {"role": "user", "content": user_content},
+                ],
+            },
+        )
+        if response.status_code == 429:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            llm_scheduler.penalize(self.model, retry_after if retry_after is not None else backoff_delay(1))
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "summaries": self.summary_count,
+                "failures": self.failure_count,
+                "covered_messages": self.covered - 1,
+                "summary_tokens": ContextWindow.count_tokens(self.summary),
+                "last_duration": self.last_duration,
+            }
+# ==================================================================== CONTEXT WINDOW ============================================================
+# ==================================================================== RESPONSE CACHE ============================================================
+# Opt-in: set EVA_RESPONSE_CACHE=1 to answer repeated questions from cache
+RESPONSE_CACHE_ENABLED = os.environ.get("EVA_RESPONSE_CACHE", "0") == "1"
+
+class ResponseCache:
+    """Cache of Mistral replies for repeated questions.
+
+    A reply is keyed on a normalized fingerprint of the user's question plus a hash of the
+    state its answer depends on: the system prompt with the memories injected into it,
+    the state_stamp() callback (tasks and calendar mirror versions, alarms, today's date)
+    and every tool result and reply after the question, so a follow-up is only reused
+    while the data it saw is unchanged. The clock line and earlier turns stay out of the
+    key, or no question could ever repeat; a question that leans on the previous turn
+    ("why?", "and that one?") also keys on the reply just before it.
+
+    Lookups try the exact fingerprint first, then the most similar cached question with
+    the same state, as long as both mention the same numbers and negations. Questions
+    about the clock itself are never cached, and neither are replies that change something
+    (task, email, alarm, calendar, app or memory tags), since replaying them would repeat
+    the action.
+    """
+    # How GUI and Telegram questions appear in the history
+    QUESTION_PATTERN = re.compile(r"^(user_says:|.{0,80}? say from telegram:)", re.DOTALL)
+    # Answers that depend on the current time, which is not part of the key
+    CLOCK_PATTERN = re.compile(
+        r"\b(what time is it|what's the time|what is the time|current time|time right now|time now|"
+        r"what day is it|what's the date|what is the date|today's date|how long until|how long till|"
+        r"how much time|how many (minutes|hours|days) (until|till|left|ago))\b")
+    # Questions that only make sense together with the previous reply
+    CONTEXT_PATTERN = re.compile(
+        r"^(why|how come|and|also|but|so|what about|how about|more|ok|okay|yes|no)\b|"
+        r"\b(it|that|this|these|those|them|they|he|she|him|her)\b")
+
+    def __init__(self, uncacheable_tags, state_stamp=None, ttl=600, max_entries=256, similarity_threshold=0.9):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.state_stamp = state_stamp
+        self.uncacheable_pattern = re.compile(r"<(%s)>" % "|".join(map(re.escape, uncacheable_tags)), re.IGNORECASE)
+        self.conflict_check = MinHashDeduplicator()  # Same number/negation test as memory dedup
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (state, fingerprint) -> (reply, stored_at, latency)
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.seconds_saved = 0.0
+
+    @classmethod
+    def normalize(cls, text):
+        text = cls.QUESTION_PATTERN.sub("", text, count=1).lower()
+        return " ".join(re.findall(r"[\w']+", text))
+
+    def key_for(self, messages):
+        """Cache key for a request, or None when it is not a cacheable user question"""
+        last_user = None
+        for i in range(len(messages) - 1, -1, -1):
+            message = messages[i]
+            if message["role"] == "user" and self.QUESTION_PATTERN.match(message["content"]):
+                last_user = i
+                break
+        if last_user is None:
+            return None
+        fingerprint = self.normalize(messages[last_user]["content"])
+        if not fingerprint or self.CLOCK_PATTERN.search(fingerprint):
+            return None
+        state = hashlib.sha1()
+        state.update(MODEL.encode("utf-8"))
+        # The first message is the system prompt with this turn's memories
+        state.update(messages[0]["content"].encode("utf-8"))
+        if self.state_stamp is not None:
+            state.update(b"\0" + str(self.state_stamp()).encode("utf-8"))
+        if len(fingerprint.split()) < 3 or self.CONTEXT_PATTERN.search(fingerprint):
+            previous = next((m["content"] for m in reversed(messages[1:last_user]) if m["role"] == "assistant"), "")
+            state.update(b"\0previous\0" + previous.encode("utf-8"))
+        for message in messages[last_user + 1:]:
+            state.update(b"\0" + message["role"].encode("utf-8") + b"\0" + message["content"].encode("utf-8"))
+        return state.hexdigest(), fingerprint
+
+    def lookup(self, key):
+        """Cached reply for key (exact, then similar question), or None"""
+        state, fingerprint = key
+        now = time.time()
+        with self.lock:
+            match = key if key in self.entries else None
+            if match is None:
+                best_ratio = self.similarity_threshold
+                for other in self.entries:
+                    if other[0] != state or now - self.entries[other][1] > self.ttl:
+                        continue
+                    ratio = SequenceMatcher(None, fingerprint, other[1]).ratio()
+                    if ratio >= best_ratio and not self.conflict_check.conflicts(fingerprint, other[1]):
+                        best_ratio, match = ratio, other
+            if match is None or now - self.entries[match][1] > self.ttl:
+                self.misses += 1
+                return None
+            reply, _, latency = self.entries[match]
+            self.entries.move_to_end(match)
+            self.hits += 1
+            if match != key:
+                self.similar_hits += 1
+            self.seconds_saved += latency
+            return reply
+
+    def store(self, key, reply, latency):
+        """Remember a reply unless it triggers state-changing tools"""
+        if self.uncacheable_pattern.search(reply):
+            with self.lock:
+                self.skipped += 1
+            return False
+        now = time.time()
+        with self.lock:
+            self.entries[key] = (reply, now, latency)
+            self.entries.move_to_end(key)
+            # Expired entries go first, then the least recently used
+            for stale in [k for k, entry in self.entries.items() if now - entry[1] > self.ttl]:
+                del self.entries[stale]
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return True
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "skipped_uncacheable": self.skipped,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "seconds_saved": round(self.seconds_saved, 2),
+            }
+# ==================================================================== RESPONSE CACHE ============================================================
+
+class ChatApp:
+    def __init__(self, monitor_email=True):
         self.alarm_system = AlarmSystem(self)
         self.app = Flask(__name__)
         self.socketio = SocketIO(self.app)
@@ -2119,8 +4944,17 @@ class ChatApp:
         self.last_email_id = None
         self.last_email_sent_time = 0
         self.processing_message = False 
+        self.tool_handlers = self.build_tool_registry()
+        self.tool_executor = ToolExecutor(max_workers=8, limits=self.TOOL_CONCURRENCY_LIMITS)
+        self.context_window = ContextWindow()
+        self.summarizer = ConversationSummarizer(self.session_history)
+        # Replaying a cached <tg> only re-sends the answer, every other write tag would repeat an action
+        uncacheable_tags = tuple(tag for tag in self.TOOL_WRITE_TAGS if tag != "tg") + ("m",)
+        self.response_cache = ResponseCache(uncacheable_tags, self.response_cache_state) if RESPONSE_CACHE_ENABLED else None
         self.setup_routes()
-        self.start_email_monitoring()
+        # Offline runs (benchmarks/e2e_harness.py) skip the Gmail poller and its OAuth flow
+        if monitor_email:
+            self.start_email_monitoring()
 
     def setup_routes(self):
         @self.app.route('/')
@@ -2130,17 +4964,54 @@ class ChatApp:
         @self.socketio.on('send_message')
         def handle_message(data):
             user_msg = data['message']
-            threading.Thread(target=self.process_message, args=(user_msg,), daemon=True).start()
+            async_runtime.submit(self.process_message_async(user_msg))
         
         @self.app.route("/config.json")
         def serve_config():
             return jsonify(load_config())
     
-    def process_message(self, user_msg):
-        """Process user message and generate AI response"""
-        if self.processing_message:
-            print("⚠️ Already processing a message, skipping...")
-            return
+    def stream_to_web(self, text, reply_id):
+        """Forward a streamed piece of <t> text to the browser bubble of reply_id"""
+        self.socketio.emit('receive_message_chunk', {
+            'sender': 'Eva',
+            'chunk': text,
+            'reply_id': reply_id
+        })
+
+    def web_stream(self):
+        """New reply id and the on_text callback streaming into its own bubble"""
+        reply_id = uuid.uuid4().hex
+        return reply_id, lambda text: self.stream_to_web(text, reply_id)
+
+    def shutdown(self):
+        """Persist what would otherwise be lost when the window closes"""
+        if json_memory is not None:
+            json_memory.flush_usage()
+
+    def response_cache_state(self):
+        """What cached answers depend on besides the prompt: mirror versions, alarms and the date"""
+        alarms = hashlib.sha1(json.dumps(self.alarm_system.active_alarms, sort_keys=True, default=str).encode("utf-8"))
+        return (tasks_mirror.version, calendar_mirror.version, alarms.hexdigest(), datetime.now().strftime("%Y-%m-%d"))
+
+    def finish_web_reply(self, reply_id, talk_lines):
+        """Replace the streamed text of reply_id with its parsed <t> lines"""
+        if talk_lines:
+            self.socketio.emit('receive_message', {
+                'sender': 'Eva',
+                'message': "\n\n".join(talk_lines),
+                'is_user': False,
+                'reply_id': reply_id
+            })
+
+    def process_message(self, user_msg):
+        """Blocking wrapper around process_message_async for synchronous callers"""
+        return async_runtime.run(self.process_message_async(user_msg))
+
+    async def process_message_async(self, user_msg):
+        """Process user message and generate AI response"""
+        if self.processing_message:
+            print("⚠️ Already processing a message, skipping...")
+            return
     
         self.processing_message = True
         
@@ -2149,10 +5020,11 @@ class ChatApp:
         print(f"INPUT: {user_msg}")
         print(f"{'='*60}\n")
         
+        self.socketio.emit('typing_start')
         try:
 
             # Get relevant memories
-            relevant_memories = get_relevant_memory(user_msg, n=5)
+            relevant_memories = await asyncio.to_thread(get_relevant_memory, user_msg, 5)
             
             # Create enhanced system prompt with memories
             original_system_prompt = self.session_history[0]["content"]
@@ -2164,28 +5036,34 @@ class ChatApp:
             
             # Create temporary session with enhanced prompt
             temp_session = [{"role": "system", "content": enhanced_system_prompt}]
-            temp_session.extend(self.session_history[1:])
+            temp_session.extend(self.summarizer.view())
             temp_session.append({"role": "user", "content": f"user_says: {user_msg}"})
             
-            # Get AI response
-            ai_response = self.query_mistral(temp_session)
+            # Get AI response, streaming <t> text to the browser and starting tools as they are generated
+            tool_run = self.start_tool_run()
+            reply_id, on_text = self.web_stream()
+            ai_response = await self.query_mistral_async(temp_session, on_text=on_text, on_chunk=tool_run.feed)
             
             # Add to main session history
             self.session_history.append({"role": "user", "content": f"user_says: {user_msg}"})
             self.session_history.append({"role": "assistant", "content": ai_response})
             
             # Parse and handle AI response
-            talk_lines, needs_followup = self.parse_ai_response(ai_response, enhanced_system_prompt)
+            talk_lines, needs_followup = await self.parse_ai_response_async(ai_response, enhanced_system_prompt, tool_run)
             
             # Handle follow-up if needed (for search results, email updates)
             if needs_followup:
+                # The first reply keeps its own bubble; the follow-up streams into a new one
+                self.finish_web_reply(reply_id, talk_lines)
                 temp_followup = [{"role": "system", "content": enhanced_system_prompt}]
-                temp_followup.extend(self.session_history[1:])
+                temp_followup.extend(self.summarizer.view())
                 
-                followup_response = self.query_mistral(temp_followup)
+                followup_run = self.start_tool_run()
+                reply_id, on_text = self.web_stream()
+                followup_response = await self.query_mistral_async(temp_followup, on_text=on_text, on_chunk=followup_run.feed)
                 self.session_history.append({"role": "assistant", "content": followup_response})
                 
-                followup_talk_lines, _ = self.parse_ai_response(followup_response, enhanced_system_prompt)
+                followup_talk_lines, _ = await self.parse_ai_response_async(followup_response, enhanced_system_prompt, followup_run)
                 talk_lines = followup_talk_lines
             
             # Send response to frontend
@@ -2204,7 +5082,8 @@ class ChatApp:
             self.socketio.emit('receive_message', {
                 'sender': 'Eva',
                 'message': response_text,
-                'is_user': False
+                'is_user': False,
+                'reply_id': reply_id
             })
             
         except Exception as e:
@@ -2217,14 +5096,14 @@ class ChatApp:
 
             # Create a follow-up session for correction
             correction_session = [{"role": "system", "content": enhanced_system_prompt}]
-            correction_session.extend(self.session_history[1:])
+            correction_session.extend(self.summarizer.view())
             correction_session.append({"role": "user", "content": feedback_msg})
 
             try:
-                correction_response = self.query_mistral(correction_session)
+                correction_response = await self.query_mistral_async(correction_session)
                 self.session_history.append({"role": "assistant", "content": correction_response})
 
-                correction_talk_lines, _ = self.parse_ai_response(correction_response, enhanced_system_prompt)
+                correction_talk_lines, _ = await self.parse_ai_response_async(correction_response, enhanced_system_prompt)
                 response_text = "\n\n".join(correction_talk_lines) if correction_talk_lines else "Response format issue."
 
                 self.socketio.emit('receive_message', {
@@ -2241,636 +5120,590 @@ class ChatApp:
                 })
 
         finally:
+            self.socketio.emit('typing_stop')
             self.processing_message = False 
+            # Fold older turns into the rolling summary after the reply, off the critical path
+            self.summarizer.maybe_schedule()
+
+    # Tags written without a closing tag
+    STANDALONE_TOOL_TAGS = ("task_update", "calendar_update", "alarm_list")
+    # Tags handled on the spot rather than on the tool executor
+    INLINE_TOOL_TAGS = ("t", "m")
+    # Quota group of each tool; calls in a group share its concurrency cap
+    TOOL_GROUPS = {
+        "s": "brave",
+        "task_update": "google_tasks", "ct": "google_tasks", "rt": "google_tasks", "dt": "google_tasks",
+        "ut": "google_tasks", "st": "google_tasks", "cl": "google_tasks",
+        "calendar_update": "google_calendar", "ce": "google_calendar", "re": "google_calendar",
+        "sm": "gmail", "rm": "gmail",
+        "tg": "telegram",
+        "sa": "alarms", "ra": "alarms", "alarm_list": "alarms",
+        "o": "apps",
+    }
+    # Tools that change state; they wait for every earlier call in their group and are
+    # held back until a streamed reply has completed
+    TOOL_WRITE_TAGS = ("ct", "rt", "dt", "ut", "cl", "ce", "re", "sm", "rm", "tg", "sa", "ra", "o")
+    # Maximum concurrent calls per group, sized for the Brave and Google API quotas
+    TOOL_CONCURRENCY_LIMITS = {
+        "brave": 2,
+        "google_tasks": 4,
+        "google_calendar": 2,
+        "gmail": 1,
+        "telegram": 1,
+        "alarms": 1,
+    }
+
+    def build_tool_registry(self):
+        """Map every tool tag Eva can emit to the method that handles it"""
+        return {
+            "t": self.tool_talk,
+            "m": self.tool_memory,
+            "s": self.tool_search,
+            "o": self.tool_open_app,
+            "tg": self.tool_telegram,
+            "sm": self.tool_send_email,
+            "rm": self.tool_read_email,
+            "task_update": self.tool_task_update,
+            "ct": self.tool_create_task,
+            "rt": self.tool_remove_task,
+            "dt": self.tool_mark_task_done,
+            "ut": self.tool_mark_task_undone,
+            "st": self.tool_search_task,
+            "cl": self.tool_create_tasklist,
+            "calendar_update": self.tool_calendar_update,
+            "ce": self.tool_create_event,
+            "re": self.tool_remove_event,
+            "sa": self.tool_set_alarm,
+            "ra": self.tool_remove_alarm,
+            "alarm_list": self.tool_alarm_list,
+        }
+
+    def start_tool_run(self):
+        """Begin collecting the tools of one reply; feed it chunks while streaming"""
+        return ToolRun(self.tool_handlers, self.INLINE_TOOL_TAGS, self.STANDALONE_TOOL_TAGS,
+                       self.tool_executor, self.TOOL_GROUPS, self.TOOL_WRITE_TAGS)
+
+    def parse_ai_response(self, response_text, enhanced_system_prompt=None, tool_run=None):
+        """Parse AI response and handle tools.
+
+        Every tag is dispatched through the tool registry by a single-pass parser. When the
+        reply was streamed, tool_run already holds the tools started during generation and
+        only the part of the reply it has not seen is parsed here.
+        """
+        if tool_run is None:
+            tool_run = self.start_tool_run()
+        tool_run.feed_reply(response_text)
+        tool_run.finish()
+        return self.apply_tool_run(tool_run)
+
+    async def parse_ai_response_async(self, response_text, enhanced_system_prompt=None, tool_run=None):
+        """parse_ai_response for the async pipeline: awaits the tools instead of blocking"""
+        if tool_run is None:
+            tool_run = self.start_tool_run()
+        tool_run.feed_reply(response_text)
+        await tool_run.finish_async()
+        # Memory saves touch the disk, keep them off the event loop
+        return await asyncio.to_thread(self.apply_tool_run, tool_run)
+
+    def apply_tool_run(self, tool_run):
+        """Store memories and add tool results to the session once a reply's tools are done"""
+        talk_lines = tool_run.talk_lines
+        needs_followup = tool_run.needs_followup
 
-    def parse_ai_response(self, response_text, enhanced_system_prompt=None):
-        """Parse AI response and handle tools - FIXED VERSION"""
-        talk_lines = []
-        needs_followup = False
-        
-        # Capture all print statements and send them to API
-        # This allows Eva to respond to system outputs like task creation, calendar events, etc.
-        captured_outputs = []
-        
-        # Extract talk content - THIS IS THE KEY FIX
-        talk_pattern = re.compile(r'<t>(.+?)</t>', re.IGNORECASE | re.DOTALL)
-        talk_matches = talk_pattern.findall(response_text)
-        talk_lines = [match.strip() for match in talk_matches]  # Clean up whitespace
-        
         # Show extracted talk lines count only
         print(f"📝 Extracted {len(talk_lines)} response lines")
-        
+
         # Handle memory storage
-        memory_pattern = re.compile(r'<m>(.+?)</m>', re.IGNORECASE | re.DOTALL)
-        memory_lines = memory_pattern.findall(response_text)
-        if memory_lines:
-            print(f"💾 Storing {len(memory_lines)} memories")
+        if tool_run.memories:
+            print(f"💾 Storing {len(tool_run.memories)} memories")
             current_time = datetime.now().strftime("%A, %B %d %Y | %I:%M %p")
-            for memory_line in memory_lines:  # Process all memory entries
-                save_memory(current_time, memory_line)
-        
-        # Handle web search - Process ALL search queries
-        search_pattern = re.compile(r'<s>(.+?)</s>', re.IGNORECASE | re.DOTALL)
-        search_lines = search_pattern.findall(response_text)
-        if search_lines:
-            print(f"🔍 Using search tool ({len(search_lines)} queries)")
-            for search_query in search_lines:
-                search_result = search_web(search_query, limit=6)
-                captured_outputs.append(f"search_result: {search_result}")
-                self.session_history.append({  # FIXED: was session_history
-                    "role": "user",
-                    "content": f"search_result: {search_result}"
-                })
-            needs_followup = True
+            with json_memory.batch():  # One disk write for all memories in this response
+                for memory_line in tool_run.memories:
+                    save_memory(current_time, memory_line)
 
-        # Handle Open applications - Process ALL apps
-        app_pattern = re.compile(r'<o>(.+?)</o>', re.IGNORECASE | re.DOTALL)
-        app_names = app_pattern.findall(response_text)
-        if app_names:
-            print(f"🚀 Opening {len(app_names)} apps")
-            for app_name in app_names:
-                result = open_app(app_name)
-                if result and "App not found" in result:
-                    captured_outputs.append(result)
-
-        # Handle Telegram messages - Process ALL messages
-        telegram_pattern = re.compile(r'<tg>(.+?)</tg>', re.IGNORECASE | re.DOTALL)
-        telegram_lines = telegram_pattern.findall(response_text)
-        if telegram_lines:
-            print(f"📱 Sending {len(telegram_lines)} Telegram messages")
-            for message in telegram_lines:
-                Send_telegram_message(message.strip())
-
-        # ===========EMAIL FUNCTIONALITY============
-        # Handle email sending - Process ALL emails
-        send_email_pattern = re.compile(r'<sm>\s*(.*?)\s*</sm>', re.IGNORECASE | re.DOTALL)
-        send_emails = send_email_pattern.findall(response_text)
-        if send_emails:
-            print(f"📧 Sending {len(send_emails)} emails")
-            for email_data in send_emails:
-                result = send_email_from_string(email_data)
-                self.last_email_sent_time = time.time()
-                captured_outputs.append(result)
-
-        # Handle read email - Process ALL emails
-        read_email_pattern = re.compile(r'<rm>(.+?)</rm>', re.IGNORECASE | re.DOTALL)
-        read_emails = read_email_pattern.findall(response_text)
-        if read_emails:
-            print(f"📬 Marking {len(read_emails)} emails as read")
-            for email_id in read_emails:
-                pass
-            result = mark_email_as_read(read_emails[0])
-            captured_outputs.append(result)
+        # Tool results reach the session now, after the reply itself has been added to it
+        self.session_history.extend(tool_run.history)
 
-        # =========== TASK FUNCTIONALITY============
-        # 1. TASK UPDATE - Get current tasks
+        # Send all captured outputs to the API as user input
+        # This allows Eva to respond to system outputs like task creation, calendar events, etc.
+        if tool_run.captured_outputs:
+            # Join all outputs into a single message
+            combined_output = "\n".join(tool_run.captured_outputs)
 
-        task_pattern = re.compile(r'<task_update>', re.IGNORECASE | re.DOTALL)
-        if task_pattern.search(response_text):
-            print("📋 Getting tasks from all lists")
-            
-            # Get all task lists first
-            all_task_lists = tasklists_get_all()
-            
-            all_formatted_tasks = []
-            
-            # Iterate through each task list
-            for task_list in all_task_lists:
-                list_id = task_list['id']
-                list_title = task_list['title']
-                
-                # Get tasks from this specific list
-                tasks_in_list = tasks_get_all(list_id)
-                
-                # Format tasks from this list
-                for task in tasks_in_list:
-                    status = "✅" if task.get('status') == 'completed' else "⭕"
-                    due_info = ""
-                    if task.get('due'):
-                        try:
-                            due_date = parser.isoparse(task['due']).strftime('%Y-%m-%d %H:%M')
-                            due_info = f" | Due: {due_date}"
-                        except:
-                            due_info = f" | Due: {task.get('due')}"
-                    
-                    formatted_task = {
-                        'id': task.get('id'),
-                        'title': task.get('title'),
-                        'status': task.get('status', 'needsAction'),
-                        'due': task.get('due'),
-                        'notes': task.get('notes'),
-                        'list_name': list_title,  # Add list name
-                        'list_id': list_id,       # Add list ID
-                        'display': f"{status} {task.get('title', 'Untitled')} [{list_title}]{due_info}"
-                    }
-                    all_formatted_tasks.append(formatted_task)
-            
-            print(f"📋 Found {len(all_formatted_tasks)} tasks across {len(all_task_lists)} lists")
-            
-            # Group tasks by list for better organization
-            tasks_by_list = {}
-            for task in all_formatted_tasks:
-                list_name = task['list_name']
-                if list_name not in tasks_by_list:
-                    tasks_by_list[list_name] = []
-                tasks_by_list[list_name].append(task)
-            
-            # Create a summary for Eva
-            task_summary = []
-            for list_name, tasks in tasks_by_list.items():
-                completed_count = len([t for t in tasks if t['status'] == 'completed'])
-                pending_count = len([t for t in tasks if t['status'] == 'needsAction'])
-                task_summary.append(f"📚 {list_name}: {pending_count} pending, {completed_count} completed")
-            
-            captured_outputs.append(f"task_update detected - Found {len(all_formatted_tasks)} tasks across {len(all_task_lists)} lists")
-            captured_outputs.append(f"Task summary: {'; '.join(task_summary)}")
-            captured_outputs.append(f"All tasks: {all_formatted_tasks}")
-            
+            # Add to session history as user input
             self.session_history.append({
                 "role": "user",
-                "content": f"Current tasks from all lists: {all_formatted_tasks}"
-            })
-            needs_followup = True
-        # 2. CREATE TASKS - Process ALL task creations
-        set_task_pattern = re.compile(r'<ct>(.+?)</ct>', re.IGNORECASE | re.DOTALL)
-        task_creates = set_task_pattern.findall(response_text)
-        if task_creates:
-            print(f"✅ Creating {len(task_creates)} tasks")
-            for task_match in task_creates:
-                pass
-                try:
-                    # Parse the task format: Title | Due Date | Notes | TaskList
-                    parts = [p.strip() for p in task_match.split('|')]
-                    title = parts[0] if parts[0] else "Untitled Task"
-                    due = None
-                    notes = None
-                    tasklist_id = '@default'
-
-                    # Handle due date (parts[1])
-                    if len(parts) > 1 and parts[1]:
-                        try:
-                            # If already in RFC3339 format
-                            if 'T' in parts[1] and ('Z' in parts[1] or '+' in parts[1]):
-                                due = parts[1]
-                            else:
-                                # Try to parse various date formats
-                                try:
-                                    # YYYY-MM-DD HH:MM format
-                                    dt = datetime.strptime(parts[1], "%Y-%m-%d %H:%M")
-                                    due = dt.isoformat() + "Z"
-                                except ValueError:
-                                    try:
-                                        # YYYY-MM-DD format
-                                        dt = datetime.strptime(parts[1], "%Y-%m-%d")
-                                        due = dt.isoformat() + "Z"
-                                    except ValueError:
-                                        clean_print(f"Could not parse date: {parts[1]}", "ERROR")
-                        except Exception as e:
-                            clean_print(f"Date parsing error: {e}", "ERROR")
-
-                    # Handle notes (parts[2])
-                    if len(parts) > 2 and parts[2]:
-                        notes = parts[2]
-
-                    # Handle tasklist (parts[3]) - optional
-                    if len(parts) > 3 and parts[3]:
-                        # Try to find tasklist by name
-                        found_list = tasklist_get_by_name(parts[3])
-                        if found_list:
-                            tasklist_id = found_list['id']
-                        else:
-                            # Auto-create the list if it doesn't exist
-                            print(f"Tasklist '{parts[3]}' not found, creating it...")
-                            new_list = tasklist_create(parts[3])
-                            if new_list:
-                                tasklist_id = new_list['id']
-                                captured_outputs.append(f"📚 Auto-created tasklist: {parts[3]}")
-                            else:
-                                print(f"Failed to create tasklist '{parts[3]}', using default")
-
-                    result = tasks_add(title, tasklist_id, due, notes)
-                    if result:
-                        success_msg = f"✅ Task created: {title}"
-                        if due:
-                            success_msg += f" (Due: {due})"
-                        print(success_msg)
-                        captured_outputs.append(success_msg)
-                    else:
-                        error_msg = f"❌ Failed to create task: {title}"
-                        print(error_msg)
-                        captured_outputs.append(error_msg)
-                        
-                except Exception as e:
-                    error_msg = f"❌ Error creating task: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-
-        # 3. REMOVE TASKS - Process ALL task removals
-        remove_task_pattern = re.compile(r'<rt>(.+?)</rt>', re.IGNORECASE | re.DOTALL)
-        remove_tasks = remove_task_pattern.findall(response_text)
-        if remove_tasks:
-            print(f"🗑️ Eva is using REMOVE TASK tool ({len(remove_tasks)} tasks)")
-            for task_id in remove_tasks:
-                task_id = task_id.strip()
-                print(f"   Removing task: {task_id}")
-                try:
-                    success = task_delete(task_id)  # Use your enhanced function
-                    if success:
-                        success_msg = f"✅ Task removed: {task_id}"
-                        print(success_msg)
-                        captured_outputs.append(success_msg)
-                    else:
-                        error_msg = f"❌ Failed to remove task: {task_id}"
-                        print(error_msg)
-                        captured_outputs.append(error_msg)
-                except Exception as e:
-                    error_msg = f"❌ Error removing task: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-
-        # 4. MARK TASKS AS DONE - New tool
-        done_task_pattern = re.compile(r'<dt>(.+?)</dt>', re.IGNORECASE | re.DOTALL)
-        done_tasks = done_task_pattern.findall(response_text)
-        if done_tasks:
-            print(f"✅ Eva is using MARK DONE tool ({len(done_tasks)} tasks)")
-            for task_id in done_tasks:
-                task_id = task_id.strip()
-                print(f"   Marking task as done: {task_id}")
-                try:
-                    result = task_mark_done(task_id)
-                    if result:
-                        success_msg = f"✅ Task marked as done: {task_id}"
-                        print(success_msg)
-                        captured_outputs.append(success_msg)
-                    else:
-                        error_msg = f"❌ Failed to mark task as done: {task_id}"
-                        print(error_msg)
-                        captured_outputs.append(error_msg)
-                except Exception as e:
-                    error_msg = f"❌ Error marking task as done: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-
-        # 5. MARK TASKS AS UNDONE - New tool
-        undone_task_pattern = re.compile(r'<ut>(.+?)</ut>', re.IGNORECASE | re.DOTALL)
-        undone_tasks = undone_task_pattern.findall(response_text)
-        if undone_tasks:
-            print(f"↩️ Eva is using MARK UNDONE tool ({len(undone_tasks)} tasks)")
-            for task_id in undone_tasks:
-                task_id = task_id.strip()
-                print(f"   Marking task as undone: {task_id}")
-                try:
-                    result = task_mark_undone(task_id)
-                    if result:
-                        success_msg = f"↩️ Task marked as undone: {task_id}"
-                        print(success_msg)
-                        captured_outputs.append(success_msg)
-                    else:
-                        error_msg = f"❌ Failed to mark task as undone: {task_id}"
-                        print(error_msg)
-                        captured_outputs.append(error_msg)
-                except Exception as e:
-                    error_msg = f"❌ Error marking task as undone: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-
-        # 6. SEARCH TASKS BY TITLE - New tool
-        search_task_pattern = re.compile(r'<st>(.+?)</st>', re.IGNORECASE | re.DOTALL)
-        search_queries = search_task_pattern.findall(response_text)
-        if search_queries:
-            print(f"🔍 Eva is using SEARCH TASK tool ({len(search_queries)} searches)")
-            for query in search_queries:
-                query = query.strip()
-                print(f"   Searching for task: {query}")
-                try:
-                    found_task = task_get_by_title(query)
-                    if found_task:
-                        success_msg = f"🔍 Found task: {found_task['title']} (ID: {found_task['id']})"
-                        print(success_msg)
-                        captured_outputs.append(success_msg)
-                        self.session_history.append({  # FIXED: was session_history
-                            "role": "user",
-                            "content": f"Found task: {found_task}"
-                        })
-                    else:
-                        not_found_msg = f"🔍 No task found with title: {query}"
-                        print(not_found_msg)
-                        captured_outputs.append(not_found_msg)
-                except Exception as e:
-                    error_msg = f"❌ Error searching for task: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-
-        # 7. CREATE TASKLIST - New tool
-        create_list_pattern = re.compile(r'<cl>(.+?)</cl>', re.IGNORECASE | re.DOTALL)
-        create_lists = create_list_pattern.findall(response_text)
-        if create_lists:
-            print(f"📚 Eva is using CREATE TASKLIST tool ({len(create_lists)} lists)")
-            for list_title in create_lists:
-                list_title = list_title.strip()
-                print(f"   Creating tasklist: {list_title}")
-                try:
-                    result = tasklist_create(list_title)
-                    if result:
-                        success_msg = f"📚 Tasklist created: {list_title} (ID: {result['id']})"
-                        print(success_msg)
-                        captured_outputs.append(success_msg)
-                    else:
-                        error_msg = f"❌ Failed to create tasklist: {list_title}"
-                        print(error_msg)
-                        captured_outputs.append(error_msg)
-                except Exception as e:
-                    error_msg = f"❌ Error creating tasklist: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-
-        # =========== CALENDAR FUNCTIONALITY============
-        # Get calendar events - with user feedback
-        calendar_pattern = re.compile(r'<calendar_update>', re.IGNORECASE | re.DOTALL)
-        if calendar_pattern.search(response_text):
-            print("calendar_update detected")
-            events_list = calendar_get_upcoming_events(limit=10)
-            captured_outputs.append(f"calendar_update detected")
-            captured_outputs.append(f"calendar events: {events_list}")
-            self.session_history.append({  # FIXED: was session_history
-                "role": "user",
-                "content": f"calendar events: {events_list}"
+                "content": f"System outputs: {combined_output}"
             })
+
+            # Set needs_followup to True so Eva can respond to these outputs
             needs_followup = True
 
-        # Create calendar events - Process ALL event creations
-        calendar_event_pattern = re.compile(r'<ce>(.+?)</ce>', re.IGNORECASE | re.DOTALL)
-        calendar_events = calendar_event_pattern.findall(response_text)
-        if calendar_events:
-            print(f"📅 Eva is using CREATE CALENDAR EVENT tool ({len(calendar_events)} events)")
-            for event_text in calendar_events:
-                print(f"   Creating event: {event_text}")
-                try:
-                    # Parse event creation logic here...
-                    # (keeping the existing calendar event creation code)
-                    event_parts = event_text.strip().split(' due ')
-                    if len(event_parts) < 2:
-                        raise ValueError("Invalid format. Use 'due' to separate title from date/time.")
-                    
-                    title = event_parts[0].strip()
-                    datetime_part = event_parts[1].strip()
+        return talk_lines, needs_followup
 
-                    time_parts = datetime_part.split(' to ')
-                    if len(time_parts) < 2:
-                        raise ValueError("Invalid format. Use 'to' to specify the end time.")
+    def tool_talk(self, text, output):
+        """<t> - what Eva says to the user"""
+        output.talk_lines.append(text.strip())
+
+    def tool_memory(self, memory_line, output):
+        """<m> - memories are saved together once the reply is complete"""
+        output.memories.append(memory_line)
+
+    async def tool_search(self, search_query, output):
+        """<s> - web search"""
+        print(f"🔍 Using search tool: {search_query}")
+        search_result = await search_web_async(search_query, limit=6)
+        output.captured_outputs.append(f"search_result: {search_result}")
+        output.history.append({
+            "role": "user",
+            "content": f"search_result: {search_result}"
+        })
+        output.needs_followup = True
+
+    def tool_open_app(self, app_name, output):
+        """<o> - open an application"""
+        print(f"🚀 Opening {app_name}")
+        result = open_app(app_name)
+        if result and "App not found" in result:
+            output.captured_outputs.append(result)
+
+    async def tool_telegram(self, message, output):
+        """<tg> - send a Telegram message"""
+        print("📱 Sending Telegram message")
+        await send_telegram_message_async(message.strip())
+
+    # ===========EMAIL FUNCTIONALITY============
+    def tool_send_email(self, email_data, output):
+        """<sm> - send an email"""
+        print("📧 Sending email")
+        result = send_email_from_string(email_data.strip())
+        self.last_email_sent_time = time.time()
+        output.captured_outputs.append(result)
+
+    def tool_read_email(self, email_id, output):
+        """<rm> - mark an email as read"""
+        print("📬 Marking email as read")
+        result = mark_email_as_read(email_id)
+        output.captured_outputs.append(result)
+
+    # =========== TASK FUNCTIONALITY============
+    def tool_task_update(self, _, output):
+        """<task_update> - get current tasks from all lists"""
+        print("📋 Getting tasks from all lists")
+
+        # Get all task lists first
+        all_task_lists = tasklists_get_all()
 
-                    start_str = time_parts[0].strip()
-                    end_and_zone_str = time_parts[1].strip()
+        # Every list's tasks come from the local mirror in one query; if the mirror has
+        # never synced they come from Google, and a failure there reaches the tool output
+        try:
+            tasks_by_list_id = tasks_mirror.tasks_by_list()
+        except Exception as e:
+            print(f"Tasks mirror unavailable, fetching from Google: {e}")
+            tasks_by_list_id = tasks_get_many([task_list['id'] for task_list in all_task_lists])
 
-                    last_space_index = end_and_zone_str.rfind(' ')
-                    if last_space_index == -1:
-                        raise ValueError("Could not find timezone.")
-                    
-                    end_time_str = end_and_zone_str[:last_space_index].strip()
-                    timezone = end_and_zone_str[last_space_index + 1:].strip()
+        all_formatted_tasks = []
 
-                    if len(end_time_str.split()) == 1:
-                        date_str = start_str.split(' ')[0]
-                        end_datetime_iso = f"{date_str}T{end_time_str}"
-                    else:
-                        end_datetime_iso = end_time_str.replace(' ', 'T')
-
-                    start_datetime_iso = start_str.replace(' ', 'T')
-
-                    event_details = {
-                        'summary': title,
-                        'start': {
-                            'dateTime': start_datetime_iso,
-                            'timeZone': timezone,
-                        },
-                        'end': {
-                            'dateTime': end_datetime_iso,
-                            'timeZone': timezone,
-                        },
-                    }
-                    
-                    result = calendar_set_event(event_details)
-                    if result:
-                        success_msg = f"✅ Calendar event created: {title}"
-                        print(success_msg)
-                        captured_outputs.append(success_msg)
-                    else:
-                        error_msg = f"❌ Failed to create calendar event: {title}"
-                        print(error_msg)
-                        captured_outputs.append(error_msg)
+        # Iterate through each task list
+        for task_list in all_task_lists:
+            list_id = task_list['id']
+            list_title = task_list['title']
 
-                except Exception as e:
-                    error_msg = f"❌ Error parsing calendar event: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-
-        # Remove calendar events - Process ALL event removals
-        remove_event_pattern = re.compile(r'<re>(.+?)</re>', re.IGNORECASE | re.DOTALL)
-        remove_events = remove_event_pattern.findall(response_text)
-        if remove_events:
-            print(f"🗑️ Eva is using REMOVE CALENDAR EVENT tool ({len(remove_events)} events)")
-            for event_id in remove_events:
-                print(f"   Removing event: {event_id}")
-                try:
-                    get_calendar_service().events().delete(calendarId='primary', eventId=event_id.strip()).execute()
-                    success_msg = f"✅ Calendar event removed: {event_id}"
-                    print(success_msg)
-                    captured_outputs.append(success_msg)
-                except Exception as e:
-                    error_msg = f"❌ Error removing calendar event: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-        
-        # Send all captured outputs to the API as user input
-        if captured_outputs:
-            # Join all outputs into a single message
-            combined_output = "\n".join(captured_outputs)
-            
-            # Add to session history as user input
-            self.session_history.append({
-                "role": "user",
-                "content": f"System outputs: {combined_output}"
-            })
-            
-            # Set needs_followup to True so Eva can respond to these outputs
-            needs_followup = True
-        
+            # Get tasks from this specific list
+            tasks_in_list = tasks_by_list_id.get(list_id, [])
 
+            # Format tasks from this list
+            for task in tasks_in_list:
+                status = "✅" if task.get('status') == 'completed' else "⭕"
+                due_info = ""
+                if task.get('due'):
+                    try:
+                        due_date = parser.isoparse(task['due']).strftime('%Y-%m-%d %H:%M')
+                        due_info = f" | Due: {due_date}"
+                    except:
+                        due_info = f" | Due: {task.get('due')}"
+
+                formatted_task = {
+                    'id': task.get('id'),
+                    'title': task.get('title'),
+                    'status': task.get('status', 'needsAction'),
+                    'due': task.get('due'),
+                    'notes': task.get('notes'),
+                    'list_name': list_title,  # Add list name
+                    'list_id': list_id,       # Add list ID
+                    'display': f"{status} {task.get('title', 'Untitled')} [{list_title}]{due_info}"
+                }
+                all_formatted_tasks.append(formatted_task)
+
+        print(f"📋 Found {len(all_formatted_tasks)} tasks across {len(all_task_lists)} lists")
+
+        # Group tasks by list for better organization
+        tasks_by_list = {}
+        for task in all_formatted_tasks:
+            list_name = task['list_name']
+            if list_name not in tasks_by_list:
+                tasks_by_list[list_name] = []
+            tasks_by_list[list_name].append(task)
+
+        # Create a summary for Eva
+        task_summary = []
+        for list_name, tasks in tasks_by_list.items():
+            completed_count = len([t for t in tasks if t['status'] == 'completed'])
+            pending_count = len([t for t in tasks if t['status'] == 'needsAction'])
+            task_summary.append(f"📚 {list_name}: {pending_count} pending, {completed_count} completed")
+
+        output.captured_outputs.append(f"task_update detected - Found {len(all_formatted_tasks)} tasks across {len(all_task_lists)} lists")
+        output.captured_outputs.append(f"Task summary: {'; '.join(task_summary)}")
+        output.captured_outputs.append(f"All tasks: {all_formatted_tasks}")
+
+        output.history.append({
+            "role": "user",
+            "content": f"Current tasks from all lists: {all_formatted_tasks}"
+        })
+        output.needs_followup = True
 
-        # =========== ALARM FUNCTIONALITY ============
-        # 1. SET ALARM - Process ALL alarm creations
-        set_alarm_pattern = re.compile(r'<sa>(.+?)</sa>', re.IGNORECASE | re.DOTALL)
-        set_alarms = set_alarm_pattern.findall(response_text)
-        if set_alarms:
-            print(f"⏰ Eva is using SET ALARM tool ({len(set_alarms)} alarms)")
-            for alarm_data in set_alarms:
-                print(f"   Setting alarm: {alarm_data}")
-                try:
-                    # Parse format: alarm_name | alarm_time | description | recurring (optional)
-                    parts = [p.strip() for p in alarm_data.split('|')]
-                    alarm_name = parts[0] if parts[0] else "Unnamed Alarm"
-                    alarm_time = parts[1] if len(parts) > 1 else None
-                    description = parts[2] if len(parts) > 2 else ""
-                    recurring = parts[3] if len(parts) > 3 else "none"
-                    
-                    if not alarm_time:
-                        error_msg = "❌ Alarm time not specified"
-                        #print(error_msg)
-                        captured_outputs.append(error_msg)
-                        self.session_history.append({  # FIXED: was session_history
-                            "role": "user",
-                            "content": f"alarm_error: {error_msg}"
-                        })
-                        needs_followup = True
-                        continue
-                    
-                    result = self.alarm_system.set_alarm(alarm_name, alarm_time, description, recurring)
-                    if result["success"]:
-                        recurring_text = f" (recurring {result.get('recurring', 'none')})" if result.get('recurring') != "none" else " (one-time)"
-                        success_msg = f"⏰ Alarm set: {alarm_name} at {result['time']}{recurring_text}"
-                        #print(success_msg)
-                        captured_outputs.append(success_msg)
-
-                        self.session_history.append({  # FIXED: was session_history
-                            "role": "user",
-                            "content": f"alarm_success: {success_msg}"
-                        })
-                        needs_followup = True
-                    else:
-                        error_msg = f"❌ Failed to set alarm: {result['error']}"
-                        print(error_msg)
-                        captured_outputs.append(error_msg)
-                        self.session_history.append({  # FIXED: was session_history
-                            "role": "user",
-                            "content": f"alarm_error: {error_msg}"
-                        })
-                        needs_followup = True                       
-                        
-                except Exception as e:
-                    error_msg = f"❌ Error setting alarm: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-                    captured_outputs.append(error_msg)
-                    self.session_history.append({  # FIXED: was session_history
-                        "role": "user",
-                        "content": f"search_result: {error_msg}"
-                    })
-                    needs_followup = True 
-
-        # 2. REMOVE ALARM - Process ALL alarm removals
-        remove_alarm_pattern = re.compile(r'<ra>(.+?)</ra>', re.IGNORECASE | re.DOTALL)
-        remove_alarms = remove_alarm_pattern.findall(response_text)
-        if remove_alarms:
-            print(f"🗑️ Eva is using REMOVE ALARM tool ({len(remove_alarms)} alarms)")
-            for alarm_identifier in remove_alarms:
-                alarm_identifier = alarm_identifier.strip()
-                print(f"   Removing alarm: {alarm_identifier}")
+    def tool_create_task(self, task_match, output):
+        """<ct> - create a task: Title | Due Date | Notes | TaskList"""
+        print("✅ Creating task")
+        try:
+            parts = [p.strip() for p in task_match.split('|')]
+            title = parts[0] if parts[0] else "Untitled Task"
+            due = None
+            notes = None
+            tasklist_id = '@default'
+
+            # Handle due date (parts[1])
+            if len(parts) > 1 and parts[1]:
                 try:
-                    result = self.alarm_system.remove_alarm(alarm_identifier)
-                    if result["success"]:
-                        success_msg = f"🗑️ Alarm removed: {result['removed_alarm']}"
-                        print(success_msg)
-                        captured_outputs.append(success_msg)
+                    # If already in RFC3339 format
+                    if 'T' in parts[1] and ('Z' in parts[1] or '+' in parts[1]):
+                        due = parts[1]
                     else:
-                        error_msg = f"❌ Failed to remove alarm: {result['error']}"
-                        print(error_msg)
-                        captured_outputs.append(error_msg)
+                        # Try to parse various date formats
+                        try:
+                            # YYYY-MM-DD HH:MM format
+                            dt = datetime.strptime(parts[1], "%Y-%m-%d %H:%M")
+                            due = dt.isoformat() + "Z"
+                        except ValueError:
+                            try:
+                                # YYYY-MM-DD format
+                                dt = datetime.strptime(parts[1], "%Y-%m-%d")
+                                due = dt.isoformat() + "Z"
+                            except ValueError:
+                                clean_print(f"Could not parse date: {parts[1]}", "ERROR")
                 except Exception as e:
-                    error_msg = f"❌ Error removing alarm: {e}"
-                    print(error_msg)
-                    captured_outputs.append(error_msg)
-
-        # 3. LIST ALARMS - Get all active alarms
-        list_alarms_pattern = re.compile(r'<alarm_list>', re.IGNORECASE | re.DOTALL)
-        if list_alarms_pattern.search(response_text):
-            print("📋 Eva is using LIST ALARMS tool")
-            try:
-                result = self.alarm_system.list_alarms()
-                if result["success"]:
-                    if result["alarms"]:
-                        alarm_info = f"Active alarms: {result['alarms']}"
-                        print(f"📋 {len(result['alarms'])} active alarms found")
-                        captured_outputs.append(alarm_info)
-                        self.session_history.append({
-                            "role": "user",
-                            "content": f"Current alarms: {result['alarms']}"
-                        })
+                    clean_print(f"Date parsing error: {e}", "ERROR")
+
+            # Handle notes (parts[2])
+            if len(parts) > 2 and parts[2]:
+                notes = parts[2]
+
+            # Handle tasklist (parts[3]) - optional
+            if len(parts) > 3 and parts[3]:
+                # Try to find tasklist by name
+                found_list = tasklist_get_by_name(parts[3])
+                if found_list:
+                    tasklist_id = found_list['id']
+                else:
+                    # Auto-create the list if it doesn't exist
+                    print(f"Tasklist '{parts[3]}' not found, creating it...")
+                    new_list = tasklist_create(parts[3])
+                    if new_list:
+                        tasklist_id = new_list['id']
+                        output.captured_outputs.append(f"📚 Auto-created tasklist: {parts[3]}")
                     else:
-                        no_alarms_msg = "📋 No active alarms"
-                        print(no_alarms_msg)
-                        captured_outputs.append(no_alarms_msg)
-                needs_followup = True
-            except Exception as e:
-                error_msg = f"❌ Error listing alarms: {e}"
+                        print(f"Failed to create tasklist '{parts[3]}', using default")
+
+            result = tasks_add(title, tasklist_id, due, notes)
+            if result:
+                success_msg = f"✅ Task created: {title}"
+                if due:
+                    success_msg += f" (Due: {due})"
+                print(success_msg)
+                output.captured_outputs.append(success_msg)
+            else:
+                error_msg = f"❌ Failed to create task: {title}"
                 print(error_msg)
-                captured_outputs.append(error_msg)
-        
-        return talk_lines, needs_followup
+                output.captured_outputs.append(error_msg)
 
-    def process_alarm_notification(self, alarm_message):
-        """Process alarm notification"""
+        except Exception as e:
+            error_msg = f"❌ Error creating task: {e}"
+            print(error_msg)
+            output.captured_outputs.append(error_msg)
+
+    def tool_remove_task(self, task_id, output):
+        """<rt> - remove a task"""
+        task_id = task_id.strip()
+        print(f"🗑️ Eva is using REMOVE TASK tool: {task_id}")
         try:
-            # Get relevant memories
-            relevant_memories = get_relevant_memory(alarm_message, n=3)
-            
-            # Create enhanced system prompt with memories
-            original_system_prompt = self.session_history[0]["content"]
-            if relevant_memories:
-                memory_context = "\n\nRelevant memories from previous conversations:\n" + "\n".join([f"- {memory}" for memory in relevant_memories])
-                enhanced_system_prompt = original_system_prompt + memory_context
+            success = task_delete(task_id)
+            if success:
+                success_msg = f"✅ Task removed: {task_id}"
+                print(success_msg)
+                output.captured_outputs.append(success_msg)
             else:
-                enhanced_system_prompt = original_system_prompt
-            
-            # Create temporary session with enhanced prompt
-            temp_session = [{"role": "system", "content": enhanced_system_prompt}]
-            temp_session.extend(self.session_history[1:])
-            
-            # Get AI response
-            ai_response = self.query_mistral(temp_session)
-            self.session_history.append({"role": "assistant", "content": ai_response})
-            
-            # Parse response
-            talk_lines, needs_followup = self.parse_ai_response(ai_response, enhanced_system_prompt)
-            
-            # Handle follow-up if needed
-            if needs_followup:
-                temp_followup = [{"role": "system", "content": enhanced_system_prompt}]
-                temp_followup.extend(self.session_history[1:])
-                
-                followup_response = self.query_mistral(temp_followup)
-                self.session_history.append({"role": "assistant", "content": followup_response})
-                
-                followup_talk_lines, _ = self.parse_ai_response(followup_response, enhanced_system_prompt)
-                talk_lines = followup_talk_lines
-            
-            # Send response to web interface
-            if talk_lines:
-                response_text = "\n\n".join(talk_lines)
-                self.socketio.emit('receive_message', {
-                    'sender': 'Eva',
-                    'message': f"🚨 ALARM: {response_text}",
-                    'is_user': False
+                error_msg = f"❌ Failed to remove task: {task_id}"
+                print(error_msg)
+                output.captured_outputs.append(error_msg)
+        except Exception as e:
+            error_msg = f"❌ Error removing task: {e}"
+            print(error_msg)
+            output.captured_outputs.append(error_msg)
+
+    def tool_mark_task_done(self, task_id, output):
+        """<dt> - mark a task as done"""
+        task_id = task_id.strip()
+        print(f"✅ Eva is using MARK DONE tool: {task_id}")
+        try:
+            result = task_mark_done(task_id)
+            if result:
+                success_msg = f"✅ Task marked as done: {task_id}"
+                print(success_msg)
+                output.captured_outputs.append(success_msg)
+            else:
+                error_msg = f"❌ Failed to mark task as done: {task_id}"
+                print(error_msg)
+                output.captured_outputs.append(error_msg)
+        except Exception as e:
+            error_msg = f"❌ Error marking task as done: {e}"
+            print(error_msg)
+            output.captured_outputs.append(error_msg)
+
+    def tool_mark_task_undone(self, task_id, output):
+        """<ut> - mark a task as undone"""
+        task_id = task_id.strip()
+        print(f"↩️ Eva is using MARK UNDONE tool: {task_id}")
+        try:
+            result = task_mark_undone(task_id)
+            if result:
+                success_msg = f"↩️ Task marked as undone: {task_id}"
+                print(success_msg)
+                output.captured_outputs.append(success_msg)
+            else:
+                error_msg = f"❌ Failed to mark task as undone: {task_id}"
+                print(error_msg)
+                output.captured_outputs.append(error_msg)
+        except Exception as e:
+            error_msg = f"❌ Error marking task as undone: {e}"
+            print(error_msg)
+            output.captured_outputs.append(error_msg)
+
+    def tool_search_task(self, query, output):
+        """<st> - search for a task by title"""
+        query = query.strip()
+        print(f"🔍 Eva is using SEARCH TASK tool: {query}")
+        try:
+            found_task = task_get_by_title(query)
+            if found_task:
+                success_msg = f"🔍 Found task: {found_task['title']} (ID: {found_task['id']})"
+                print(success_msg)
+                output.captured_outputs.append(success_msg)
+                output.history.append({
+                    "role": "user",
+                    "content": f"Found task: {found_task}"
                 })
-                
-                # Also send to Telegram if available
-                Send_telegram_message(f"🚨 ALARM: {response_text}")
-            
+            else:
+                not_found_msg = f"🔍 No task found with title: {query}"
+                print(not_found_msg)
+                output.captured_outputs.append(not_found_msg)
         except Exception as e:
-            print(f"Error processing alarm notification: {e}")
-            # Send fallback message
-            fallback_message = f"🚨 ALARM TRIGGERED: {alarm_message}"
-            self.socketio.emit('receive_message', {
-                'sender': 'Eva',
-                'message': fallback_message,
-                'is_user': False
+            error_msg = f"❌ Error searching for task: {e}"
+            print(error_msg)
+            output.captured_outputs.append(error_msg)
+
+    def tool_create_tasklist(self, list_title, output):
+        """<cl> - create a task list"""
+        list_title = list_title.strip()
+        print(f"📚 Eva is using CREATE TASKLIST tool: {list_title}")
+        try:
+            result = tasklist_create(list_title)
+            if result:
+                success_msg = f"📚 Tasklist created: {list_title} (ID: {result['id']})"
+                print(success_msg)
+                output.captured_outputs.append(success_msg)
+            else:
+                error_msg = f"❌ Failed to create tasklist: {list_title}"
+                print(error_msg)
+                output.captured_outputs.append(error_msg)
+        except Exception as e:
+            error_msg = f"❌ Error creating tasklist: {e}"
+            print(error_msg)
+            output.captured_outputs.append(error_msg)
+
+    # =========== CALENDAR FUNCTIONALITY============
+    def tool_calendar_update(self, _, output):
+        """<calendar_update> - get upcoming calendar events"""
+        print("calendar_update detected")
+        events_list = calendar_get_upcoming_events(limit=10)
+        output.captured_outputs.append(f"calendar_update detected")
+        output.captured_outputs.append(f"calendar events: {events_list}")
+        output.history.append({
+            "role": "user",
+            "content": f"calendar events: {events_list}"
+        })
+        output.needs_followup = True
+
+    def tool_create_event(self, event_text, output):
+        """<ce> - create a calendar event: Title due YYYY-MM-DD HH:MM to HH:MM TZ"""
+        print(f"📅 Eva is using CREATE CALENDAR EVENT tool: {event_text}")
+        try:
+            event_parts = event_text.strip().split(' due ')
+            if len(event_parts) < 2:
+                raise ValueError("Invalid format. Use 'due' to separate title from date/time.")
+
+            title = event_parts[0].strip()
+            datetime_part = event_parts[1].strip()
+
+            time_parts = datetime_part.split(' to ')
+            if len(time_parts) < 2:
+                raise ValueError("Invalid format. Use 'to' to specify the end time.")
+
+            start_str = time_parts[0].strip()
+            end_and_zone_str = time_parts[1].strip()
+
+            last_space_index = end_and_zone_str.rfind(' ')
+            if last_space_index == -1:
+                raise ValueError("Could not find timezone.")
+
+            end_time_str = end_and_zone_str[:last_space_index].strip()
+            timezone = end_and_zone_str[last_space_index + 1:].strip()
+
+            if len(end_time_str.split()) == 1:
+                date_str = start_str.split(' ')[0]
+                end_datetime_iso = f"{date_str}T{end_time_str}"
+            else:
+                end_datetime_iso = end_time_str.replace(' ', 'T')
+
+            start_datetime_iso = start_str.replace(' ', 'T')
+
+            event_details = {
+                'summary': title,
+                'start': {
+                    'dateTime': start_datetime_iso,
+                    'timeZone': timezone,
+                },
+                'end': {
+                    'dateTime': end_datetime_iso,
+                    'timeZone': timezone,
+                },
+            }
+
+            result = calendar_set_event(event_details)
+            if result:
+                success_msg = f"✅ Calendar event created: {title}"
+                print(success_msg)
+                output.captured_outputs.append(success_msg)
+            else:
+                error_msg = f"❌ Failed to create calendar event: {title}"
+                print(error_msg)
+                output.captured_outputs.append(error_msg)
+
+        except Exception as e:
+            error_msg = f"❌ Error parsing calendar event: {e}"
+            print(error_msg)
+            output.captured_outputs.append(error_msg)
+
+    def tool_remove_event(self, event_id, output):
+        """<re> - remove a calendar event"""
+        print(f"🗑️ Eva is using REMOVE CALENDAR EVENT tool: {event_id}")
+        try:
+            get_calendar_service().events().delete(calendarId='primary', eventId=event_id.strip()).execute()
+            calendar_mirror.remove_event(event_id.strip())
+            success_msg = f"✅ Calendar event removed: {event_id}"
+            print(success_msg)
+            output.captured_outputs.append(success_msg)
+        except Exception as e:
+            error_msg = f"❌ Error removing calendar event: {e}"
+            print(error_msg)
+            output.captured_outputs.append(error_msg)
+
+    # =========== ALARM FUNCTIONALITY ============
+    # Alarm results go straight into the history rather than the "System outputs" summary
+    def tool_set_alarm(self, alarm_data, output):
+        """<sa> - set an alarm: alarm_name | alarm_time | description | recurring (optional)"""
+        print(f"⏰ Eva is using SET ALARM tool: {alarm_data}")
+        try:
+            parts = [p.strip() for p in alarm_data.split('|')]
+            alarm_name = parts[0] if parts[0] else "Unnamed Alarm"
+            alarm_time = parts[1] if len(parts) > 1 else None
+            description = parts[2] if len(parts) > 2 else ""
+            recurring = parts[3] if len(parts) > 3 else "none"
+
+            if not alarm_time:
+                error_msg = "❌ Alarm time not specified"
+                output.history.append({
+                    "role": "user",
+                    "content": f"alarm_error: {error_msg}"
+                })
+                output.needs_followup = True
+                return
+
+            result = self.alarm_system.set_alarm(alarm_name, alarm_time, description, recurring)
+            if result["success"]:
+                recurring_text = f" (recurring {result.get('recurring', 'none')})" if result.get('recurring') != "none" else " (one-time)"
+                success_msg = f"⏰ Alarm set: {alarm_name} at {result['time']}{recurring_text}"
+                output.history.append({
+                    "role": "user",
+                    "content": f"alarm_success: {success_msg}"
+                })
+            else:
+                error_msg = f"❌ Failed to set alarm: {result['error']}"
+                print(error_msg)
+                output.history.append({
+                    "role": "user",
+                    "content": f"alarm_error: {error_msg}"
+                })
+            output.needs_followup = True
+
+        except Exception as e:
+            error_msg = f"❌ Error setting alarm: {e}"
+            print(error_msg)
+            output.history.append({
+                "role": "user",
+                "content": f"alarm_error: {error_msg}"
             })
-            Send_telegram_message(fallback_message)
+            output.needs_followup = True
+
+    def tool_remove_alarm(self, alarm_identifier, output):
+        """<ra> - remove an alarm by name or id"""
+        alarm_identifier = alarm_identifier.strip()
+        print(f"🗑️ Eva is using REMOVE ALARM tool: {alarm_identifier}")
+        try:
+            result = self.alarm_system.remove_alarm(alarm_identifier)
+            if result["success"]:
+                print(f"🗑️ Alarm removed: {result['removed_alarm']}")
+            else:
+                print(f"❌ Failed to remove alarm: {result['error']}")
+        except Exception as e:
+            print(f"❌ Error removing alarm: {e}")
+
+    def tool_alarm_list(self, _, output):
+        """<alarm_list> - get all active alarms"""
+        print("📋 Eva is using LIST ALARMS tool")
+        try:
+            result = self.alarm_system.list_alarms()
+            if result["success"]:
+                if result["alarms"]:
+                    print(f"📋 {len(result['alarms'])} active alarms found")
+                    output.history.append({
+                        "role": "user",
+                        "content": f"Current alarms: {result['alarms']}"
+                    })
+                else:
+                    print("📋 No active alarms")
+            output.needs_followup = True
+        except Exception as e:
+            print(f"❌ Error listing alarms: {e}")
 
     def process_telegram_message(self, telegram_message):
+        """Blocking wrapper around process_telegram_message_async for synchronous callers"""
+        return async_runtime.run(self.process_telegram_message_async(telegram_message))
+
+    async def process_telegram_message_async(self, telegram_message):
         """Process Telegram message notification"""
         try:
             # Get relevant memories
-            relevant_memories = get_relevant_memory(telegram_message, n=5)
+            relevant_memories = await asyncio.to_thread(get_relevant_memory, telegram_message, 5)
             
             # Create enhanced system prompt with memories
             original_system_prompt = self.session_history[0]["content"]
@@ -2882,24 +5715,29 @@ class ChatApp:
             
             # Create temporary session with enhanced prompt
             temp_session = [{"role": "system", "content": enhanced_system_prompt}]
-            temp_session.extend(self.session_history[1:])
+            temp_session.extend(self.summarizer.view())
             
-            # Get AI response
-            ai_response = self.query_mistral(temp_session)
+            # Get AI response, streaming any <t> text to the web interface and starting tools early
+            tool_run = self.start_tool_run()
+            reply_id, on_text = self.web_stream()
+            ai_response = await self.query_mistral_async(temp_session, on_text=on_text, on_chunk=tool_run.feed)
             self.session_history.append({"role": "assistant", "content": ai_response})
             
             # Parse response and handle any follow-up
-            talk_lines, needs_followup = self.parse_ai_response(ai_response, enhanced_system_prompt)
+            talk_lines, needs_followup = await self.parse_ai_response_async(ai_response, enhanced_system_prompt, tool_run)
             
             # Handle follow-up if needed
             if needs_followup:
+                self.finish_web_reply(reply_id, talk_lines)
                 temp_followup = [{"role": "system", "content": enhanced_system_prompt}]
-                temp_followup.extend(self.session_history[1:])
+                temp_followup.extend(self.summarizer.view())
                 
-                followup_response = self.query_mistral(temp_followup)
+                followup_run = self.start_tool_run()
+                reply_id, on_text = self.web_stream()
+                followup_response = await self.query_mistral_async(temp_followup, on_text=on_text, on_chunk=followup_run.feed)
                 self.session_history.append({"role": "assistant", "content": followup_response})
                 
-                followup_talk_lines, _ = self.parse_ai_response(followup_response, enhanced_system_prompt)
+                followup_talk_lines, _ = await self.parse_ai_response_async(followup_response, enhanced_system_prompt, followup_run)
                 talk_lines = followup_talk_lines
             
             # For Telegram messages, only send to web interface (not back to Telegram)
@@ -2911,7 +5749,8 @@ class ChatApp:
                 self.socketio.emit('receive_message', {
                     'sender': 'Eva',
                     'message': response_text,
-                    'is_user': False
+                    'is_user': False,
+                    'reply_id': reply_id
                 })
                 
                 # DO NOT send back to Telegram - <tg> content was already handled
@@ -2919,13 +5758,21 @@ class ChatApp:
         except Exception as e:
             print(f"Error processing Telegram message: {e}")
             error_msg = "Sorry, I'm having issues processing your message."
-            Send_telegram_message(error_msg)
+            await send_telegram_message_async(error_msg)
+        finally:
+            # Closes any streamed bubble on the web interface
+            self.socketio.emit('typing_stop')
+            self.summarizer.maybe_schedule()
     
     def process_alarm_notification(self, alarm_message):
+        """Blocking wrapper around process_alarm_notification_async for synchronous callers"""
+        return async_runtime.run(self.process_alarm_notification_async(alarm_message))
+
+    async def process_alarm_notification_async(self, alarm_message):
         """Process alarm notification (add this to ChatApp class)"""
         try:
             # Get relevant memories
-            relevant_memories = get_relevant_memory(alarm_message, n=3)
+            relevant_memories = await asyncio.to_thread(get_relevant_memory, alarm_message, 3)
             
             # Create enhanced system prompt with memories
             original_system_prompt = self.session_history[0]["content"]
@@ -2937,14 +5784,14 @@ class ChatApp:
             
             # Create temporary session with enhanced prompt
             temp_session = [{"role": "system", "content": enhanced_system_prompt}]
-            temp_session.extend(self.session_history[1:])
+            temp_session.extend(self.summarizer.view())
             
             # Get AI response
-            ai_response = self.query_mistral(temp_session)
+            ai_response = await self.query_mistral_async(temp_session, priority=LLM_PRIORITY_BACKGROUND)
             self.session_history.append({"role": "assistant", "content": ai_response})
             
             # Parse response
-            talk_lines, needs_followup = self.parse_ai_response(ai_response, enhanced_system_prompt)
+            talk_lines, needs_followup = await self.parse_ai_response_async(ai_response, enhanced_system_prompt)
             
 
             # Send response to web interface
@@ -2962,12 +5809,12 @@ class ChatApp:
             # Handle follow-up if needed
             if needs_followup:
                 temp_followup = [{"role": "system", "content": enhanced_system_prompt}]
-                temp_followup.extend(self.session_history[1:])
+                temp_followup.extend(self.summarizer.view())
                 
-                followup_response = self.query_mistral(temp_followup)
+                followup_response = await self.query_mistral_async(temp_followup, priority=LLM_PRIORITY_BACKGROUND)
                 self.session_history.append({"role": "assistant", "content": followup_response})
                 
-                followup_talk_lines, _ = self.parse_ai_response(followup_response, enhanced_system_prompt)
+                followup_talk_lines, _ = await self.parse_ai_response_async(followup_response, enhanced_system_prompt)
                 talk_lines = followup_talk_lines
 
 
@@ -2983,12 +5830,39 @@ class ChatApp:
                 'message': fallback_message,
                 'is_user': False
             })
-            Send_telegram_message(fallback_message)
+            await send_telegram_message_async(fallback_message)
+
+    def query_mistral(self, messages, on_text=None, on_chunk=None, priority=LLM_PRIORITY_INTERACTIVE):
+        """Blocking wrapper around query_mistral_async for synchronous callers"""
+        return async_runtime.run(self.query_mistral_async(messages, on_text, on_chunk, priority))
+
+    async def query_mistral_async(self, messages, on_text=None, on_chunk=None, priority=LLM_PRIORITY_INTERACTIVE):
+        """Query Mistral AI API with retry logic for rate limits.
+
+        When on_text or on_chunk is given the reply is streamed: on_text receives <t> text
+        as it arrives and on_chunk every raw delta (used to start tools early). The full
+        reply is still returned for tool parsing. Every attempt waits its turn in
+        llm_scheduler at the given priority. With EVA_RESPONSE_CACHE on, repeated questions
+        are answered from response_cache and replayed through the same callbacks.
+        """
+        cache_key = None
+        if self.response_cache is not None and priority == LLM_PRIORITY_INTERACTIVE:
+            cache_key = self.response_cache.key_for(messages)
+            cached_reply = self.response_cache.lookup(cache_key) if cache_key else None
+            if cached_reply is not None:
+                print(f"♻️ Answered from response cache: {cached_reply}")
+                if on_chunk:
+                    on_chunk(cached_reply)
+                if on_text:
+                    visible = TalkTagStream().feed(cached_reply)
+                    if visible:
+                        on_text(visible)
+                return cached_reply
 
-    def query_mistral(self, messages):
-        """Query Mistral AI API with retry logic for rate limits."""
         max_retries = 5
         retries = 0
+        started = time.monotonic()
+        ticket = llm_scheduler.ticket(priority)  # Retries keep the place of the first attempt
         while retries < max_retries:
             try:
                 current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -2998,10 +5872,11 @@ class ChatApp:
                     "role": "system",
                     "content": f"The current date and time is {current_time}."
                 }
-                messages_with_time = [time_message] + messages
-
+                messages_with_time, context_report = self.context_window.fit([time_message] + messages)
+                print(f"🧮 Context: {context_report['tokens']} tokens in {context_report['messages']} messages "
+                      f"(budget {context_report['budget']}, was {context_report['original_tokens']}, "
+                      f"{context_report['collapsed']} collapsed, {context_report['dropped']} dropped)")
 
-                
                 # Show only the latest user input
                 last_user_message = ""
                 for m in reversed(messages):
@@ -3021,31 +5896,52 @@ class ChatApp:
                     "model": MODEL,
                     "messages": messages_with_time
                 }
-                response = requests.post(MISTRAL_ENDPOINT, headers=headers, json=payload)
-                response.raise_for_status()
-                data = response.json()
-
-
-                
+                waited = await llm_scheduler.acquire_async(MODEL, priority, ticket)
+                if waited > 0.5:
+                    print(f"⏳ Waited {waited:.1f}s for a Mistral request slot")
+                if on_text or on_chunk:
+                    payload["stream"] = True
+                    talk_stream = TalkTagStream()
+                    parts = []
+                    async for delta in http_client.stream_chat(MISTRAL_ENDPOINT, headers=headers, json=payload):
+                        parts.append(delta)
+                        if on_chunk:
+                            on_chunk(delta)
+                        visible = talk_stream.feed(delta) if on_text else ""
+                        if visible:
+                            on_text(visible)
+                    assistant_reply = "".join(parts)
+                else:
+                    response = await http_client.post(MISTRAL_ENDPOINT, headers=headers, json=payload)
+                    response.raise_for_status()
+                    data = response.json()
 
-                # Extract assistant reply
-                assistant_reply = data["choices"][0]["message"]["content"]
+                    # Extract assistant reply
+                    assistant_reply = data["choices"][0]["message"]["content"]
                 # Display raw AI response
                 print(f"\n{'-'*60}")
                 print(f"🤖 RAW AI RESPONSE: {assistant_reply}")
                 print(f"{'-'*60}\n")
 
+                if cache_key:
+                    self.response_cache.store(cache_key, assistant_reply, time.monotonic() - started)
                 return assistant_reply
-            except requests.exceptions.HTTPError as e:
+            except httpx.HTTPStatusError as e:
                 if e.response.status_code == 429:
                     retries += 1
-                    sleep_time = 2 ** retries  # Exponential back-off
-                    print(f"⚠️  Mistral API rate limit hit. Retrying in {sleep_time} seconds... (Attempt {retries}/{max_retries})")
-                    time.sleep(sleep_time)
+                    # Honour Retry-After when given; the pause applies to every caller of this model
+                    sleep_time = parse_retry_after(e.response.headers.get("Retry-After"))
+                    if sleep_time is None:
+                        sleep_time = backoff_delay(retries)
+                    print(f"⚠️  Mistral API rate limit hit. Retrying in {sleep_time:.1f} seconds... (Attempt {retries}/{max_retries})")
+                    llm_scheduler.penalize(MODEL, sleep_time)
                     continue  
                 else:
                     print(f"❌ Mistral API HTTP error: {e}")
                     return f"<t>❌Sorry, I couldn't reach the AI service due to Mistral API HTTP error: {e}</t>"
+            except httpx.TimeoutException as e:
+                print(f"❌ Mistral API timed out: {e}")
+                return f"<t>❌ The AI service took too long to respond. Please try again.</t>"
             except Exception as e:
                 print(f"❌ Mistral API error: {e}")
                 return f"<t>❌ Mistral API error: {e}</t>"
@@ -3084,8 +5980,8 @@ class ChatApp:
                             "content": f"New arrival email: {email_update}"
                         })
                         
-                        # Process the email notification
-                        threading.Thread(target=self.process_email_notification, args=(email_update,), daemon=True).start()
+                        # Process the email notification on the shared event loop
+                        async_runtime.submit(self.process_email_notification_async(email_update))
                     
                     time.sleep(15)  # Check every 15 seconds
                 except Exception as e:
@@ -3095,16 +5991,20 @@ class ChatApp:
         threading.Thread(target=email_monitor, daemon=True).start()
     
     def process_email_notification(self, email_update):
+        """Blocking wrapper around process_email_notification_async for synchronous callers"""
+        return async_runtime.run(self.process_email_notification_async(email_update))
+
+    async def process_email_notification_async(self, email_update):
         """Process new email notification"""
         try:
             # Get AI response for email notification
-            temp_session = self.session_history.copy()
-            ai_response = self.query_mistral(temp_session)
+            temp_session = [self.session_history[0]] + self.summarizer.view()
+            ai_response = await self.query_mistral_async(temp_session, priority=LLM_PRIORITY_BACKGROUND)
             
             self.session_history.append({"role": "assistant", "content": ai_response})
             
             # Parse response
-            talk_lines, _ = self.parse_ai_response(ai_response)
+            talk_lines, _ = await self.parse_ai_response_async(ai_response)
             
             if talk_lines:
                 response_text = "\n\n".join(talk_lines)
@@ -3122,6 +6022,12 @@ def run_flask():
     chatbot_instance.socketio.run(chatbot_instance.app, port=5000, debug=False)
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Needed for memory shard workers in the packaged build
+    
+    # Offline maintenance: fold near-duplicate memories and exit
+    if "--compact-memories" in sys.argv:
+        json_memory.compact_duplicates()
+        sys.exit(0)
     
     run_gui_setup()
     Config_get_data()
@@ -3164,3 +6070,6 @@ if __name__ == '__main__':
     )
 
     webview.start()
+    # The window is closed; the daemon threads die with the process
+    if chatbot_instance is not None:
+        chatbot_instance.shutdown()
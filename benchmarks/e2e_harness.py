@@ -0,0 +1,273 @@
+"""
+End-to-end latency harness for Eva's chat pipeline, fully offline.
+
+Starts benchmarks/mock_mistral.py in-process, points EVA_MISTRAL_ENDPOINT at it and
+drives ChatApp.process_message through a script of user turns (small talk, memory,
+search, tasks, calendar, alarms). Brave search and the Google Tasks/Calendar fetches
+are replaced with stubs that sleep for a configurable latency (the local tasks and
+calendar mirrors sync from them); everything else - memory retrieval, context fitting,
+the scheduler, streaming, tool parsing, follow-up turns - is the real code. Runs in a temporary directory, so no config, memory or alarm file of
+a real install is touched.
+
+Per turn it records:
+
+  - memory_ms       get_relevant_memory
+  - first_chunk_ms  first streamed delta of the first Mistral call
+  - first_text_ms   first <t> text pushed to the browser, from the start of the turn
+  - llm_ms          all Mistral calls of the turn (first reply and follow-up)
+  - tools_ms        tool parsing and execution after the replies
+  - other_ms        the rest (history, summaries, emits)
+  - turn_ms         the whole process_message call
+
+and reports p50/p95/mean per stage as JSON so runs can be compared over time.
+
+Usage:
+    python benchmarks/e2e_harness.py [--turns 40] [--first-token lognormal:-1.2,0.4]
+                                     [--chunk-delay fixed:0.01] [--tool-latency uniform:0.05,0.2]
+                                     [--error-rate 0.05] [--output results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_mistral import MockMistralServer, parse_latency
+
+USER_TURNS = [
+    "hey Eva, how are you today?",
+    "remember that I love jazz records",
+    "search for the latest robotics news",
+    "what tasks do I have left?",
+    "what's on my calendar this week?",
+    "do I have any alarms set?",
+    "thanks, that's all for now",
+]
+STAGES = ["memory_ms", "first_chunk_ms", "first_text_ms", "llm_ms", "tools_ms", "other_ms", "turn_ms"]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else None
+
+
+def summarize(values):
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 0.50), 2),
+        "p95": round(percentile(values, 0.95), 2),
+        "mean": round(statistics.mean(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def write_config():
+    """Config for Config_get_data in the working directory; the keys are never sent anywhere real"""
+    os.makedirs("static", exist_ok=True)
+    with open(os.path.join("static", "config.json"), "w") as f:
+        json.dump({
+            "MISTRAL API KEY": "mock-key",
+            "BRAVE API KEY": "mock-key",
+            "User name": "Benchmark",
+            "Selected Model": "mistral-medium-latest",
+            "Extra details (optional)": "",
+        }, f, indent=4)
+
+
+def install_stubs(app, tool_latency, rng):
+    """Replace the calls that would leave the machine with sleeps of tool_latency"""
+
+    def delay():
+        time.sleep(tool_latency(rng))
+
+    async def search_web_async(query, limit=3):
+        await asyncio.sleep(tool_latency(rng))
+        return [f"Result {i + 1} for {query}: https://example.com/{i}" for i in range(limit)]
+
+    def tasklists_fetch():
+        delay()
+        return [{"id": f"list-{i}", "title": title} for i, title in enumerate(["My Tasks", "Work", "Shopping"])]
+
+    def tasklist_get_default():
+        delay()
+        return {"id": "list-0", "title": "My Tasks"}
+
+    def tasks_get_many(tasklist_ids, **params):
+        delay()  # One batch request for every list
+        due = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%dT00:00:00.000Z")
+        return {tasklist_id: [{"id": f"{tasklist_id}-{i}", "title": f"Task {i} in {tasklist_id}",
+                               "status": "completed" if i % 3 == 0 else "needsAction", "due": due,
+                               "position": f"{i:020d}"} for i in range(5)]
+                for tasklist_id in tasklist_ids}
+
+    def calendar_fetch_events(sync_token=None, time_min=None):
+        delay()
+        if sync_token:
+            return [], sync_token, "Africa/Cairo"
+        start = datetime.now(timezone.utc)
+        events = [{"id": f"event-{i}", "summary": f"Event {i}",
+                   "start": {"dateTime": (start + timedelta(hours=6 * i)).isoformat()},
+                   "end": {"dateTime": (start + timedelta(hours=6 * i + 1)).isoformat()}} for i in range(20)]
+        return events, "sync-token", "Africa/Cairo"
+
+    app.search_web_async = search_web_async
+    app.tasklists_fetch = tasklists_fetch
+    app.tasklist_get_default = tasklist_get_default
+    app.tasks_get_many = tasks_get_many
+    app.calendar_fetch_events = calendar_fetch_events
+
+
+def instrument(app, chat, turn):
+    """Wrap the pipeline stages so every call records into the current turn"""
+    get_relevant_memory = app.get_relevant_memory
+    query_mistral_async = chat.query_mistral_async
+    parse_ai_response_async = chat.parse_ai_response_async
+    stream_to_web = chat.stream_to_web
+
+    def timed_memory(query, n=3):
+        start = time.perf_counter()
+        try:
+            return get_relevant_memory(query, n)
+        finally:
+            turn["memory_ms"] = turn.get("memory_ms", 0) + (time.perf_counter() - start) * 1000
+
+    async def timed_query(messages, on_text=None, on_chunk=None, **kwargs):
+        start = time.perf_counter()
+        first_call = "first_chunk_ms" not in turn
+
+        def chunk(delta):
+            if first_call and "first_chunk_ms" not in turn:
+                turn["first_chunk_ms"] = (time.perf_counter() - start) * 1000
+            if on_chunk:
+                on_chunk(delta)
+
+        try:
+            return await query_mistral_async(messages, on_text=on_text, on_chunk=chunk if on_chunk else None, **kwargs)
+        finally:
+            turn["llm_ms"] = turn.get("llm_ms", 0) + (time.perf_counter() - start) * 1000
+            turn["llm_calls"] = turn.get("llm_calls", 0) + 1
+
+    async def timed_parse(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await parse_ai_response_async(*args, **kwargs)
+        finally:
+            turn["tools_ms"] = turn.get("tools_ms", 0) + (time.perf_counter() - start) * 1000
+
+    def timed_stream(text, reply_id):
+        if "first_text_ms" not in turn:
+            turn["first_text_ms"] = (time.perf_counter() - turn["started"]) * 1000
+        stream_to_web(text, reply_id)
+
+    app.get_relevant_memory = timed_memory
+    chat.query_mistral_async = timed_query
+    chat.parse_ai_response_async = timed_parse
+    chat.stream_to_web = timed_stream
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    mock = MockMistralServer(first_token=args.first_token, chunk_delay=args.chunk_delay,
+                             chunk_size=args.chunk_size, error_rate=args.error_rate,
+                             retry_after=args.retry_after, seed=args.seed).start()
+    os.environ["EVA_MISTRAL_ENDPOINT"] = mock.url
+    os.environ.setdefault("EVA_MISTRAL_RPS", "1000")  # Measure the pipeline, not the production rate limit
+    write_config()
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        import app
+        app.Config_get_data()
+        install_stubs(app, parse_latency(args.tool_latency), rng)
+        chat = app.ChatApp(monitor_email=False)
+
+    turn = {}
+    instrument(app, chat, turn)
+    turns = []
+    for i in range(args.turns):
+        message = USER_TURNS[i % len(USER_TURNS)]
+        turn.clear()
+        turn["started"] = time.perf_counter()
+        with quiet:
+            chat.process_message(message)
+        turn["turn_ms"] = (time.perf_counter() - turn["started"]) * 1000
+        turn["other_ms"] = max(turn["turn_ms"] - turn.get("memory_ms", 0) - turn.get("llm_ms", 0)
+                               - turn.get("tools_ms", 0), 0)
+        turns.append({"message": message, **{key: value for key, value in turn.items() if key != "started"}})
+
+    stages = {stage: summarize([t[stage] for t in turns if stage in t]) for stage in STAGES}
+    mock.stop()
+    return {
+        "stages": stages,
+        "turns": len(turns),
+        "llm_calls": sum(t.get("llm_calls", 0) for t in turns),
+        "mock": mock.stats(),
+        "http": app.http_client.stats(),
+        "scheduler": app.llm_scheduler.stats(),
+        "tools": chat.tool_executor.stats(),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Time Eva's chat pipeline end to end against a mock Mistral")
+    arg_parser.add_argument("--turns", type=int, default=28)
+    arg_parser.add_argument("--first-token", default="lognormal:-1.6,0.4", help="mock latency to the first chunk")
+    arg_parser.add_argument("--chunk-delay", default="uniform:0.005,0.015", help="mock latency between chunks")
+    arg_parser.add_argument("--chunk-size", type=int, default=12)
+    arg_parser.add_argument("--tool-latency", default="uniform:0.05,0.2", help="latency of the stubbed Brave/Google calls")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of Mistral calls answered with 429")
+    arg_parser.add_argument("--retry-after", type=int, default=1)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    arg_parser.add_argument("--verbose", action="store_true", help="show Eva's own console output")
+    arg_parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "e2e_harness.json"))
+    args = arg_parser.parse_args()
+    args.output = os.path.abspath(args.output)
+    sys.argv[0] = os.path.abspath(sys.argv[0])  # pywebview resolves its base path from argv[0] at import
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)  # app creates its memory, alarm and config files relative to here
+        result = run(args)
+        os.chdir(ROOT)
+
+    for stage, summary in result["stages"].items():
+        if summary:
+            print(f"{stage:>15}: p50 {summary['p50']:>8.1f}  p95 {summary['p95']:>8.1f}  mean {summary['mean']:>8.1f}")
+    print(f"{result['turns']} turns, {result['llm_calls']} Mistral calls, mock {result['mock']}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "verbose")},
+        **result,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark the memory scorers of JSONMemorySystem.
+
+Compares the heuristic scorer (keyword index + calculate_similarity) against the
+BM25 scorer on synthetic memory stores of 1k, 10k and 100k entries.
+
+Usage:
+    python benchmarks/memory_scoring_benchmark.py [--sizes 1000 10000 100000] [--queries 50]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import JSONMemorySystem  # noqa: E402
+
+SUBJECTS = ["User", "Their sister", "Their manager", "Their friend Omar", "Their dog", "The team"]
+VERBS = ["prefers", "likes", "dislikes", "is learning", "is planning", "often talks about", "works on"]
+OBJECTS = [
+    "green tea", "black coffee", "football", "robotics projects", "machine vision", "morning workouts",
+    "Python scripts", "the humanoid robot", "quarterly reports", "piano lessons", "hiking trips",
+    "Italian food", "early meetings", "sci-fi movies", "industrial inspection", "embedded systems",
+    "weekend trips to Alexandria", "reading before bed", "learning German", "the electric bike",
+]
+CONTEXTS = ["on weekends", "after work", "since 2023", "every morning", "when stressed", "with family", ""]
+
+
+def make_memory(memory_id, rng):
+    """Build one memory in the same shape save_memory writes"""
+    content = " ".join(filter(None, [
+        rng.choice(SUBJECTS), rng.choice(VERBS), rng.choice(OBJECTS), rng.choice(CONTEXTS)
+    ])) + f" (note {memory_id})"
+    return {
+        "id": memory_id,
+        "role": datetime.now().strftime("%A, %B %d %Y | %I:%M %p"),
+        "content": content,
+        "timestamp": datetime.now().isoformat(),
+        "keywords": [],
+    }
+
+
+def build_store(directory, size, scorer, rng):
+    """Write a synthetic snapshot and load it with the given scorer"""
+    memory_file = os.path.join(directory, f"memory_{size}.json")
+    if not os.path.exists(memory_file):
+        helper = JSONMemorySystem(os.path.join(directory, "keywords_helper.json"))
+        memories = []
+        for i in range(size):
+            memory = make_memory(i, rng)
+            memory["keywords"] = helper.extract_keywords(memory["content"])
+            memories.append(memory)
+        with open(memory_file, "w", encoding="utf-8") as f:
+            json.dump(memories, f)
+
+    start = time.perf_counter()
+    store = JSONMemorySystem(memory_file, scorer=scorer, hot_capacity=None)
+    return store, time.perf_counter() - start
+
+
+def run(sizes, query_count, seed):
+    rng = random.Random(seed)
+    queries = [f"does {rng.choice(SUBJECTS).lower()} like {rng.choice(OBJECTS)}?" for _ in range(query_count)]
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            for scorer in ("heuristic", "bm25"):
+                store, load_time = build_store(directory, size, scorer, random.Random(seed))
+                timings = []
+                for query in queries:
+                    start = time.perf_counter()
+                    store.get_relevant_memory(query, n=5)
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                result = {
+                    "size": size,
+                    "scorer": scorer,
+                    "load_s": round(load_time, 3),
+                    "p50_ms": round(statistics.median(timings), 3),
+                    "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+                    "mean_ms": round(statistics.mean(timings), 3),
+                }
+                results.append(result)
+                print(f"{size:>8} {scorer:>10}  load {result['load_s']:>7.3f}s  "
+                      f"p50 {result['p50_ms']:>9.3f}ms  p99 {result['p99_ms']:>9.3f}ms")
+    return results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark Eva's memory scorers")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    arg_parser.add_argument("--queries", type=int, default=50)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    args = arg_parser.parse_args()
+    run(args.sizes, args.queries, args.seed)
@@ -0,0 +1,198 @@
+"""
+Memory subsystem benchmark and recall suite.
+
+For each corpus size, builds a synthetic memory store in the same record shape that
+save_memory writes (with labeled "needle" facts mixed in), then measures:
+
+  - load time of JSONMemorySystem
+  - save_memory latency (p50/p99) on top of the loaded store
+  - get_relevant_memory latency (p50/p99)
+  - recall@k of the needle facts for their labeled queries
+  - peak RSS of the process
+
+Every size runs in its own subprocess so peak RSS is per size. Results are written as
+JSON so runs can be compared over time.
+
+Usage:
+    python benchmarks/memory_suite.py [--sizes 1000 10000 100000 1000000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SYLLABLES = ["ka", "zo", "ri", "vel", "mun", "tar", "qui", "sen", "bo", "lex", "dra", "fen"]
+RELATIONS = ["friend", "cousin", "coworker", "neighbor", "mentor", "dentist"]
+FACTS = [
+    ("loves {item}", "what does {name} love?"),
+    ("lives near {item}", "where does {name} live?"),
+    ("works at {item}", "where does {name} work?"),
+    ("is allergic to {item}", "what is {name} allergic to?"),
+]
+ITEMS = ["the old harbor", "Nile Bakery", "peanuts", "jazz records", "Zamalek", "the robotics lab", "cats", "opera"]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+        except (ImportError, AttributeError):
+            return None
+
+
+def make_needles(count, rng):
+    """Unique facts with a labeled query each"""
+    needles = []
+    names = set()
+    while len(needles) < count:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()
+        if name in names:
+            continue
+        names.add(name)
+        fact, query = rng.choice(FACTS)
+        content = f"User's {rng.choice(RELATIONS)} {name} {fact.format(item=rng.choice(ITEMS))}"
+        needles.append({"content": content, "query": query.format(name=name)})
+    return needles
+
+
+def build_corpus(memory_file, size, needles, rng):
+    """Write a snapshot of `size` memories with the needles spread through it"""
+    from app import JSONMemorySystem
+    from memory_scoring_benchmark import make_memory
+
+    helper = JSONMemorySystem(os.path.join(os.path.dirname(memory_file), "keywords_helper.json"))
+    needle_positions = dict(zip(rng.sample(range(size), len(needles)), needles))
+    memories = []
+    for i in range(size):
+        memory = make_memory(i, rng)
+        if i in needle_positions:
+            memory["content"] = needle_positions[i]["content"]
+        memory["keywords"] = helper.extract_keywords(memory["content"])
+        memories.append(memory)
+    with open(memory_file, "w", encoding="utf-8") as f:
+        json.dump(memories, f, ensure_ascii=False)
+
+
+def run_size(size, args):
+    """Measure one corpus size (runs inside its own process)"""
+    from app import JSONMemorySystem
+
+    rng = random.Random(args.seed + size)
+    needles = make_needles(min(args.queries, size), rng)
+    options = {"scorer": args.scorer}
+    if args.hot_capacity is not None:
+        options["hot_capacity"] = args.hot_capacity or None
+
+    with tempfile.TemporaryDirectory() as directory:
+        memory_file = os.path.join(directory, "eva_memory.json")
+        build_corpus(memory_file, size, needles, rng)
+
+        start = time.perf_counter()
+        store = JSONMemorySystem(memory_file, **options)
+        load_s = time.perf_counter() - start
+        store.result_cache_size = 0  # Measure scoring, not the result cache
+
+        retrieval_ms, hits = [], 0
+        for needle in needles:
+            start = time.perf_counter()
+            results = store.get_relevant_memory(needle["query"], n=args.k)
+            retrieval_ms.append((time.perf_counter() - start) * 1000)
+            hits += any(needle["content"] in result for result in results)
+
+        save_ms = []
+        for i in range(args.saves):
+            content = " ".join(rng.choice(SYLLABLES) * 2 for _ in range(6)) + f" save sample {i}"
+            start = time.perf_counter()
+            store.save_memory("benchmark", content)
+            save_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "size": size,
+        "load_s": round(load_s, 3),
+        "save_p50_ms": round(percentile(save_ms, 0.50), 3),
+        "save_p99_ms": round(percentile(save_ms, 0.99), 3),
+        "retrieval_p50_ms": round(percentile(retrieval_ms, 0.50), 3),
+        "retrieval_p99_ms": round(percentile(retrieval_ms, 0.99), 3),
+        "retrieval_mean_ms": round(statistics.mean(retrieval_ms), 3),
+        f"recall@{args.k}": round(hits / len(needles), 4),
+        "hot_memories": len(store.memories),
+        "cold_memories": store.cold_archive.count,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark Eva's memory subsystem")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    arg_parser.add_argument("--queries", type=int, default=50, help="labeled needle queries per size")
+    arg_parser.add_argument("--saves", type=int, default=100, help="save_memory calls timed per size")
+    arg_parser.add_argument("--k", type=int, default=5)
+    arg_parser.add_argument("--scorer", default="heuristic", choices=["heuristic", "bm25"])
+    arg_parser.add_argument("--hot-capacity", type=int, default=None, help="0 = unbounded, default = app default")
+    arg_parser.add_argument("--seed", type=int, default=7)
+    arg_parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "memory_suite.json"))
+    arg_parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.single is not None:
+        print(json.dumps(run_size(args.single, args)))
+        return
+
+    results = []
+    for size in args.sizes:
+        command = [sys.executable, os.path.abspath(__file__), "--single", str(size)]
+        for option in ("queries", "saves", "k", "scorer", "seed"):
+            command += [f"--{option}", str(getattr(args, option))]
+        if args.hot_capacity is not None:
+            command += ["--hot-capacity", str(args.hot_capacity)]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{size:>8}  load {result['load_s']:>8.3f}s  save p50 {result['save_p50_ms']:>8.3f}ms  "
+              f"retrieval p50 {result['retrieval_p50_ms']:>9.3f}ms p99 {result['retrieval_p99_ms']:>9.3f}ms  "
+              f"recall@{args.k} {result[f'recall@{args.k}']:.2f}  rss {result['peak_rss_mb']}MB")
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"scorer": args.scorer, "hot_capacity": args.hot_capacity, "k": args.k, "seed": args.seed},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for top_similar_memories.
+
+Compares the old approach (full calculate_similarity on every candidate, then sort)
+with the bounded-heap top-k that prunes with real_quick_ratio()/quick_ratio(), and
+checks that both return the same ranking.
+
+Usage:
+    python benchmarks/memory_topk_benchmark.py [--size 20000] [--queries 30] [--n 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import JSONMemorySystem, top_similar_memories  # noqa: E402
+from memory_scoring_benchmark import OBJECTS, SUBJECTS, make_memory  # noqa: E402
+
+
+def full_sort(store, query, query_keywords, candidates, n, min_similarity):
+    """The previous get_relevant_memory scoring: score everything, sort, slice"""
+    scored = []
+    for memory in candidates:
+        similarity = store.calculate_similarity(query, memory['content'], memory.get('keywords', []), query_keywords)
+        if similarity >= min_similarity:
+            scored.append((similarity, memory))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored[:n]
+
+
+def run(size, query_count, n, seed):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        store = JSONMemorySystem(os.path.join(directory, "memory.json"))
+        memories = []
+        for i in range(size):
+            memory = make_memory(i, rng)
+            memory["keywords"] = store.extract_keywords(memory["content"])
+            memories.append(memory)
+
+    queries = [f"does {rng.choice(SUBJECTS).lower()} like {rng.choice(OBJECTS)}?" for _ in range(query_count)]
+    timings = {"full_sort": 0.0, "top_k": 0.0}
+    for query in queries:
+        query_keywords = store.extract_keywords(query)
+
+        start = time.perf_counter()
+        expected = full_sort(store, query, query_keywords, memories, n, 0.1)
+        timings["full_sort"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = top_similar_memories(query, query_keywords, memories, n, 0.1)
+        timings["top_k"] += time.perf_counter() - start
+
+        if [(s, m["id"]) for s, m in expected] != [(s, m["id"]) for s, m in actual]:
+            raise AssertionError(f"Rankings differ for query {query!r}")
+
+    for name, total in timings.items():
+        print(f"{name:>10}: {total / query_count * 1000:9.2f} ms/query")
+    print(f"   speedup: {timings['full_sort'] / timings['top_k']:.2f}x (rankings identical)")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark bounded-heap memory top-k")
+    arg_parser.add_argument("--size", type=int, default=20000)
+    arg_parser.add_argument("--queries", type=int, default=30)
+    arg_parser.add_argument("--n", type=int, default=5)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    args = arg_parser.parse_args()
+    run(args.size, args.queries, args.n, args.seed)
@@ -0,0 +1,268 @@
+"""
+Local mock of Mistral's /v1/chat/completions endpoint.
+
+Answers with scripted replies in Eva's tag format, so the whole chat pipeline (tool
+parsing, follow-up turns, streaming to the browser) can run offline and repeatably.
+The reply is picked from the last user message: a keyword script chooses the tools
+to call, and a message carrying tool output ("System outputs: ...") gets a plain
+follow-up answer, just like the real model does.
+
+Supports:
+  - streaming (SSE, "stream": true) and plain JSON replies
+  - latency distributions for the first token and for every later chunk
+  - 429 injection with a Retry-After header
+
+Latency specs are "fixed:S", "uniform:LOW,HIGH", "normal:MEAN,STDDEV" or
+"lognormal:MU,SIGMA", all in seconds.
+
+Point Eva at it with EVA_MISTRAL_ENDPOINT=http://127.0.0.1:<port>/v1/chat/completions.
+
+Usage:
+    python benchmarks/mock_mistral.py [--port 8765] [--first-token lognormal:-1.2,0.4]
+                                      [--chunk-delay uniform:0.005,0.02] [--error-rate 0.1]
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# (pattern on the user's message, reply) - first match wins. Only tools that work
+# offline against the harness stubs are used; writes would reach real services.
+DEFAULT_SCRIPT = [
+    (r"\b(search|look up|news|weather)\b",
+     "<t>Let me check that for you.</t>\n<s>{query}</s>"),
+    (r"\b(task|todo|to-do)s?\b",
+     "<t>Pulling up your task lists.</t>\n<task_update>"),
+    (r"\b(calendar|schedule|meeting|event)s?\b",
+     "<t>Here is what is coming up.</t>\n<calendar_update>"),
+    (r"\balarms?\b",
+     "<t>Checking your alarms.</t>\n<alarm_list>"),
+    (r"\b(remember|my name is|i like|i love)\b",
+     "<t>Got it, I'll remember that.</t>\n<m>User said: {query}</m>"),
+]
+DEFAULT_REPLY = "<t>Sure! {query} sounds good to me. Anything else I can help with?</t>"
+FOLLOWUP_REPLY = "<t>Here is what I found: everything looks on track for today.</t>"
+# Prefixes of the user-role messages Eva adds with tool results
+TOOL_RESULT_PREFIXES = ("System outputs:", "search_result:", "Current tasks", "calendar events:")
+
+
+def parse_latency(spec):
+    """Turn a latency spec into a sampler returning seconds (never negative)"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda rng: max(values[0], 0.0)
+    if kind == "uniform":
+        return lambda rng: max(rng.uniform(values[0], values[1]), 0.0)
+    if kind == "normal":
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0)
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class MockMistralServer:
+    """Threaded HTTP server speaking the chat-completions protocol with scripted replies"""
+
+    def __init__(self, host="127.0.0.1", port=0, first_token="fixed:0.2", chunk_delay="fixed:0.01",
+                 chunk_size=12, error_rate=0.0, retry_after=1, script=None, seed=None):
+        self.first_token = parse_latency(first_token)
+        self.chunk_delay = parse_latency(chunk_delay)
+        self.chunk_size = chunk_size
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.script = [(re.compile(pattern, re.IGNORECASE), reply) for pattern, reply in (script or DEFAULT_SCRIPT)]
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "streamed": 0, "rate_limited": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-mistral", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def sample(self, sampler):
+        with self.lock:
+            return sampler(self.rng)
+
+    def should_rate_limit(self):
+        with self.lock:
+            self.counts["requests"] += 1
+            limited = self.error_rate > 0 and self.rng.random() < self.error_rate
+            if limited:
+                self.counts["rate_limited"] += 1
+            return limited
+
+    def reply_for(self, messages):
+        """Scripted reply for the conversation, based on its last user message"""
+        last = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        if last.startswith(TOOL_RESULT_PREFIXES):
+            return FOLLOWUP_REPLY
+        query = last.split("user_says:", 1)[-1].strip() or "that"
+        for pattern, reply in self.script:
+            if pattern.search(query):
+                return reply.format(query=query)
+        return DEFAULT_REPLY.format(query=query)
+
+    def chunks(self, reply):
+        return [reply[i:i + self.chunk_size] for i in range(0, len(reply), self.chunk_size)] or [""]
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_json(404, {"message": "Not found"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self.send_json(400, {"message": "Invalid JSON body"})
+                    return
+
+                if mock.should_rate_limit():
+                    self.send_json(429, {"message": "Requests rate limit exceeded"},
+                                   {"Retry-After": str(mock.retry_after)})
+                    return
+
+                model = payload.get("model") or "mock"
+                reply = mock.reply_for(payload.get("messages") or [])
+                completion_id = uuid.uuid4().hex
+                created = int(time.time())
+                time.sleep(mock.sample(mock.first_token))
+
+                if payload.get("stream"):
+                    with mock.lock:
+                        mock.counts["streamed"] += 1
+                    self.stream(reply, model, completion_id, created)
+                    return
+
+                # Unstreamed replies still take as long as generating every chunk
+                chunks = mock.chunks(reply)
+                time.sleep(sum(mock.sample(mock.chunk_delay) for _ in chunks[1:]))
+                self.send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                                 "finish_reason": "stop"}],
+                    "usage": usage(payload.get("messages") or [], reply),
+                })
+
+            def stream(self, reply, model, completion_id, created):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, piece in enumerate(mock.chunks(reply)):
+                    if i:
+                        time.sleep(mock.sample(mock.chunk_delay))
+                    self.write_event({
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                    })
+                self.write_event({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": ""}, "finish_reason": "stop"}],
+                })
+                self.write_chunk(b"data: [DONE]\n\n")
+                self.write_chunk(b"")
+
+            def write_event(self, event):
+                self.write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+
+            def write_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def usage(messages, reply):
+    """Rough token counts (4 characters per token) for the usage block"""
+    prompt = sum(len(m.get("content") or "") for m in messages)
+    prompt_tokens, completion_tokens = math.ceil(prompt / 4), math.ceil(len(reply) / 4)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Serve a scripted mock of Mistral's chat completions API")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--first-token", default="fixed:0.2", help="latency before the first chunk")
+    arg_parser.add_argument("--chunk-delay", default="fixed:0.01", help="latency between chunks")
+    arg_parser.add_argument("--chunk-size", type=int, default=12, help="characters per streamed chunk")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    arg_parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    arg_parser.add_argument("--seed", type=int, default=None)
+    args = arg_parser.parse_args()
+
+    server = MockMistralServer(args.host, args.port, args.first_token, args.chunk_delay, args.chunk_size,
+                               args.error_rate, args.retry_after, seed=args.seed)
+    print(f"Mock Mistral listening on {server.url}")
+    print(f"Run Eva with EVA_MISTRAL_ENDPOINT={server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+        print(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Near-duplicate handling in JSONMemorySystem.save_memory"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import JSONMemorySystem, MinHashDeduplicator
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JSONMemorySystem(str(tmp_path / "eva_memory.json"), shard_threshold=0)
+
+
+@pytest.mark.parametrize("old, new", [
+    ("User is 25 years old", "User is 26 years old"),
+    ("User has a dog", "User has no dog"),
+    ("The meeting is on May 5", "The meeting is on May 9"),
+    ("User likes coffee", "User doesn't like coffee"),
+])
+def test_changed_number_or_negation_is_not_a_duplicate(store, old, new):
+    first = store.save_memory("user", old)
+    second = store.save_memory("user", new)
+    assert second["id"] != first["id"]
+    assert "supersedes" not in second
+    assert [m["content"] for m in store.memories] == [old, new]
+
+
+def test_restated_fact_replaces_the_older_memory(store):
+    first = store.save_memory("user", "User's favourite colour is dark green")
+    second = store.save_memory("user", "User's favourite colour is dark green!")
+    assert second["supersedes"] == first["id"]
+    assert [m["id"] for m in store.memories] == [second["id"]]
+    assert first["id"] not in store.memories_by_id
+
+
+def test_replacement_survives_a_restart(tmp_path):
+    path = str(tmp_path / "eva_memory.json")
+    store = JSONMemorySystem(path, shard_threshold=0)
+    store.save_memory("user", "User lives in Zamalek near the river")
+    store.save_memory("user", "User lives in Zamalek, near the river")
+    reloaded = JSONMemorySystem(path, shard_threshold=0)
+    assert [m["content"] for m in reloaded.memories] == ["User lives in Zamalek, near the river"]
+
+
+def test_shingles_keep_short_words_and_digits():
+    dedup = MinHashDeduplicator()
+    assert dedup.similarity("User is 25 years old", "User is 26 years old") < 1.0
+    assert dedup.conflicts("User has a dog", "User has no dog")
+    assert not dedup.conflicts("User has a dog", "the user has a dog")
@@ -0,0 +1,52 @@
+"""Scoring on the MemoryShardPool matches the in-process scorer"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import JSONMemorySystem
+
+TOPICS = ["coffee", "jazz", "running", "python", "garden", "travel", "cooking", "chess"]
+QUERIES = ["what coffee does the user like", "user jazz records", "python project deadline",
+           "garden tomatoes", "chess opening"]
+
+
+def fill(store, count=300, seed=3):
+    rng = random.Random(seed)
+    with store.batch():
+        for i in range(count):
+            topic, other = rng.sample(TOPICS, 2)
+            store.save_memory("user", f"Note {i}: user talked about {topic} and {other} on day {i % 31}")
+
+
+@pytest.fixture
+def stores(tmp_path):
+    single = JSONMemorySystem(str(tmp_path / "single.json"), dedup_threshold=None)
+    sharded = JSONMemorySystem(str(tmp_path / "sharded.json"), dedup_threshold=None,
+                               shard_threshold=100, shard_workers=2)
+    fill(single)
+    fill(sharded)
+    yield single, sharded
+    if sharded.shard_pool:
+        sharded.shard_pool.close()
+
+
+def test_sharded_rankings_match_in_process(stores):
+    single, sharded = stores
+    assert not single.should_shard()
+    for query in QUERIES:
+        assert sharded.get_relevant_memory(query, 5) == single.get_relevant_memory(query, 5)
+    assert sharded.shard_pool is not None
+
+
+def test_new_memories_reach_the_shards(stores):
+    single, sharded = stores
+    sharded.get_relevant_memory(QUERIES[0], 5)  # Starts the pool
+    for store in stores:
+        store.save_memory("user", "User bought a vintage saxophone for the jazz band")
+    query = "vintage saxophone"
+    assert sharded.get_relevant_memory(query, 3) == single.get_relevant_memory(query, 3)
+    assert "saxophone" in sharded.get_relevant_memory(query, 3)[0]